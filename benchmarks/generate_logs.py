@@ -0,0 +1,245 @@
+"""Gerador de logs sintéticos do Traefik para os benchmarks do LogGuardian.
+
+As linhas seguem o formato CLF reconhecido por normalizer.UFW_RE (ou, com
+--log-format json, o access log JSON do Traefik), com distribuições próximas
+das de produção: poucos IPs concentram a maior parte
+do tráfego (Zipf), recursos populares se repetem, o volume varia ao longo do
+dia e uma fração das linhas traz ataques (SQLi, XSS, query strings longas,
+muitos parâmetros, extensões incomuns) e linhas fora do formato.
+
+Uso:
+    python benchmarks/generate_logs.py --lines 10M -o benchmarks/data/traefik_10M.log
+"""
+import os
+import gzip
+import json
+import argparse
+import datetime
+import numpy as np
+
+# --- Configurações do gerador ---
+BLOCK_LINES = 200_000      # linhas geradas (vetorizadas) por bloco
+ZIPF_S = 1.1               # expoente da distribuição de IPs e recursos
+START_DATE = datetime.date(2023, 10, 1)
+DAYS = 7
+ATTACK_RATE = 0.005        # fração de linhas com recursos maliciosos
+INVALID_RATE = 0.001       # fração de linhas fora do formato
+LARGE_RATE = 0.001         # fração de respostas acima de LIMITE_TAMANHO (1 MB)
+EMPTY_SIZE_RATE = 0.02     # fração de linhas sem tamanho
+
+# Valores aceitos pela regex e seus pesos
+METHODS = {'GET': 0.82, 'POST': 0.10, 'HEAD': 0.03, 'OPTIONS': 0.02, 'PUT': 0.01, 'PATCH': 0.01, 'CONNECT': 0.01}
+STATUSES = {'200': 0.80, '404': 0.15, '429': 0.03, '-': 0.02}
+# Peso relativo de cada hora do dia (pico no horário comercial)
+HOURLY_WEIGHTS = [2, 1, 1, 1, 1, 2, 4, 7, 10, 12, 12, 11, 9, 10, 12, 12, 11, 9, 7, 6, 5, 4, 3, 2]
+
+NORMAL_TEMPLATES = [
+    "/cppgi/api/editais/{}", "/cppgi/api/editais?page={}", "/cppgi/edital/{}", "/main/noticia/{}",
+    "/pesquisa/?q=termo{}", "/static/js/app.{}.js", "/static/css/style.{}.css", "/img/foto_{}.jpg",
+    "/api/v1/items/{}", "/favicon.ico",
+]
+SCAN_TEMPLATES = ["/wp-login.php?", "/.env", "/admin/config.php?", "/backup_{}.sql?", "/phpmyadmin/index.php?",
+                  "/cgi-bin/test_{}.cgi?", "/server-status", "/old/index_{}.bak?"]
+ATTACK_TEMPLATES = [
+    "/api/v1/items?id={}' OR '1'='1",
+    "/pesquisa?q={} UNION SELECT username,password FROM users--",
+    "/api/v1/items/{};DROP TABLE items",
+    "/busca?q=<script>alert({})</script>",
+    "/perfil?nome=%3Cimg%20src=x%20onerror=alert({})%3E",
+    "/redirect?url=javascript:alert({})",
+    "/api/v1/search?filtro=" + "a" * 120 + "{}",
+    "/api/v1/relatorio?a=1&b=2&c=3&d=4&e=5&f={}",
+]
+USER_AGENTS = ["Mozilla/5.0 (Windows NT 10.0; Win64; x64)", "Mozilla/5.0 (X11; Linux x86_64)",
+               "curl/7.88.1", "python-requests/2.31.0", "Googlebot/2.1 (+http://www.google.com/bot.html)"]
+MONTH_ABBR = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+# Faixas da tabela de geolocalização sintética: primeiro octeto -> país
+COUNTRIES = ["Brazil", "United States", "Germany", "China", "Russia", "Netherlands", "France", "India"]
+
+def parse_count(text):
+    """Converte '1M', '10m', '500k' ou '2000' em número de linhas."""
+    text = str(text).strip().lower().replace('_', '')
+    multiplicador = {'k': 1_000, 'm': 1_000_000, 'g': 1_000_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if multiplicador > 1 else text) * multiplicador)
+
+def zipf_sampler(rng, n, s=ZIPF_S):
+    """Retorna uma função que sorteia índices em [0, n) com probabilidade proporcional a 1/(i+1)^s."""
+    acumulado = np.cumsum(1.0 / np.arange(1, n + 1) ** s)
+    acumulado /= acumulado[-1]
+    return lambda size: np.minimum(np.searchsorted(acumulado, rng.random(size)), n - 1)
+
+def weighted_choice(rng, weights, size):
+    """Sorteia chaves de um dicionário {valor: peso} como um array de strings."""
+    valores = np.array(list(weights), dtype=object)
+    pesos = np.array(list(weights.values()), dtype=float)
+    return valores[rng.choice(len(valores), size=size, p=pesos / pesos.sum())]
+
+def ip_pool(rng, n):
+    """Gera n IPv4 públicos distintos (como texto) em ordem aleatória."""
+    inteiros = np.unique(rng.integers(1 << 24, 224 << 24, size=n * 2, dtype=np.int64))[:n]
+    rng.shuffle(inteiros)
+    octetos = [(inteiros >> shift) & 0xFF for shift in (24, 16, 8, 0)]
+    return np.array([f"{a}.{b}.{c}.{d}" for a, b, c, d in zip(*octetos)], dtype=object)
+
+def resource_pool(rng, n):
+    """Gera n recursos, do mais para o menos popular, e a máscara dos que são varreduras (~2%)."""
+    modelos = rng.choice(len(NORMAL_TEMPLATES), size=n)
+    recursos = [NORMAL_TEMPLATES[m].format(i) for i, m in enumerate(modelos)]
+    varreduras = np.zeros(n, dtype=bool)
+    varreduras[25::50] = True
+    for i in np.flatnonzero(varreduras):
+        recursos[i] = SCAN_TEMPLATES[(i // 50) % len(SCAN_TEMPLATES)].format(i)
+    return np.array(recursos, dtype=object), varreduras
+
+class LogGenerator:
+    """Gera blocos de linhas de log do Traefik de forma vetorizada e reprodutível (seed)."""
+
+    def __init__(self, lines, seed=42, days=DAYS, attack_rate=ATTACK_RATE, invalid_rate=INVALID_RATE,
+                 ips=None, resources=None, log_format='clf'):
+        self.lines = lines
+        self.log_format = log_format
+        self.days = days
+        self.attack_rate = attack_rate
+        self.invalid_rate = invalid_rate
+        self.rng = np.random.default_rng(seed)
+        self.ips = ip_pool(self.rng, ips or int(min(max(1_000, lines // 200), 2_000_000)))
+        self.resources, self.scans = resource_pool(self.rng, resources or int(min(max(500, lines // 1_000), 500_000)))
+        self.pick_ip = zipf_sampler(self.rng, len(self.ips))
+        self.pick_resource = zipf_sampler(self.rng, len(self.resources))
+        # Tabelas de prefixos de data e de horários, indexadas por dia e segundo do dia
+        datas = [START_DATE + datetime.timedelta(days=d) for d in range(days)]
+        if log_format == 'json':
+            self.day_prefix = np.array([f"{d.isoformat()}T" for d in datas], dtype=object)
+        else:
+            self.day_prefix = np.array([f"{d.day:02d}/{MONTH_ABBR[d.month - 1]}/{d.year}:" for d in datas],
+                                       dtype=object)
+        self.clock = np.array([f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in range(86_400)], dtype=object)
+        # Distribuição acumulada dos segundos do período, ponderada pela hora do dia
+        pesos = np.tile(np.repeat(np.array(HOURLY_WEIGHTS, dtype=float), 3600), days)
+        self.second_cdf = np.cumsum(pesos) / pesos.sum()
+        self.generated = 0
+
+    def timestamps(self, size):
+        """Horários do bloco, crescentes e contínuos entre blocos, mais densos nas horas de pico."""
+        inicio, fim = self.generated / self.lines, (self.generated + size) / self.lines
+        segundos = np.searchsorted(self.second_cdf, np.sort(self.rng.uniform(inicio, fim, size=size)))
+        segundos = np.minimum(segundos, len(self.second_cdf) - 1)
+        dias, segundos = np.divmod(segundos, 86_400)
+        return self.day_prefix[dias] + self.clock[segundos]
+
+    def resources_for(self, size):
+        """Recursos do bloco (populares pela Zipf, mais uma fração de ataques) e a máscara de varreduras."""
+        indices = self.pick_resource(size)
+        recursos = self.resources[indices]
+        ataques = np.flatnonzero(self.rng.random(size) < self.attack_rate)
+        if len(ataques):
+            modelos = self.rng.integers(0, len(ATTACK_TEMPLATES), size=len(ataques))
+            valores = self.rng.integers(0, 100_000, size=len(ataques))
+            recursos[ataques] = [ATTACK_TEMPLATES[m].format(v) for m, v in zip(modelos, valores)]
+        return recursos, self.scans[indices]
+
+    def sizes(self, size):
+        """Tamanhos de resposta: log-normal, com algumas respostas acima de 1 MB e algumas vazias."""
+        tamanhos = self.rng.lognormal(mean=8.0, sigma=1.5, size=size).astype(np.int64)
+        sorteio = self.rng.random(size)
+        tamanhos[sorteio < LARGE_RATE] += 2 * 1024 * 1024
+        texto = tamanhos.astype(str).astype(object)
+        texto[sorteio > 1 - EMPTY_SIZE_RATE] = ""
+        return texto
+
+    def block(self, size):
+        """Gera as próximas `size` linhas (sem quebra de linha no fim)."""
+        ips = self.ips[self.pick_ip(size)]
+        horarios = self.timestamps(size)
+        metodos = weighted_choice(self.rng, METHODS, size)
+        status = weighted_choice(self.rng, STATUSES, size)
+        recursos, varreduras = self.resources_for(size)
+        status[varreduras & (self.rng.random(size) < 0.9)] = '404'  # caminhos varridos quase sempre dão 404
+        tamanhos = self.sizes(size)
+        agentes = weighted_choice(self.rng, dict.fromkeys(USER_AGENTS, 1), size)
+        duracoes = self.rng.integers(1, 900, size=size)
+        numero = self.generated
+        campos = enumerate(zip(ips, horarios, metodos, recursos, status, tamanhos, agentes, duracoes))
+        if self.log_format == 'json':
+            linhas = [self.json_line(numero + i, *valores) for i, valores in campos]
+        else:
+            linhas = [
+                f'{ip} - - [{ts} +0000] "{m} {r} HTTP/1.1" {st} {tam} "-" "{ua}" {numero + i} '
+                f'"router-{i % 3}@docker" "http://10.0.0.{2 + i % 4}:80" {d}ms'
+                for i, (ip, ts, m, r, st, tam, ua, d) in campos
+            ]
+        for i in np.flatnonzero(self.rng.random(size) < self.invalid_rate):
+            linhas[i] = f"linha fora do formato {numero + i} " + linhas[i][:20]
+        self.generated += size
+        return linhas
+
+    @staticmethod
+    def json_line(numero, ip, ts, metodo, recurso, status, tamanho, agente, duracao):
+        """Uma entrada do access log JSON do Traefik com os mesmos valores da linha CLF.
+
+        O status '-' vira 404 e o tamanho vazio é omitido, como o normalizador
+        trata essas linhas no CLF: os dois formatos geram o mesmo CSV base.
+        """
+        status = 404 if status == '-' else int(status)
+        tamanho = f'"DownstreamContentSize":{tamanho},' if tamanho else ''
+        return (f'{{"ClientAddr":"{ip}:{40000 + numero % 20000}","ClientHost":"{ip}",{tamanho}'
+                f'"DownstreamStatus":{status},"Duration":{duracao * 1_000_000 + numero % 1_000_000},'
+                f'"OriginStatus":{status},"RequestAddr":"exemplo.com.br","RequestHost":"exemplo.com.br",'
+                f'"RequestMethod":"{metodo}","RequestPath":{json.dumps(recurso)},"RequestProtocol":"HTTP/1.1",'
+                f'"RouterName":"router-{numero % 3}@docker","ServiceName":"servico-{numero % 3}@docker",'
+                f'"ServiceURL":"http://10.0.0.{2 + numero % 4}:80","StartLocal":"{ts}.{numero % 1000:03d}+00:00",'
+                f'"StartUTC":"{ts}.{numero % 1000:03d}Z","entryPointName":"web","level":"info","msg":"",'
+                f'"request_User-Agent":"{agente}","time":"{ts}Z"}}')
+
+    def __iter__(self):
+        while self.generated < self.lines:
+            yield self.block(min(BLOCK_LINES, self.lines - self.generated))
+
+def write_geoip_table(path):
+    """Grava uma tabela de faixas de IP (um país por /8) para geolocalização offline nos benchmarks."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("start,end,country,region,city\n")
+        for octeto in range(1, 224):
+            pais = COUNTRIES[octeto % len(COUNTRIES)]
+            f.write(f"{octeto << 24},{(octeto << 24) | 0xFFFFFF},{pais},Região {octeto % 5},Cidade {octeto}\n")
+    return path
+
+def generate_log(path, lines, seed=42, **options):
+    """Gera um log sintético com `lines` linhas em `path` (comprimido com gzip se terminar em .gz)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    abrir = gzip.open if path.endswith('.gz') else open
+    with abrir(path, 'wt', encoding='utf-8', newline='\n') as f:
+        for linhas in LogGenerator(lines, seed=seed, **options):
+            f.write("\n".join(linhas))
+            f.write("\n")
+    return path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera logs sintéticos do Traefik para benchmarks")
+    parser.add_argument("--lines", default="1M", help="Número de linhas (aceita sufixos k/M/G) [padrão: 1M]")
+    parser.add_argument("-o", "--output", default=None,
+                        help="Arquivo de saída (.log ou .log.gz) [padrão: benchmarks/data/traefik_<lines>.log]")
+    parser.add_argument("--seed", type=int, default=42, help="Semente do gerador [padrão: 42]")
+    parser.add_argument("--days", type=int, default=DAYS, help=f"Dias cobertos pelo log [padrão: {DAYS}]")
+    parser.add_argument("--attack-rate", type=float, default=ATTACK_RATE,
+                        help=f"Fração de linhas com ataques [padrão: {ATTACK_RATE}]")
+    parser.add_argument("--invalid-rate", type=float, default=INVALID_RATE,
+                        help=f"Fração de linhas fora do formato [padrão: {INVALID_RATE}]")
+    parser.add_argument("--log-format", choices=["clf", "json"], default="clf",
+                        help="Formato das linhas: clf (texto) ou json (access log JSON do Traefik) [padrão: clf]")
+    parser.add_argument("--geoip-table", default=None,
+                        help="Grava também uma tabela CSV de faixas de IP para --geoip-db")
+    args = parser.parse_args(argv)
+
+    lines = parse_count(args.lines)
+    output = args.output or os.path.join("benchmarks", "data", f"traefik_{args.lines}.log")
+    print(f"Gerando {lines:,} linhas em {output}...")
+    generate_log(output, lines, seed=args.seed, days=args.days,
+                 attack_rate=args.attack_rate, invalid_rate=args.invalid_rate, log_format=args.log_format)
+    if args.geoip_table:
+        write_geoip_table(args.geoip_table)
+        print(f"Tabela de geolocalização gravada em {args.geoip_table}")
+
+if __name__ == "__main__":
+    main()
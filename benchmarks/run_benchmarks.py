@@ -0,0 +1,257 @@
+"""Benchmarks do LogGuardian: vazão (linhas/s) e pico de memória por estágio.
+
+Gera (ou reaproveita) um log sintético, mede o tempo de importação da CLI e
+executa normalize_log, o carregamento, compute_aggregates, cada analisador de
+analysis.py, a geração dos gráficos e export_to_markdown, registrando tempo de
+parede, tempo de CPU, linhas/s e pico de RSS de cada estágio. O resultado é
+gravado em JSON (com o commit) para comparar execuções entre commits.
+
+Uso:
+    python benchmarks/run_benchmarks.py --lines 1M
+    python benchmarks/run_benchmarks.py --lines 1M --compare benchmarks/results/<anterior>.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import datetime
+import tempfile
+import subprocess
+import contextlib
+from generate_logs import parse_count, generate_log, write_geoip_table
+from logguardian.profiling import reset_peak_rss, peak_rss_mb, max_rss, format_rss
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+IMPORT_MODULE = "logguardian.cli"
+IMPORT_BUDGET_MS = 50      # orçamento de importação da CLI (`loguard -h`, cron, hooks)
+IMPORT_RUNS = 5            # a importação é medida várias vezes e vale a menor
+REGRESSION_THRESHOLD = 0.10  # variação acima da qual um estágio é apontado como regressão
+REGRESSION_MIN_S = 0.05      # diferenças menores que isso (em segundos) são ruído de medição
+
+class Bench:
+    """Executa os estágios medindo tempo de parede, CPU e pico de RSS de cada um."""
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.stages = {}
+        self.rss_per_stage = reset_peak_rss()
+
+    def run(self, name, rows, func, *args, **kwargs):
+        """Executa func(*args, **kwargs) como o estágio `name`, processando `rows` linhas."""
+        self.rss_per_stage = reset_peak_rss() and self.rss_per_stage
+        with contextlib.ExitStack() as stack:
+            if not self.verbose:
+                stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+            inicio, cpu = time.perf_counter(), time.process_time()
+            value = func(*args, **kwargs)
+        wall = time.perf_counter() - inicio
+        pico = peak_rss_mb()
+        self.stages[name] = {
+            "wall_s": round(wall, 4),
+            "cpu_s": round(time.process_time() - cpu, 4),
+            "linhas": rows,
+            "linhas_por_s": round(rows / wall) if wall > 0 else None,
+            "rss_pico_mb": None if pico is None else round(pico, 1),
+        }
+        s = self.stages[name]
+        print(f"  {name:<26} {s['wall_s']:>9.3f}s  {s['linhas_por_s'] or 0:>12,} linhas/s  "
+              f"{format_rss(s['rss_pico_mb']):>9} MB")
+        return value
+
+def measure_import(module=IMPORT_MODULE, runs=IMPORT_RUNS):
+    """Tempo de importação (ms) de `module` em um interpretador novo, via -X importtime (menor de `runs`)."""
+    tempos = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                              capture_output=True, text=True, check=True)
+        for linha in proc.stderr.splitlines():
+            campos = [c.strip() for c in linha.split("|")]
+            if len(campos) == 3 and campos[2] == module:
+                tempos.append(int(campos[1]) / 1000)
+    return min(tempos) if tempos else None
+
+def git_info():
+    """Commit atual do repositório e se há alterações não commitadas."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        sujo = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                                   capture_output=True, text=True, check=True).stdout.strip())
+        return commit, sujo
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+def run_pipeline(log_file, geoip_db, bench, workers=1, fmt="csv", sketch=None, plots=True):
+    """Executa os estágios do `loguard process` sobre log_file, cada um medido por bench."""
+    from logguardian.normalizer import normalize_log, read_normalized
+    from logguardian import analysis
+    from logguardian.plotting import PLOT_DIR, render_plots
+    from logguardian.report_generator import export_to_markdown
+
+    with open(log_file, "rb") as f:
+        linhas_log = sum(bloco.count(b"\n") for bloco in iter(lambda: f.read(1 << 24), b""))
+    saida = os.path.abspath(f"traefik.{fmt}")
+    bench.run("normalize_log", linhas_log, normalize_log, log_file, saida, workers=workers, fmt=fmt)
+
+    df = bench.run("read_normalized", linhas_log, read_normalized, saida)
+    n = len(df)
+    df = bench.run("load_data", n, analysis.load_data, df)
+    agg = bench.run("compute_aggregates", n, analysis.compute_aggregates, df, sketch=sketch)
+
+    jobs = []
+    results = {"memory_usage": analysis.memory_comparison(df)}
+    if 'sketch' in agg:
+        results['sketch'] = agg['sketch']
+    results['general_stats'] = bench.run("calculate_general_stats", n, analysis.calculate_general_stats, df, agg=agg)
+    results['status_codes'] = bench.run("analyze_status_codes", n, analysis.analyze_status_codes,
+                                        df, PLOT_DIR, agg=agg, plots=jobs)
+    results['time_patterns'] = bench.run("analyze_time_patterns", n, analysis.analyze_time_patterns,
+                                         df, PLOT_DIR, agg=agg, plots=jobs)
+    results['resource_analysis'] = bench.run("analyze_resources", n, analysis.analyze_resources, df, agg=agg)
+    results['404_analysis'] = bench.run("analyze_404_errors", n, analysis.analyze_404_errors,
+                                        df, PLOT_DIR, agg=agg, plots=jobs)
+    results['latency'] = bench.run("analyze_latency", n, analysis.analyze_latency, df, agg=agg)
+    results['ip_geolocation'] = bench.run("analyze_ip_geolocation", n, analysis.analyze_ip_geolocation,
+                                          df, agg=agg, geoip_db=geoip_db)
+    results['anomaly_detection'], _ = bench.run("detect_anomalies", n, analysis.detect_anomalies,
+                                                df, PLOT_DIR, agg=agg, plots=jobs)
+    rendered = bench.run("render_plots", n, render_plots, jobs, workers) if plots else set()
+    analysis.clear_missing_plots(results, rendered)
+    bench.run("export_to_markdown", n, export_to_markdown, results, os.path.abspath("analysis_report.md"))
+    return linhas_log, n
+
+def compare(atual, anterior, threshold=REGRESSION_THRESHOLD):
+    """Imprime a variação de cada estágio em relação a um resultado anterior; retorna as regressões."""
+    regressoes = []
+    print(f"\nComparação com {(anterior.get('commit') or '?')[:10]} ({anterior.get('data', '?')}):")
+    print(f"  {'estágio':<26} {'antes':>9} {'depois':>9} {'variação':>9}   {'RSS antes':>10} {'RSS depois':>10}")
+    for nome, depois in atual["estagios"].items():
+        antes = anterior.get("estagios", {}).get(nome)
+        if not antes:
+            print(f"  {nome:<26} {'-':>9} {depois['wall_s']:>8.3f}s")
+            continue
+        variacao = depois["wall_s"] / antes["wall_s"] - 1 if antes["wall_s"] else 0.0
+        lento = variacao > threshold and depois["wall_s"] - antes["wall_s"] > REGRESSION_MIN_S
+        marca = "  <- regressão" if lento else ""
+        if marca:
+            regressoes.append(nome)
+        print(f"  {nome:<26} {antes['wall_s']:>8.3f}s {depois['wall_s']:>8.3f}s {variacao:>+9.1%}   "
+              f"{format_rss(antes['rss_pico_mb']):>9}M {format_rss(depois['rss_pico_mb']):>9}M{marca}")
+    if atual["parametros"]["linhas"] != anterior.get("parametros", {}).get("linhas"):
+        print("  Atenção: os dois resultados usam tamanhos de log diferentes.")
+    return regressoes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de vazão e memória do LogGuardian")
+    parser.add_argument("--lines", default="1M", help="Tamanho do log sintético (aceita k/M/G) [padrão: 1M]")
+    parser.add_argument("--seed", type=int, default=42, help="Semente do gerador [padrão: 42]")
+    parser.add_argument("--attack-rate", type=float, default=None,
+                        help="Fração de linhas com ataques no log sintético (ex.: 0.3 para um log de varredura)")
+    parser.add_argument("--log-format", choices=["clf", "json"], default="clf",
+                        help="Formato do log sintético: clf ou json (access log JSON do Traefik) [padrão: clf]")
+    parser.add_argument("--log", default=None, help="Usa este log em vez do sintético")
+    parser.add_argument("--workers", type=int, default=1, help="Processos da normalização e dos gráficos [padrão: 1]")
+    parser.add_argument("--format", choices=["csv", "parquet", "feather"], default="csv",
+                        help="Formato do arquivo normalizado [padrão: csv]")
+    parser.add_argument("--sketch", action="store_true", help="Mede o modo aproximado (--sketch) da análise")
+    parser.add_argument("--no-plots", action="store_true", help="Não mede a geração dos gráficos")
+    parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS,
+                        help=f"Orçamento de importação de {IMPORT_MODULE} [padrão: {IMPORT_BUDGET_MS} ms]")
+    parser.add_argument("-o", "--output", default=None,
+                        help="Arquivo JSON de resultado [padrão: benchmarks/results/<data>_<commit>_<linhas>.json]")
+    parser.add_argument("--compare", default=None, help="JSON de uma execução anterior para comparação")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help=f"Variação de tempo considerada regressão [padrão: {REGRESSION_THRESHOLD:.0%}]")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Mostra a saída dos estágios")
+    args = parser.parse_args(argv)
+
+    lines = parse_count(args.lines)
+    ataques = f"_a{args.attack_rate:g}" if args.attack_rate is not None else ""
+    formato = "_json" if args.log_format == "json" else ""
+    log_file = os.path.abspath(args.log) if args.log else \
+        os.path.join(DATA_DIR, f"traefik_{lines}_s{args.seed}{ataques}{formato}.log")
+    if not os.path.exists(log_file):
+        print(f"Gerando log sintético com {lines:,} linhas em {log_file}...")
+        opcoes = {"log_format": args.log_format}
+        if args.attack_rate is not None:
+            opcoes["attack_rate"] = args.attack_rate
+        generate_log(log_file, lines, seed=args.seed, **opcoes)
+    geoip_db = write_geoip_table(os.path.join(DATA_DIR, "geoip_ranges.csv"))
+    output = os.path.abspath(args.output) if args.output else None
+    commit, sujo = git_info()
+
+    print(f"Importação de {IMPORT_MODULE}...")
+    import_ms = measure_import()
+    print(f"  {import_ms:.1f} ms (orçamento: {args.import_budget_ms:.0f} ms)")
+
+    # Os estágios rodam em um diretório temporário: caches (./output) começam vazios
+    # e nada é gravado no diretório do usuário.
+    print(f"Estágios ({os.path.basename(log_file)}):")
+    bench = Bench(verbose=args.verbose)
+    diretorio = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="loguard-bench-") as workdir:
+        os.chdir(workdir)
+        try:
+            linhas_log, linhas_normalizadas = run_pipeline(
+                log_file, geoip_db, bench, workers=args.workers, fmt=args.format,
+                sketch={"k": 1000, "p": 14} if args.sketch else None, plots=not args.no_plots)
+        finally:
+            os.chdir(diretorio)
+
+    import numpy
+    import pandas
+    total_wall = sum(s["wall_s"] for s in bench.stages.values())
+    resultado = {
+        "commit": commit,
+        "alteracoes_nao_commitadas": sujo,
+        "data": datetime.datetime.now().isoformat(timespec="seconds"),
+        "ambiente": {
+            "python": platform.python_version(),
+            "pandas": pandas.__version__,
+            "numpy": numpy.__version__,
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "parametros": {"linhas": linhas_log, "seed": None if args.log else args.seed,
+                       "taxa_ataques": None if args.log else args.attack_rate, "workers": args.workers,
+                       "formato": args.format, "sketch": args.sketch, "graficos": not args.no_plots},
+        "log": {"arquivo": log_file, "bytes": os.path.getsize(log_file), "linhas_normalizadas": linhas_normalizadas},
+        "importacao": {"modulo": IMPORT_MODULE, "ms": import_ms, "orcamento_ms": args.import_budget_ms,
+                       "dentro_do_orcamento": import_ms is not None and import_ms <= args.import_budget_ms},
+        "rss_por_estagio": bench.rss_per_stage,
+        "estagios": bench.stages,
+        "total": {"wall_s": round(total_wall, 4), "linhas_por_s": round(linhas_log / total_wall) if total_wall else None,
+                  "rss_pico_mb": max_rss(*(s["rss_pico_mb"] for s in bench.stages.values()))},
+    }
+    if not bench.rss_per_stage:
+        print("Aviso: pico de RSS não pôde ser zerado; os valores são acumulados desde o início.")
+
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        carimbo = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{carimbo}_{(commit or 'sem-git')[:10]}_{linhas_log}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"\nTotal: {total_wall:.2f}s, {resultado['total']['linhas_por_s'] or 0:,} linhas/s; "
+          f"resultado salvo em {output}")
+
+    falhas = []
+    if not resultado["importacao"]["dentro_do_orcamento"]:
+        falhas.append(f"importação de {IMPORT_MODULE} acima do orçamento")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressoes = compare(resultado, json.load(f), args.threshold)
+        if regressoes:
+            falhas.append(f"regressões em: {', '.join(regressoes)}")
+    for falha in falhas:
+        print(f"FALHA: {falha}")
+    return 1 if falhas else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,107 +2,454 @@ import pandas as pd
 import numpy as np
 import os
 import re
-import matplotlib.pyplot as plt
-import seaborn as sns
-import requests
-import json
+import hashlib
+import pickle
 import time
 from collections import Counter
+from .geolocation import resolve_ips, lookup_ip_ranges, locate_offline
+from .plotting import PLOT_DIR, plot_job, render_plot, render_plots, save_plot_jobs
+from .sketches import SKETCH_K, HLL_PRECISION, SKETCH_CHUNK_ROWS, TDigest, HyperLogLog, SpaceSaving, sketch_frames, iter_row_chunks
+from .normalizer import _map_tasks, filter_time_range, iter_normalized, normalized_files, time_range
+from .profiling import profiled
 
 # --- Configurações Globais ---
 OUTPUT_DIR = "./output"
-PLOT_DIR = os.path.join(OUTPUT_DIR, "plots")
 
-# Cache para geolocalização de IP
-IP_GEOLOCATION_CACHE = {}
-CACHE_FILE = os.path.join(OUTPUT_DIR, "ip_geolocation_cache.json")
-
-# Configurações para a API de geolocalização
-API_URL = "http://ip-api.com/json/"
-API_FIELDS = "status,country,regionName,city"
-MAX_RETRIES = 3
-RETRY_DELAY = 1 # seconds
+# Regras de anomalia avaliadas sobre o texto do recurso: nome -> (padrão, flags)
+RESOURCE_RULES = {
+    'suspeita_sql': (r'(?:\bselect\b|\bunion\b|\bdrop\b|\binsert\b|\bupdate\b|\bdelete\b|[\;\*\'\]-])', re.IGNORECASE),
+    'suspeita_xss': (r'(?:<script|alert\(|onerror=|onload=|javascript:|data:|\%3C|\%3E)', re.IGNORECASE),
+    'extensao_incomum': (r'\.(?:php|asp|jsp|cgi|pl|exe|dll|sh|bash|py|rb|bak|sql|conf|ini|log|swp|env)(?:[\?#]$)', 0),
+}
+# Regras de anomalia por linha, compartilhadas com o modo watch
+METODOS_INCOMUNS = ['CONNECT', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE']
+LIMITE_TAMANHO = 1 * 1024 * 1024  # 1 MB
+# Prefixos de recursos legítimos, ignorados pelas regras sobre o recurso
+RECURSOS_NORMAIS = ["/cppgi/api/editais", "/cppgi/", "/main/", "/pesquisa/", "/favicon.ico"]
+PADRAO_RECURSOS_NORMAIS = '^(?:' + '|'.join(re.escape(r) for r in RECURSOS_NORMAIS) + ')'
+
+# Rajadas por IP: janela em segundos -> limite de requisições do mesmo IP na janela
+BURST_WINDOWS = {1: 10, 10: 50, 60: 150}
+
+# Cache persistente dos resultados das regras: por hash do recurso, os resultados de todas as
+# RESOURCE_RULES em bits, válidos para uma versão das regras (arrays NumPy ordenados pelo hash)
+RULES_CACHE_FILE = os.path.join(OUTPUT_DIR, "resource_rules_cache.npz")
+RULES_CACHE_MIN_RESOURCES = 50_000    # abaixo disso, avaliar as regras é mais barato que ler o cache
+RULES_CACHE_MAX_ROWS = 2_000_000      # recursos mantidos no cache (~20 bytes cada; os vistos há mais tempo saem)
+RULES_CACHE_MAX_AGE_DAYS = 30         # recursos não vistos há mais tempo saem do cache
+
+# Modo aproximado: contador -> coluna contada pelos sketches, e os contadores restritos a um status
+SKETCH_COUNTERS = {'ips': 'ip', 'ips_200': 'ip', 'ips_404': 'ip', 'recursos': 'recurso', 'recursos_404': 'recurso'}
+SKETCH_STATUS = {'ips_200': 200, 'ips_404': 404, 'recursos_404': 404}
+
+# Estado incremental: agregações acumuladas entre execuções (ver update_state)
+STATE_FILE = os.path.join(OUTPUT_DIR, "analysis_state.pkl")
+STATE_VERSION = 1
+# Contadores guardados na ordem da primeira ocorrência, que é o critério de desempate do count_values
+ORDERED_COUNTERS = ['ips', 'ips_200', 'ips_404', 'recursos', 'recursos_404']
+# Contadores indexados por chaves ordenáveis (status, hora, dia, hora/método)
+SORTED_COUNTERS = ['status', 'por_hora', 'por_dia', 'por_hora_metodo', '404_por_hora']
+# Contadores com índice fixo (Monday a Sunday)
+WEEKDAY_COUNTERS = ['por_dia_semana', '404_por_dia_semana']
+# t-digests da latência (duracao_ms, logs do Traefik): nome no estado -> coluna de agrupamento (None: geral)
+LATENCY_DIGESTS = {'latencia_geral': None, 'latencia_roteador': 'roteador',
+                   'latencia_hora': 'hora', 'latencia_recurso': 'recurso'}
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+LATENCY_MIN_REQUESTS = 20  # mínimo de requisições para um recurso entrar no ranking dos mais lentos
+
+# Esquema compacto do DataFrame de análise
+DIAS_SEMANA = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+ANALYSIS_SCHEMA = {
+    'data1': 'datetime64[ns]',
+    'data2': 'category',
+    'ip': 'category',
+    'status': 'int16',
+    'metodo': 'category',
+    'recurso': 'category',
+    'tamanho': 'int64',
+    'hora': 'int8',
+    'dia_semana': 'int8',  # 0 = Monday ... 6 = Sunday (ver DIAS_SEMANA)
+    'mes': 'int8',
+}
+# Linhas da amostra usada para estimar a memória do layout anterior (ver memory_comparison)
+MEMORY_SAMPLE_ROWS = 100_000
+# Colunas do arquivo normalizado usadas pela análise (as demais não são lidas dos conjuntos particionados)
+ANALYSIS_COLUMNS = ['data1', 'data2', 'ip', 'status', 'metodo', 'recurso', 'tamanho', 'duracao_ms', 'roteador']
+# Campos do Traefik, presentes só em alguns logs (fora do ANALYSIS_SCHEMA para não mudar a impressão dos lotes)
+TRAEFIK_SCHEMA = {
+    'duracao_ms': 'float64',
+    'roteador': 'category',
+    'servico': 'category',
+    'host': 'category',
+    'user_agent': 'category',
+    'backend': 'category',
+}
+
+def queue_plot(plots, kind, path, data):
+    """Registra um gráfico na fila `plots`; sem fila, gera-o imediatamente.
+
+    Retorna o caminho do gráfico (None se a geração imediata falhar).
+    """
+    job = plot_job(kind, path, data)
+    if plots is None:
+        return render_plot(job)
+    plots.append(job)
+    return path
 
 def ensure_dir(directory):
     """Garante que um diretório exista, criando-o se necessário."""
     os.makedirs(directory, exist_ok=True)
 
-def load_cache():
-    """Carrega o cache de geolocalização de um arquivo."""
-    ensure_dir(OUTPUT_DIR)
-    if os.path.exists(CACHE_FILE):
-        with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                print(f"Erro ao decodificar o cache JSON em {CACHE_FILE}. Criando um novo cache.")
-                return {}
-    return {}
-
-def save_cache(cache_data):
-    """Salva o cache de geolocalização em um arquivo."""
-    ensure_dir(OUTPUT_DIR)
-    with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(cache_data, f, ensure_ascii=False, indent=4)
-
-# Carrega o cache ao iniciar
-IP_GEOLOCATION_CACHE = load_cache()
+def counts_in_order(series):
+    """Conta cada valor da série, na ordem da primeira ocorrência (sem ordenar pela contagem)."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+    else:
+        codes, uniques = pd.factorize(series)
+    codes = codes[codes >= 0]
+    order = pd.unique(codes)
+    counts = np.bincount(codes, minlength=len(uniques))[order]
+    return pd.Series(counts, index=pd.Index(uniques[order], name=series.name), name='count')
+
+def rank_counts(counts, normalize=False):
+    """Ordena contagens da maior para a menor, desempatando pela ordem atual (ordenação estável)."""
+    ranked = counts.iloc[np.argsort(-counts.to_numpy(), kind='stable')]
+    if normalize:
+        return (ranked / ranked.sum()).rename('proportion')
+    return ranked
+
+def count_values(series, normalize=False):
+    """Equivalente a value_counts, inclusive para colunas categóricas.
+
+    Em colunas categóricas, descarta categorias sem ocorrências e mantém a
+    mesma ordem de desempate do value_counts em colunas de texto (ordem da
+    primeira ocorrência), para que os "top N" não dependam do tipo da coluna.
+    """
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        return series.value_counts(normalize=normalize)
+    return rank_counts(counts_in_order(series), normalize=normalize)
+
+def memory_usage_mb(df):
+    """Retorna o uso de memória do DataFrame em MB, incluindo o conteúdo das strings."""
+    return df.memory_usage(deep=True).sum() / (1024 * 1024)
+
+def legacy_layout(df):
+    """O DataFrame tipado no layout anterior ao ANALYSIS_SCHEMA, para comparar a memória.
+
+    Textos e categóricas viram object, status e tamanho voltam a int64 e
+    float64, e dia_semana e mes voltam a ser os nomes do dia e do mês (sem hora).
+    """
+    legado = df.drop(columns=['hora', 'dia_semana', 'mes'])
+    for col in legado.columns:
+        if isinstance(legado[col].dtype, pd.CategoricalDtype) or legado[col].dtype == 'str':
+            legado[col] = legado[col].astype(object)
+    legado['status'] = legado['status'].astype('int64')
+    legado['tamanho'] = legado['tamanho'].astype('float64')
+    legado['dia_semana'] = legado['data1'].dt.day_name().astype(object)
+    legado['mes'] = legado['data1'].dt.month_name().astype(object)
+    return legado
+
+def memory_comparison(df, sample_rows=MEMORY_SAMPLE_ROWS):
+    """Memória do DataFrame tipado e a estimada para o mesmo conteúdo no layout anterior.
+
+    A memória tipada é exata (nas categóricas, só as categorias têm texto);
+    a do layout anterior é medida em uma amostra de até sample_rows linhas e
+    extrapolada, sem percorrer todas as strings.
+    """
+    amostra = df
+    if len(df) > sample_rows:
+        amostra = df.iloc[np.sort(np.random.default_rng(0).choice(len(df), sample_rows, replace=False))]
+    return {
+        "memoria_layout_anterior_mb": round(float(memory_usage_mb(legacy_layout(amostra))) * len(df) / max(len(amostra), 1), 2),
+        "memoria_tipada_mb": round(float(memory_usage_mb(df)), 2),
+        "linhas_amostra": int(len(amostra)),
+    }
 
+@profiled()
 def load_data(df):
-    """Realiza o pré-processamento inicial do DataFrame."""
+    """Realiza o pré-processamento inicial do DataFrame, aplicando o ANALYSIS_SCHEMA."""
     print("Pré-processando dados...")
-    df["data1"] = pd.to_datetime(df["data1"])
+    if not pd.api.types.is_datetime64_any_dtype(df["data1"]):
+        df["data1"] = pd.to_datetime(df["data1"], format=DATE_FORMAT)
+    df["tamanho"] = pd.to_numeric(df["tamanho"]).fillna(0)
     df["hora"] = df["data1"].dt.hour
-    df["dia_semana"] = df["data1"].dt.day_name()
-    df["mes"] = df["data1"].dt.month_name()
+    df["dia_semana"] = df["data1"].dt.weekday
+    df["mes"] = df["data1"].dt.month
+    for col, dtype in {**ANALYSIS_SCHEMA, **TRAEFIK_SCHEMA}.items():
+        if col in df.columns and df[col].dtype != dtype:
+            df[col] = df[col].astype(dtype)
     print("Dados pré-processados.")
     return df
 
-def get_geolocation(ip):
-    """Obtém a geolocalização de um endereço IP usando a API ip-api.com, com cache e retries."""
-    if ip in IP_GEOLOCATION_CACHE:
-        return IP_GEOLOCATION_CACHE[ip]
-
-    for attempt in range(MAX_RETRIES):
-        try:
-            response = requests.get(f"{API_URL}{ip}?fields={API_FIELDS}", timeout=5) # Adicionado timeout
-            data = response.json()
-            if data and data.get("status") == "success":
-                result = {
-                    "country": data.get("country", "Desconhecido"),
-                    "region": data.get("regionName", "Desconhecido"),
-                    "city": data.get("city", "Desconhecido")
-                }
-                IP_GEOLOCATION_CACHE[ip] = result
-                return result
-        except requests.exceptions.RequestException as e:
-            print(f"Erro de conexão ao obter geolocalização para {ip} (Tentativa {attempt + 1}/{MAX_RETRIES}): {e}")
-        except json.JSONDecodeError:
-            print(f"Erro ao decodificar JSON para {ip} (Tentativa {attempt + 1}/{MAX_RETRIES}). Resposta: {response.text[:100]}...")
-        except Exception as e:
-            print(f"Erro inesperado ao obter geolocalização para {ip} (Tentativa {attempt + 1}/{MAX_RETRIES}): {e}")
-        
-        if attempt < MAX_RETRIES - 1:
-            time.sleep(RETRY_DELAY) # Espera antes de tentar novamente
+def count_by_weekday(df):
+    """Conta requisições por dia da semana, indexadas pelo nome do dia (Monday a Sunday)."""
+    counts = df.groupby('dia_semana').size().reindex(range(len(DIAS_SEMANA)), fill_value=0)
+    counts.index = DIAS_SEMANA
+    return counts
 
-    # Se todas as tentativas falharem
-    result = {"country": "Erro", "region": "Erro", "city": "Erro"}
-    IP_GEOLOCATION_CACHE[ip] = result
-    return result
+def status_masks(df):
+    """Máscaras (arrays booleanos) das linhas com status 200 e 404."""
+    status = df['status']
+    return (status == 200).to_numpy(), (status == 404).to_numpy()
 
-def analyze_ip_geolocation(df, top_n=10):
-    """Analisa a geolocalização dos top N IPs com status 200 e top N IPs com status 404."""
+def latency_digests(df, digests=LATENCY_DIGESTS):
+    """t-digests da duração das requisições por grupo (ver LATENCY_DIGESTS); {} sem latência nos dados."""
+    if 'duracao_ms' not in df.columns:
+        return {}
+    duracao = df['duracao_ms'].to_numpy(dtype=np.float64, na_value=np.nan)
+    if np.isnan(duracao).all():
+        return {}
+    resultado = {}
+    for nome, coluna in digests.items():
+        if coluna is None:
+            resultado[nome] = TDigest().add(np.zeros(len(duracao), dtype=np.int8), duracao)
+        elif coluna in df.columns:
+            chaves = df[coluna]
+            if isinstance(chaves.dtype, pd.CategoricalDtype) and '' in chaves.cat.categories:
+                chaves = chaves.cat.remove_categories([''])  # vazio = ausente, como ao ler do CSV
+            resultado[nome] = TDigest().add(chaves, duracao)
+    return resultado
+
+def batch_state(df, mascara_200=None, mascara_404=None, ordered=True):
+    """Calcula as agregações somáveis de um lote de dados, no formato do estado incremental.
+
+    Os contadores por IP e por recurso ficam na ordem da primeira ocorrência,
+    para que a soma de dois estados desempate como o DataFrame concatenado.
+    Com ordered=False, esses contadores (ORDERED_COUNTERS) e a latência por
+    recurso não são calculados.
+    """
+    if mascara_200 is None or mascara_404 is None:
+        mascara_200, mascara_404 = status_masks(df)
+    df_404 = df[mascara_404]
+    state = {
+        "versao": STATE_VERSION,
+        "lotes": [],
+        "total_registros": int(df.shape[0]),
+        "total_404": int(mascara_404.sum()),
+        "data_inicio": df['data1'].min(),
+        "data_fim": df['data1'].max(),
+        "status": df['status'].value_counts().sort_index(),
+        "por_hora": df.groupby('hora').size(),
+        "por_dia_semana": count_by_weekday(df),
+        "por_dia": df['data1'].dt.normalize().value_counts().sort_index(),
+        "por_hora_metodo": df.groupby([df['hora'], df['metodo'].astype(str)]).size(),
+        "404_por_hora": df_404.groupby('hora').size(),
+        "404_por_dia_semana": count_by_weekday(df_404),
+    }
+    if ordered:
+        state.update({
+            "ips": counts_in_order(df['ip']),
+            "ips_200": counts_in_order(df['ip'][mascara_200]),
+            "ips_404": counts_in_order(df_404['ip']),
+            "recursos": counts_in_order(df['recurso']),
+            "recursos_404": counts_in_order(df_404['recurso']),
+        })
+    state.update(latency_digests(df, LATENCY_DIGESTS if ordered else
+                                 {nome: coluna for nome, coluna in LATENCY_DIGESTS.items() if coluna != 'recurso'}))
+    return state
+
+def merge_ordered_counts(anterior, novo):
+    """Soma dois contadores mantendo a ordem da primeira ocorrência (anterior antes de novo)."""
+    index = anterior.index.append(novo.index[~novo.index.isin(anterior.index)])
+    return anterior.reindex(index, fill_value=0) + novo.reindex(index, fill_value=0)
+
+def merge_states(state, lote):
+    """Incorpora as agregações de um lote novo ao estado acumulado."""
+    merged = dict(state)
+    merged["total_registros"] = state["total_registros"] + lote["total_registros"]
+    merged["total_404"] = state["total_404"] + lote["total_404"]
+    merged["data_inicio"] = min(state["data_inicio"], lote["data_inicio"])
+    merged["data_fim"] = max(state["data_fim"], lote["data_fim"])
+    for key in SORTED_COUNTERS:
+        merged[key] = state[key].add(lote[key], fill_value=0).astype('int64').sort_index()
+    for key in WEEKDAY_COUNTERS:
+        # astype: estados gravados antes tinham essas contagens em float
+        merged[key] = (state[key] + lote[key]).astype('int64')
+    for key in ORDERED_COUNTERS:
+        merged[key] = merge_ordered_counts(state[key], lote[key])
+    # Latência: só nos lotes com campos do Traefik
+    for key in LATENCY_DIGESTS:
+        if key in lote:
+            merged[key] = state[key].merge(lote[key]) if key in state else lote[key]
+    return merged
+
+def aggregates_from_state(state):
+    """Monta o dicionário de agregações usado pelos analisadores a partir de um estado."""
+    agg = {key: state[key] for key in ["total_registros", "total_404", "data_inicio", "data_fim"]
+           + SORTED_COUNTERS + WEEKDAY_COUNTERS}
+    por_dia = state["por_dia"]
+    agg["por_dia"] = por_dia.reindex(pd.date_range(por_dia.index.min(), por_dia.index.max(), freq='D'), fill_value=0)
+    for key in ORDERED_COUNTERS:
+        if key in state:
+            agg[key] = rank_counts(state[key])
+    agg.update({key: state[key] for key in LATENCY_DIGESTS if key in state})
+    return agg
+
+def sketch_masks():
+    """Máscaras dos contadores do modo aproximado restritos a um status (ver SKETCH_STATUS)."""
+    return {nome: lambda lote, codigo=codigo: (lote['status'] == codigo).to_numpy()
+            for nome, codigo in SKETCH_STATUS.items()}
+
+def _sketch_file(task):
+    """Sketches de um arquivo normalizado, lido em lotes (uma tarefa por arquivo ou partição)."""
+    path, fmt, inicio, fim, k, p = task
+    filtrar = inicio is not None or fim is not None
+    lotes = iter_normalized(path, fmt, columns=['ip', 'status', 'recurso'] + (['data1'] if filtrar else []),
+                           chunk_rows=SKETCH_CHUNK_ROWS)
+    if filtrar:
+        lotes = (filter_time_range(lote, inicio, fim) for lote in lotes)
+    return sketch_frames(lotes, SKETCH_COUNTERS, sketch_masks(), k=k, p=p)
+
+@profiled()
+def sketch_sources(sources, fmt=None, since=None, until=None, k=SKETCH_K, p=HLL_PRECISION, workers=1):
+    """Sketches do modo aproximado calculados direto dos arquivos normalizados.
+
+    Cada arquivo (ou partição no intervalo since/until) é lido em lotes por
+    uma tarefa própria, em processos quando workers > 1, e os resumos das
+    tarefas são combinados com merge(): a memória de cada tarefa não depende
+    do tamanho dos arquivos. Retorna (heavy, distintos), como sketch_frames.
+    """
+    inicio, fim = time_range(since, until)
+    tasks = [(path, formato, inicio, fim, k, p) for path, formato in normalized_files(sources, fmt, since, until)]
+    print(f"Calculando sketches de {len(tasks)} arquivo(s) normalizado(s)...")
+    heavy = {nome: SpaceSaving(k) for nome in SKETCH_COUNTERS}
+    distintos = {coluna: HyperLogLog(p) for coluna in set(SKETCH_COUNTERS.values())}
+    for parcial_heavy, parcial_distintos in _map_tasks(_sketch_file, tasks, workers):
+        for nome, sketch in parcial_heavy.items():
+            heavy[nome].merge(sketch)
+        for coluna, hll in parcial_distintos.items():
+            distintos[coluna].merge(hll)
+    return heavy, distintos
+
+def sketch_aggregates(df, mascara_200, mascara_404, k=SKETCH_K, p=HLL_PRECISION, sketches=None):
+    """Agregações do modo aproximado: os contadores por IP e recurso viram sketches.
+
+    Em vez de value_counts exatos sobre milhões de chaves distintas, um
+    Space-Saving por contador (top k) e um HyperLogLog por coluna (valores
+    distintos), com memória limitada. sketches: par (heavy, distintos) já
+    calculado dos arquivos (ver sketch_sources); sem ele, o DataFrame é
+    percorrido em lotes.
+    """
+    print(f"Calculando agregações aproximadas (Space-Saving k={k}, HyperLogLog p={p})...")
+    agg = aggregates_from_state(batch_state(df, mascara_200, mascara_404, ordered=False))
+    heavy, distintos = sketches or sketch_frames(iter_row_chunks(df), SKETCH_COUNTERS, sketch_masks(), k=k, p=p)
+    for key, sketch in heavy.items():
+        agg[key] = sketch.top()
+    if 'latencia_geral' in agg:
+        # Latência por recurso só para os recursos mais frequentes, com memória limitada
+        topo = df['recurso'].isin(agg['recursos'].index).to_numpy()
+        agg.update(latency_digests(df.loc[topo, ['recurso', 'duracao_ms']], {'latencia_recurso': 'recurso'}))
+    agg["sketch"] = {
+        "contadores": k,
+        "ips_distintos": distintos['ip'].estimate(),
+        "recursos_distintos": distintos['recurso'].estimate(),
+        "erro_relativo_distintos": round(float(distintos["ip"].relative_error()) * 100, 2),
+        "erro_max_contagem": {key: int(np.ceil(sketch.max_error())) for key, sketch in heavy.items()},
+    }
+    return agg
+
+@profiled()
+def compute_aggregates(df, sketch=None):
+    """Calcula de uma só vez as máscaras e contagens compartilhadas pelas análises.
+
+    Cada analisador recebe este dicionário em vez de refazer filtros e
+    value_counts sobre o DataFrame inteiro. sketch: dicionário com k e p (e,
+    opcionalmente, os sketches já calculados) para o modo aproximado (ver
+    sketch_aggregates).
+    """
+    print("Calculando agregações compartilhadas...")
+    mascara_200, mascara_404 = status_masks(df)
+    if sketch:
+        agg = sketch_aggregates(df, mascara_200, mascara_404, **sketch)
+    else:
+        agg = aggregates_from_state(batch_state(df, mascara_200, mascara_404))
+    agg["mascara_200"] = mascara_200
+    agg["mascara_404"] = mascara_404
+    print("Agregações calculadas.")
+    return agg
+
+def frame_fingerprint(df):
+    """Identifica o conteúdo de um lote (hash das linhas), para não incorporá-lo duas vezes."""
+    colunas = [col for col in ANALYSIS_SCHEMA if col in df.columns]
+    return hashlib.sha1(pd.util.hash_pandas_object(df[colunas], index=False).to_numpy().tobytes()).hexdigest()
+
+def load_state(state_file=STATE_FILE):
+    """Carrega o estado incremental salvo, ou None se ele não existir ou for de outra versão."""
+    if not os.path.exists(state_file):
+        return None
+    with open(state_file, 'rb') as f:
+        state = pickle.load(f)
+    if state.get("versao") != STATE_VERSION:
+        print(f"Estado incremental em {state_file} é de outra versão e será recriado.")
+        return None
+    return state
+
+def save_state(state, state_file=STATE_FILE):
+    """Grava o estado incremental de forma atômica (arquivo temporário + rename)."""
+    ensure_dir(os.path.dirname(state_file) or ".")
+    tmp_file = state_file + ".tmp"
+    with open(tmp_file, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, state_file)
+
+@profiled()
+def update_state(df, state_file=STATE_FILE):
+    """Incorpora um lote ao estado incremental e retorna as agregações acumuladas.
+
+    Só o lote novo é processado; o custo não depende do histórico já
+    incorporado. As máscaras de status do agg são as do lote, usadas pela
+    detecção de anomalias, que avalia apenas as linhas novas.
+    """
+    print(f"Atualizando estado incremental: {state_file}")
+    mascara_200, mascara_404 = status_masks(df)
+    lote = batch_state(df, mascara_200, mascara_404)
+    impressao = frame_fingerprint(df)
+    state = load_state(state_file)
+    if state is None:
+        state = lote
+    elif impressao in state["lotes"]:
+        print("Este lote já foi incorporado ao estado; o relatório será regenerado sem somá-lo de novo.")
+    else:
+        state = merge_states(state, lote)
+    if impressao not in state["lotes"]:
+        state["lotes"] = state["lotes"] + [impressao]
+        save_state(state, state_file)
+
+    agg = aggregates_from_state(state)
+    agg["mascara_200"] = mascara_200
+    agg["mascara_404"] = mascara_404
+    agg["lotes"] = len(state["lotes"])
+    return agg
+
+def country_distribution(contagem_ips, geoip_db):
+    """Soma requisições por país a partir das contagens por IP, usando a tabela local."""
+    if contagem_ips.empty:
+        return {}
+    paises = lookup_ip_ranges(contagem_ips.index, geoip_db)['country']
+    por_pais = pd.Series(contagem_ips.to_numpy(), index=paises.to_numpy()).groupby(level=0).sum()
+    return {pais: int(total) for pais, total in por_pais.sort_values(ascending=False, kind='stable').items()}
+
+@profiled()
+def analyze_ip_geolocation(df, top_n=10, agg=None, geoip_db=None):
+    """Analisa a geolocalização dos top N IPs com status 200 e top N IPs com status 404.
+
+    Com geoip_db (tabela CSV local de faixas de IP), a geolocalização é feita
+    offline, sem chamadas à API, e inclui a distribuição por país de todo o
+    tráfego e dos erros 404. IPs fora das faixas ficam como "Desconhecido":
+    a API não é consultada como alternativa, para que --geoip-db nunca acesse a rede.
+    """
     if df is None or df.empty or 'ip' not in df.columns or 'status' not in df.columns:
         return {}
+    if agg is None:
+        agg = compute_aggregates(df)
     print(f"Analisando geolocalização dos top {top_n} IPs (200 e 404)...")
 
     # IPs com status 200
-    df_200 = df[df['status'] == 200].copy()
-    top_ips_200 = df_200['ip'].value_counts().head(top_n).index.tolist()
+    top_ips_200 = agg['ips_200'].head(top_n).index.tolist()
 
     # IPs com status 404
-    df_404 = df[df['status'] == 404].copy()
-    top_ips_404 = df_404['ip'].value_counts().head(top_n).index.tolist()
+    top_ips_404 = agg['ips_404'].head(top_n).index.tolist()
 
     # Combina e obtém IPs únicos para geolocalização
     all_ips_to_geo = list(set(top_ips_200 + top_ips_404))
@@ -115,8 +462,12 @@ def analyze_ip_geolocation(df, top_n=10):
             "total_ips_analisados": 0
         }
 
-    # Processa os IPs usando a função com cache
-    ip_location_data = {ip: get_geolocation(ip) for ip in all_ips_to_geo}
+    if geoip_db:
+        # Resolve os IPs pela tabela local, sem acesso à rede
+        ip_location_data = locate_offline(all_ips_to_geo, geoip_db)
+    else:
+        # Resolve os IPs em lote, usando o cache persistente
+        ip_location_data = resolve_ips(all_ips_to_geo)
 
     # Organiza os resultados para os top 200 IPs
     top_200_ips_geo_results = {}
@@ -128,26 +479,35 @@ def analyze_ip_geolocation(df, top_n=10):
     for ip in top_ips_404:
         top_404_ips_geo_results[ip] = ip_location_data.get(ip, {"country": "N/A", "region": "N/A", "city": "N/A"})
 
-    # Salva o cache após a análise
-    save_cache(IP_GEOLOCATION_CACHE)
-
-    print("Análise de geolocalização de IPs concluída.")
-    return {
+    results = {
         "top_200_ips_geo": top_200_ips_geo_results,
         "top_404_ips_geo": top_404_ips_geo_results,
         "total_ips_analisados": len(all_ips_to_geo)
     }
+    if geoip_db:
+        print("Calculando distribuição por país de todos os IPs...")
+        results["requisicoes_por_pais"] = country_distribution(agg['ips'], geoip_db)
+        results["erros_404_por_pais"] = country_distribution(agg['ips_404'], geoip_db)
+        results["total_ips_geolocalizados"] = int(len(agg['ips']))
+        if 'sketch' in agg:
+            results["distribuicao_aproximada"] = True  # só os IPs mantidos pelo sketch
+
+    print("Análise de geolocalização de IPs concluída.")
+    return results
 
-def calculate_general_stats(df):
+@profiled()
+def calculate_general_stats(df, agg=None):
     """Calcula estatísticas gerais do DataFrame."""
     if df is None or df.empty:
         return {}
+    if agg is None:
+        agg = compute_aggregates(df)
     print("Calculando estatísticas gerais...")
-    data_final = df["data1"].max()
-    data_inicial = df["data1"].min()
+    data_final = agg["data_fim"]
+    data_inicial = agg["data_inicio"]
     periodo_str = f"{data_inicial.strftime('%d/%m/%Y')} - {data_final.strftime('%d/%m/%Y')}"
     delta_dias = (data_final - data_inicial).days
-    total_registros = int(df.shape[0])
+    total_registros = agg["total_registros"]
 
     stats = {
         "periodo_analisado": periodo_str,
@@ -159,32 +519,17 @@ def calculate_general_stats(df):
     print("Estatísticas gerais calculadas.")
     return stats
 
-def analyze_status_codes(df, plot_dir):
+@profiled()
+def analyze_status_codes(df, plot_dir, agg=None, plots=None):
     """Analisa a distribuição dos códigos de status HTTP e gera um gráfico."""
     if df is None or df.empty:
         return {}
+    if agg is None:
+        agg = compute_aggregates(df)
     print("Analisando códigos de status...")
-    contagem_status = df["status"].value_counts().sort_index()
-    status_plot_path = os.path.join(plot_dir, "status_distribution.png")
-
-    try:
-        plt.figure(figsize=(8, 5))
-        bars = plt.bar(contagem_status.index.astype(str), contagem_status.values, color='mediumseagreen', edgecolor='black')
-        for bar in bars:
-            yval = bar.get_height()
-            plt.text(bar.get_x() + bar.get_width()/2, yval + max(1, yval*0.01), f'{int(yval)}', ha='center', va='bottom')
-        plt.title('Distribuição de Status HTTP nas Requisições')
-        plt.xlabel('Código de Status HTTP')
-        plt.ylabel('Quantidade')
-        plt.xticks(rotation=0)
-        plt.grid(axis='y', linestyle='--', alpha=0.5)
-        plt.tight_layout()
-        plt.savefig(status_plot_path)
-        plt.close()
-        print(f"Gráfico de status salvo em: {status_plot_path}")
-    except Exception as e:
-        print(f"Erro ao gerar gráfico de status: {e}")
-        status_plot_path = None
+    contagem_status = agg["status"]
+    status_plot_path = queue_plot(plots, "status_distribution",
+                                  os.path.join(plot_dir, "status_distribution.png"), contagem_status)
 
     results = {
         "contagem_status": contagem_status.to_dict(),
@@ -193,91 +538,56 @@ def analyze_status_codes(df, plot_dir):
     print("Análise de códigos de status concluída.")
     return results
 
-def analyze_time_patterns(df, plot_dir):
+@profiled()
+def analyze_time_patterns(df, plot_dir, agg=None, plots=None):
     """Analisa padrões temporais e gera gráficos de requisições."""
     if df is None or df.empty:
         return {}
+    if agg is None:
+        agg = compute_aggregates(df)
     print("Analisando padrões temporais...")
     results = {}
 
     # Requisições por Hora
-    req_hora = df.groupby('hora').size()
+    req_hora = agg['por_hora']
     pico_hora = int(req_hora.idxmax())
     results['requisicoes_por_hora'] = req_hora.to_dict()
     results['pico_requisicoes_hora'] = pico_hora
-    hora_plot_path = os.path.join(plot_dir, "requests_per_hour.png")
-    try:
-        plt.figure(figsize=(10, 6))
-        req_hora.plot(kind='bar', color='mediumseagreen', edgecolor='black')
-        plt.title('Requisições por Hora do Dia (Geral)')
-        plt.xlabel('Hora do dia')
-        plt.ylabel('Total de Requisições')
-        plt.xticks(rotation=0)
-        plt.grid(axis='y', linestyle='--', alpha=0.5)
-        plt.tight_layout()
-        plt.savefig(hora_plot_path)
-        plt.close()
-        results['plot_path_hora'] = hora_plot_path
-        print(f"Gráfico de requisições por hora salvo em: {hora_plot_path}")
-    except Exception as e:
-        print(f"Erro ao gerar gráfico de requisições por hora: {e}")
-        results['plot_path_hora'] = None
+    results['plot_path_hora'] = queue_plot(plots, "requests_per_hour",
+                                           os.path.join(plot_dir, "requests_per_hour.png"), req_hora)
 
     # Requisições por Dia da Semana
-    dias_ordem = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    req_dia_semana = df.groupby('dia_semana').size().reindex(dias_ordem).fillna(0)
+    req_dia_semana = agg['por_dia_semana']
     pico_dia = req_dia_semana.idxmax()
     results['requisicoes_por_dia_semana'] = req_dia_semana.to_dict()
     results['pico_requisicoes_dia'] = pico_dia
 
     # Histórico de Requisições Diárias
-    req_data = df.set_index('data1').resample('D').size()
+    req_data = agg['por_dia']
     results['historico_requisicoes_diarias'] = {d.strftime('%Y-%m-%d'): v for d, v in req_data.items()}
-    hist_plot_path = os.path.join(plot_dir, "daily_requests_history.png")
-    try:
-        plt.figure(figsize=(10, 5))
-        plt.plot(req_data.index, req_data.values, linestyle='-', color='mediumseagreen')
-        plt.title('Histórico de Requisições Diárias')
-        plt.xlabel('Data')
-        plt.ylabel('Quantidade de Requisições')
-        plt.grid(True, linestyle='--', alpha=0.5)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.savefig(hist_plot_path)
-        plt.close()
-        print(f"Gráfico de histórico diário salvo em: {hist_plot_path}")
-    except Exception as e:
-        print(f"Erro ao gerar gráfico de histórico diário: {e}")
-        results['plot_path_historico'] = None
+    results['plot_path_historico'] = queue_plot(plots, "daily_history",
+                                                os.path.join(plot_dir, "daily_requests_history.png"), req_data)
 
     # Heatmap Hora/Método
-    heatmap_plot_path = os.path.join(plot_dir, "heatmap_hour_method.png")
-    try:
-        heatmap_data = df.groupby(['hora', 'metodo']).size().unstack().fillna(0)
-        plt.figure(figsize=(10, 6))
-        sns.heatmap(heatmap_data, cmap='viridis', annot=True, fmt=".0f")
-        plt.title('Requisições por Hora e Método HTTP')
-        plt.xlabel("Método HTTP")
-        plt.ylabel("Hora do Dia")
-        plt.tight_layout()
-        plt.savefig(heatmap_plot_path)
-        plt.close()
-        print(f"Heatmap salvo em: {heatmap_plot_path}")
-    except Exception as e:
-        print(f"Erro ao gerar heatmap: {e}")
-        results['plot_path_heatmap'] = None
+    heatmap_data = agg['por_hora_metodo'].unstack().fillna(0)
+    results['plot_path_heatmap'] = queue_plot(plots, "heatmap_hour_method",
+                                              os.path.join(plot_dir, "heatmap_hour_method.png"), heatmap_data)
 
     print("Análise de padrões temporais concluída.")
     return results
 
-def analyze_resources(df, top_n=10):
+@profiled()
+def analyze_resources(df, top_n=10, agg=None):
     """Analisa os recursos mais e menos acessados."""
     if df is None or df.empty:
         return {}
+    if agg is None:
+        agg = compute_aggregates(df)
     print("Analisando acesso a recursos...")
-    contagem_recursos = df['recurso'].value_counts()
+    contagem_recursos = agg['recursos']
     mais_acessadas = contagem_recursos.head(top_n)
-    menos_acessadas = contagem_recursos.tail(top_n)
+    # No modo aproximado só os mais frequentes são conhecidos
+    menos_acessadas = contagem_recursos.iloc[:0] if 'sketch' in agg else contagem_recursos.tail(top_n)
 
     results = {
         f"top_{top_n}_recursos_mais_acessados": mais_acessadas.to_dict(),
@@ -286,45 +596,76 @@ def analyze_resources(df, top_n=10):
     print("Análise de acesso a recursos concluída.")
     return results
 
-def analyze_404_errors(df, plot_dir, top_n=10):
+def latency_table(digest, qs=LATENCY_QUANTILES):
+    """Contagem e percentis (em ms) de cada chave de um t-digest, com colunas n, p50, p95..."""
+    tabela = digest.quantiles(qs).rename(columns={q: f"p{round(q * 100):g}" for q in qs})
+    return tabela.round(1)
+
+def latency_records(tabela):
+    """Converte uma tabela de latência em {chave: {n, p50, p95, p99}} com tipos nativos."""
+    return {chave: {col: int(valor) if col == 'n' else float(valor) for col, valor in linha.items()}
+            for chave, linha in tabela.iterrows()}
+
+@profiled()
+def analyze_latency(df, top_n=10, agg=None, min_requests=LATENCY_MIN_REQUESTS):
+    """Analisa a latência das requisições (duracao_ms dos logs do Traefik): p50, p95 e p99.
+
+    Os percentis saem dos t-digests das agregações, que se somam entre lotes
+    (modo incremental) e processos. Sem dados de latência, retorna {}.
+    """
+    if df is None or df.empty:
+        return {}
+    if agg is None:
+        agg = compute_aggregates(df)
+    if 'latencia_geral' not in agg:
+        print("Sem dados de latência (duracao_ms) nos logs; análise de latência ignorada.")
+        return {}
+    print("Analisando latência...")
+    geral = latency_records(latency_table(agg['latencia_geral']))[0]
+    results = {"total_com_latencia": geral.pop('n'), "geral": geral}
+    if 'latencia_roteador' in agg:
+        por_roteador = latency_table(agg['latencia_roteador'])
+        results[f"top_{top_n}_roteadores"] = latency_records(
+            por_roteador.sort_values('n', ascending=False, kind='stable').head(top_n))
+    if 'latencia_hora' in agg:
+        por_hora = latency_table(agg['latencia_hora'])
+        por_hora.index = por_hora.index.astype(int)
+        results["por_hora"] = latency_records(por_hora.sort_index())
+    if 'latencia_recurso' in agg:
+        por_recurso = latency_table(agg['latencia_recurso'])
+        por_recurso = por_recurso[por_recurso['n'] >= min_requests]
+        results[f"top_{top_n}_recursos_mais_lentos"] = latency_records(
+            por_recurso.sort_values('p95', ascending=False, kind='stable').head(top_n))
+        results["min_requisicoes_recurso"] = min_requests
+    print("Análise de latência concluída.")
+    return results
+
+@profiled()
+def analyze_404_errors(df, plot_dir, top_n=10, agg=None, plots=None):
     """Analisa especificamente os erros 404 (Não Encontrado)."""
     if df is None or df.empty:
         return {}
+    if agg is None:
+        agg = compute_aggregates(df)
     print("Analisando erros 404...")
-    df_404 = df[df['status'] == 404].copy()
-    total_registros_404 = df_404.shape[0]
+    total_registros_404 = agg['total_404']
 
     if total_registros_404 == 0:
         print("Nenhum erro 404 encontrado.")
         return {"total_erros_404": 0}
 
-    req_hora_404 = df_404.groupby('hora').size()
+    req_hora_404 = agg['404_por_hora']
     pico_hora_404 = int(req_hora_404.idxmax()) if not req_hora_404.empty else None
 
-    dias_ordem = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    req_dia_semana_404 = df_404.groupby('dia_semana').size().reindex(dias_ordem).fillna(0)
+    req_dia_semana_404 = agg['404_por_dia_semana']
     pico_dia_404 = req_dia_semana_404.idxmax() if not req_dia_semana_404.empty else None
 
-    contagem_recursos_404 = df_404['recurso'].value_counts()
+    contagem_recursos_404 = agg['recursos_404']
     mais_acessadas_404 = contagem_recursos_404.head(top_n)
-    menos_acessadas_404 = contagem_recursos_404.tail(top_n)
+    menos_acessadas_404 = contagem_recursos_404.iloc[:0] if 'sketch' in agg else contagem_recursos_404.tail(top_n)
 
-    plot_path_404_hora = os.path.join(plot_dir, "404_requests_per_hour.png")
-    try:
-        plt.figure(figsize=(10, 6))
-        req_hora_404.plot(kind='bar', color='salmon', edgecolor='black')
-        plt.title('Requisições com Status 404 por Hora do Dia')
-        plt.xlabel('Hora do dia')
-        plt.ylabel('Total de Requisições 404')
-        plt.xticks(rotation=0)
-        plt.grid(axis='y', linestyle='--', alpha=0.5)
-        plt.tight_layout()
-        plt.savefig(plot_path_404_hora)
-        plt.close()
-        print(f"Gráfico de 404 por hora salvo em: {plot_path_404_hora}")
-    except Exception as e:
-        print(f"Erro ao gerar gráfico de 404 por hora: {e}")
-        plot_path_404_hora = None
+    plot_path_404_hora = queue_plot(plots, "404_per_hour",
+                                    os.path.join(plot_dir, "404_requests_per_hour.png"), req_hora_404)
 
     results = {
         "total_erros_404": total_registros_404,
@@ -339,49 +680,227 @@ def analyze_404_errors(df, plot_dir, top_n=10):
     print("Análise de erros 404 concluída.")
     return results
 
-def detect_anomalies(df, plot_dir):
+def map_per_resource(recursos, func):
+    """Avalia func uma vez por recurso distinto e propaga o resultado para as linhas.
+
+    func recebe um Series de textos e devolve um Series ou DataFrame alinhado.
+    Em colunas categóricas, é avaliada só sobre as categorias (mais um valor
+    ausente, para onde apontam os códigos -1); nas demais, sobre a coluna
+    inteira convertida para texto. Retorna um array NumPy.
+    """
+    if isinstance(recursos.dtype, pd.CategoricalDtype):
+        categorias = pd.Series(list(recursos.cat.categories.astype(str)) + [None], dtype=str)
+        valores = func(categorias).to_numpy()
+        return valores[recursos.cat.codes.to_numpy()]
+    return func(recursos.astype(str)).to_numpy()
+
+def query_string_flags(recursos):
+    """Marca recursos com query string longa (> 100 caracteres) ou com muitos parâmetros (> 5)."""
+    partes = recursos.str.rpartition('?')
+    tem_query = partes[1] == '?'
+    query = partes[2]
+    return pd.DataFrame({
+        'query_string_longa': tem_query & (query.str.len() > 100),
+        'muitos_parametros': tem_query & (query.str.count('&') > 4),
+    })
+
+def rules_version(rules=RESOURCE_RULES):
+    """Identifica a versão do conjunto de regras (nomes, padrões e flags); editar uma regra invalida o cache."""
+    texto = "\n".join(f"{nome}|{padrao}|{int(flags)}" for nome, (padrao, flags) in rules.items())
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()[:16]
+
+def resource_hashes(valores):
+    """Hash de 64 bits (vetorizado) do texto de cada recurso, usado como chave no cache de regras."""
+    return pd.util.hash_array(valores.to_numpy(dtype=object)).view(np.int64)
+
+def load_rule_cache(cache_file, versao):
+    """Carrega o cache de regras (hashes ordenados, bits, dia do último uso); vazio se não existir ou for de outra versão."""
+    vazio = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32))
+    if not os.path.exists(cache_file):
+        return vazio
+    try:
+        with np.load(cache_file) as cache:
+            if str(cache['versao']) != versao:
+                return vazio
+            return cache['hashes'], cache['bits'], cache['dia']
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Erro ao ler o cache de regras em {cache_file}: {e}. Ele será recriado.")
+        return vazio
+
+def save_rule_cache(cache_file, versao, hashes, bits, dia, max_rows=RULES_CACHE_MAX_ROWS,
+                    max_age_days=RULES_CACHE_MAX_AGE_DAYS):
+    """Grava o cache de regras de forma atômica, sem os recursos antigos e com no máximo max_rows (os mais recentes)."""
+    indices = np.flatnonzero(dia >= int(time.time() // 86400) - max_age_days)
+    if len(indices) > max_rows:
+        indices = indices[np.argsort(-dia[indices], kind='stable')[:max_rows]]
+    indices = indices[np.argsort(hashes[indices])]
+    ensure_dir(os.path.dirname(cache_file) or ".")
+    tmp_file = cache_file + ".tmp.npz"
+    np.savez(tmp_file, versao=np.array(versao), hashes=hashes[indices], bits=bits[indices], dia=dia[indices])
+    os.replace(tmp_file, cache_file)
+
+def lookup_rule_cache(cache_hashes, cache_bits, hashes):
+    """Posição de cada hash no cache e os bits conhecidos (-1 nos dois quando o hash não está no cache)."""
+    if not len(cache_hashes):
+        ausente = np.full(len(hashes), -1, dtype=np.int64)
+        return ausente, ausente.copy()
+    pos = np.minimum(np.searchsorted(cache_hashes, hashes), len(cache_hashes) - 1)
+    encontrado = cache_hashes[pos] == hashes
+    return np.where(encontrado, pos, -1), np.where(encontrado, cache_bits[pos], -1)
+
+def evaluate_resource_rules(recursos, cache_file=RULES_CACHE_FILE, min_cache_resources=RULES_CACHE_MIN_RESOURCES):
+    """Aplica as RESOURCE_RULES uma vez por recurso distinto e propaga os resultados às linhas.
+
+    Só os recursos que aparecem nas linhas são avaliados. Com cache_file, os
+    resultados (todas as regras de um recurso em bits) são reaproveitados
+    entre execuções: o cache é lido de uma vez e consultado por busca
+    binária sobre os hashes. Com menos de min_cache_resources recursos
+    distintos, ou cache_file=None, o cache não é usado.
+    Retorna um dicionário nome da regra -> array booleano por linha.
+    """
+    if isinstance(recursos.dtype, pd.CategoricalDtype):
+        codes = recursos.cat.codes.to_numpy()
+        valores = pd.Series(recursos.cat.categories.astype(str))
+    else:
+        codes, uniques = pd.factorize(recursos.astype(str))
+        valores = pd.Series(uniques)
+    usados = np.flatnonzero(np.bincount(codes[codes >= 0], minlength=len(valores)))
+    # Uma posição extra, sempre 0, para os códigos -1 (recurso ausente)
+    bits = np.zeros(len(valores) + 1, dtype=np.int64)
+    pendentes = usados
+
+    usar_cache = bool(cache_file) and len(usados) >= min_cache_resources
+    if usar_cache:
+        versao = rules_version()
+        cache_hashes, cache_bits, cache_dia = load_rule_cache(cache_file, versao)
+        hashes = resource_hashes(valores.iloc[usados])
+        pos, conhecidos = lookup_rule_cache(cache_hashes, cache_bits, hashes)
+        bits[usados] = np.maximum(conhecidos, 0)
+        pendentes = usados[conhecidos < 0]
+
+    if len(pendentes):
+        textos = valores.iloc[pendentes]
+        novos = np.zeros(len(pendentes), dtype=np.int64)
+        for i, (padrao, flags) in enumerate(RESOURCE_RULES.values()):
+            novos |= textos.str.contains(padrao, flags=flags, regex=True, na=False).to_numpy(dtype=np.int64) << i
+        bits[pendentes] = novos
+
+    if usar_cache:
+        hoje = int(time.time() // 86400)
+        cache_dia = cache_dia.copy()
+        cache_dia[pos[pos >= 0]] = hoje
+        novos_hashes = hashes[conhecidos < 0]
+        save_rule_cache(cache_file, versao, np.r_[cache_hashes, novos_hashes], np.r_[cache_bits, bits[pendentes]],
+                        np.r_[cache_dia, np.full(len(novos_hashes), hoje, dtype=np.int32)])
+    por_linha = bits[codes]
+    return {nome: (por_linha >> i & 1).astype(bool) for i, nome in enumerate(RESOURCE_RULES)}
+
+def detect_ip_bursts(ips, tempos, windows=BURST_WINDOWS, top_n=10):
+    """Detecta rajadas de requisições por IP em janelas deslizantes de tempo.
+
+    As linhas são ordenadas uma única vez por (IP, segundo), em uma chave
+    int64; para cada janela, uma busca binária vetorizada encontra o início
+    da janela que termina em cada requisição (varredura de dois ponteiros sem
+    laços por IP). Retorna a máscara das requisições que fecham uma janela
+    acima do limite, o pico por IP em cada janela e os intervalos de rajada
+    (janelas sobrepostas do mesmo IP são unidas).
+    """
+    if isinstance(ips.dtype, pd.CategoricalDtype):
+        codes, uniques = ips.cat.codes.to_numpy().astype(np.int64), ips.cat.categories
+    else:
+        codes, uniques = pd.factorize(ips)
+        codes = codes.astype(np.int64)
+    segundos = tempos.to_numpy().astype('datetime64[s]').astype(np.int64)
+    base = segundos.min() - max(windows)
+    segundos = segundos - base  # todos >= maior janela: a busca nunca invade o bloco do IP anterior
+    span = int(segundos.max()) + 1
+    chave = codes * span + segundos
+    ordem = np.argsort(chave)
+    chave = chave[ordem]
+    ip_ordenado = chave // span
+    inicio_ip = np.flatnonzero(np.r_[True, ip_ordenado[1:] != ip_ordenado[:-1]])
+    # Requisições no mesmo segundo contam todas para a janela que termina nele
+    direita = np.searchsorted(chave, chave, side='right')
+
+    mascara = np.zeros(len(chave), dtype=bool)
+    picos = {}
+    intervalos = []
+    for janela, limite in windows.items():
+        esquerda = np.searchsorted(chave, chave - janela + 1, side='left')
+        contagem = direita - esquerda
+        picos[f"{janela}s"] = np.maximum.reduceat(contagem, inicio_ip)
+        rajada = contagem > limite
+        if not rajada.any():
+            continue
+        mascara[ordem[rajada]] = True
+        # Une janelas sobrepostas: novo intervalo quando o início passa do maior fim anterior
+        ini, fim, pico = chave[esquerda[rajada]], chave[rajada], contagem[rajada]
+        grupos = np.flatnonzero(np.r_[True, ini[1:] > np.maximum.accumulate(fim)[:-1]])
+        inicio = np.minimum.reduceat(ini, grupos)
+        intervalos.append(pd.DataFrame({
+            "ip": uniques[inicio // span],
+            "janela_s": janela,
+            "inicio": pd.to_datetime(inicio % span + base, unit='s'),
+            "fim": pd.to_datetime(np.maximum.reduceat(fim, grupos) % span + base, unit='s'),
+            "pico": np.maximum.reduceat(pico, grupos),
+        }))
+
+    picos = pd.DataFrame(picos, index=uniques[ip_ordenado[inicio_ip]])
+    picos = picos.sort_values(list(picos.columns), ascending=False, kind='stable')
+    intervalos = pd.concat(intervalos, ignore_index=True) if intervalos else pd.DataFrame(
+        columns=["ip", "janela_s", "inicio", "fim", "pico"])
+    top_intervalos = intervalos.sort_values(["pico", "janela_s"], ascending=False, kind='stable').head(top_n)
+    return mascara, {
+        "limites": {f"{janela}s": limite for janela, limite in windows.items()},
+        "picos_por_ip": {ip: {k: int(v) for k, v in linha.items()} for ip, linha in picos.head(top_n).iterrows()},
+        "total_ips_com_rajada": int(intervalos['ip'].nunique()),
+        "total_intervalos": {f"{janela}s": int((intervalos['janela_s'] == janela).sum()) for janela in windows},
+        "intervalos": [
+            {"ip": linha.ip, "janela_s": int(linha.janela_s), "inicio": linha.inicio.isoformat(),
+             "fim": linha.fim.isoformat(), "pico": int(linha.pico)}
+            for linha in top_intervalos.itertuples()
+        ],
+    }
+
+@profiled()
+def detect_anomalies(df, plot_dir, agg=None, plots=None):
     """Detecta potenciais anomalias nas requisições com base em um conjunto de regras."""
     if df is None or df.empty:
         return {}, pd.DataFrame()
+    if agg is None:
+        agg = compute_aggregates(df)
     print("Detectando anomalias...")
 
     # 1. Métodos HTTP incomuns
-    metodos_incomuns = ['CONNECT', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE']
+    metodos_incomuns = METODOS_INCOMUNS
     df_metodos_anomalos = df[df['metodo'].isin(metodos_incomuns)].copy()
-    contagem_metodos_anomalos = df_metodos_anomalos['metodo'].value_counts().to_dict()
+    contagem_metodos_anomalos = count_values(df_metodos_anomalos['metodo']).to_dict()
 
     # 2. IPs com muitos erros 404
-    df_404 = df[df['status'] == 404]
-    ips_com_404 = df_404['ip'].value_counts()
+    ips_com_404 = agg['ips_404']
     ips_suspeitos_404 = ips_com_404[ips_com_404 > 5].head(10).to_dict()
 
     # 3. Tamanho de resposta suspeito (maior que 1MB)
-    limite_tamanho = 1 * 1024 * 1024  # 1 MB
+    limite_tamanho = LIMITE_TAMANHO
     df_tamanho_suspeito = df[df['tamanho'] > limite_tamanho].copy()
     contagem_tamanho_suspeito = df_tamanho_suspeito.shape[0]
-    recursos_tamanho_suspeito = df_tamanho_suspeito['recurso'].value_counts().head(10).to_dict()
+    recursos_tamanho_suspeito = count_values(df_tamanho_suspeito['recurso']).head(10).to_dict()
 
     # 4. Filtragem e Análise de Padrões em Recursos
-    recursos_normais = ["/cppgi/api/editais", "/cppgi/", "/main/", "/pesquisa/", "/favicon.ico"]
-    padrao_recursos_normais = '^(?:' + '|'.join(re.escape(r) for r in recursos_normais) + ')'
-    df_filtrado = df[~df['recurso'].astype(str).str.match(padrao_recursos_normais, na=False)].copy()
-
-    # Marcadores de anomalias
-    padrao_sql = r'(?:\bselect\b|\bunion\b|\bdrop\b|\binsert\b|\bupdate\b|\bdelete\b|[\;\*\'\]-])'
-    df_filtrado['suspeita_sql'] = df_filtrado['recurso'].astype(str).str.contains(padrao_sql, flags=re.IGNORECASE, regex=True, na=False)
+    mascara_filtrado = ~map_per_resource(df['recurso'], lambda r: r.str.match(PADRAO_RECURSOS_NORMAIS, na=False)).astype(bool)
+    df_filtrado = df[mascara_filtrado].copy()
 
-    padrao_xss = r'(?:<script|alert\(|onerror=|onload=|javascript:|data:|\%3C|\%3E)'
-    df_filtrado['suspeita_xss'] = df_filtrado['recurso'].astype(str).str.contains(padrao_xss, flags=re.IGNORECASE, regex=True, na=False)
+    # Marcadores de anomalias (SQLi, XSS e extensões incomuns): uma avaliação por recurso distinto
+    for nome, marcador in evaluate_resource_rules(df_filtrado['recurso']).items():
+        df_filtrado[nome] = marcador
 
-    padrao_ext = r'\.(?:php|asp|jsp|cgi|pl|exe|dll|sh|bash|py|rb|bak|sql|conf|ini|log|swp|env)(?:[\?#]$)'
-    df_filtrado['extensao_incomum'] = df_filtrado['recurso'].astype(str).str.contains(padrao_ext, regex=True, na=False)
+    comprimento_url = pd.Series(map_per_resource(df_filtrado['recurso'], lambda r: r.str.len()), index=df_filtrado.index)
+    limite_url = comprimento_url.quantile(0.98)
+    df_filtrado['url_longa'] = comprimento_url > limite_url
 
-    limite_url = df_filtrado['recurso'].astype(str).str.len().quantile(0.98)
-    df_filtrado['url_longa'] = df_filtrado['recurso'].astype(str).str.len() > limite_url
+    df_filtrado['recurso_404'] = agg['mascara_404'][mascara_filtrado]
 
-    df_filtrado['recurso_404'] = df_filtrado['status'] == 404
-
-    contagem_recursos_filtrados = df_filtrado['recurso'].value_counts()
+    contagem_recursos_filtrados = count_values(df_filtrado['recurso'])
     limiar_sup = contagem_recursos_filtrados.quantile(0.99)
     limiar_inf = contagem_recursos_filtrados.quantile(0.01)
     recursos_raros = contagem_recursos_filtrados[contagem_recursos_filtrados <= max(1, limiar_inf)].index
@@ -397,18 +916,27 @@ def detect_anomalies(df, plot_dir):
     # 5. Requisições com muitos parâmetros/query strings longas
     # Define um limiar para o número de parâmetros ou comprimento da query string
     # Exemplo: mais de 5 parâmetros ou query string com mais de 100 caracteres
-    df_filtrado['query_string_longa'] = df_filtrado['recurso'].astype(str).apply(lambda x: len(x.split('?')[-1]) > 100 if '?' in x else False)
-    df_filtrado['muitos_parametros'] = df_filtrado['recurso'].astype(str).apply(lambda x: len(x.split('?')[-1].split('&')) > 5 if '?' in x else False)
-
-    # 6. Picos de requisições por IP em curto período (ex: mais de 10 requisições em 1 segundo)
-    # Para uma abordagem simples, podemos identificar IPs com um número muito alto de requisições totais.
-    ip_request_counts = df['ip'].value_counts()
-    high_request_ip_threshold = ip_request_counts.quantile(0.99) # IPs no top 1% de requisições
-    high_request_ips = ip_request_counts[ip_request_counts > high_request_ip_threshold].index
+    flags_query = map_per_resource(df_filtrado['recurso'], query_string_flags)
+    df_filtrado['query_string_longa'] = flags_query[:, 0]
+    df_filtrado['muitos_parametros'] = flags_query[:, 1]
+
+    # 6. IPs com volume total de requisições muito alto (top 1%); as rajadas em
+    # janelas curtas de tempo são tratadas no item 7.
+    ip_request_counts = agg['ips']
+    if 'sketch' in agg:
+        # Modo aproximado: o top 1% dos IPs distintos estimados, dentre os mantidos pelo sketch
+        high_request_ips = ip_request_counts.head(max(1, agg['sketch']['ips_distintos'] // 100)).index
+    else:
+        high_request_ip_threshold = ip_request_counts.quantile(0.99) # IPs no top 1% de requisições
+        high_request_ips = ip_request_counts[ip_request_counts > high_request_ip_threshold].index
     df_filtrado['ip_alto_volume'] = df_filtrado['ip'].isin(high_request_ips)
 
+    # 7. Rajadas por IP em janelas deslizantes (ex.: mais de 10 requisições em 1 segundo)
+    mascara_rajada, rajadas = detect_ip_bursts(df['ip'], df['data1'])
+    df_filtrado['rajada_ip'] = mascara_rajada[mascara_filtrado]
+
     cols_anomalias_todas = cols_anomalias + ['metodo_incomum', 'ip_com_muitos_404', 'tamanho_resposta_suspeito', 
-                                            'query_string_longa', 'muitos_parametros', 'ip_alto_volume']
+                                            'query_string_longa', 'muitos_parametros', 'ip_alto_volume', 'rajada_ip']
 
     df_filtrado['anomalia_detectada'] = df_filtrado[cols_anomalias_todas].any(axis=1)
     df_anomalias_final = df_filtrado[df_filtrado['anomalia_detectada']].copy()
@@ -418,53 +946,17 @@ def detect_anomalies(df, plot_dir):
     total_registros = df.shape[0]
     percentual_anomalias = (total_anomalias / total_registros * 100) if total_registros > 0 else 0
 
-    top_recursos_anomalos = df_anomalias_final['recurso'].value_counts().head(10).to_dict()
+    top_recursos_anomalos = count_values(df_anomalias_final['recurso']).head(10).to_dict()
 
-    status_anomalias = df_anomalias_final['status'].value_counts().sort_index()
-    status_anomalias_pct = (df_anomalias_final['status'].value_counts(normalize=True) * 100).sort_index()
+    status_anomalias = count_values(df_anomalias_final['status']).sort_index()
+    status_anomalias_pct = (count_values(df_anomalias_final['status'], normalize=True) * 100).sort_index()
 
-    anomalias_plot_path = os.path.join(plot_dir, "anomaly_types_count.png")
-    try:
-        anomalias_series = pd.Series(contagem_tipos_anomalia).sort_values(ascending=False)
-        plt.figure(figsize=(10, 6))
-        bars = anomalias_series.plot(kind='bar', color='coral', edgecolor='black')
-        plt.title('Contagem de Tipos de Anomalias Detectadas', fontsize=14, fontweight='bold')
-        plt.ylabel('Quantidade de Ocorrências', fontsize=12)
-        plt.xlabel('Tipo de Anomalia', fontsize=12)
-        plt.xticks(rotation=45, ha='right')
-        plt.grid(axis='y', linestyle='--', alpha=0.5)
-        for bar in bars.containers[0]:
-            height = bar.get_height()
-            if height > 0:
-                plt.text(bar.get_x() + bar.get_width()/2, height + max(1, height*0.01), f'{int(height)}', ha='center', va='bottom', fontsize=10)
-        plt.tight_layout()
-        plt.savefig(anomalias_plot_path)
-        plt.close()
-        print(f"Gráfico de tipos de anomalia salvo em: {anomalias_plot_path}")
-    except Exception as e:
-        print(f"Erro ao gerar gráfico de tipos de anomalia: {e}")
-        anomalias_plot_path = None
-
-    status_anomalias_plot_path = os.path.join(plot_dir, "anomaly_status_distribution_pct.png")
-    try:
-        plt.figure(figsize=(8, 5))
-        bars = plt.bar(status_anomalias_pct.index.astype(str), status_anomalias_pct.values, color='lightcoral', edgecolor='black')
-        for bar in bars:
-            yval = bar.get_height()
-            if yval > 0:
-                plt.text(bar.get_x() + bar.get_width()/2, yval + 0.5, f'{yval:.2f}%', ha='center', va='bottom')
-        plt.title('Distribuição de Status HTTP nas Requisições Anômalas (%)')
-        plt.xlabel('Código de Status HTTP')
-        plt.ylabel('Porcentagem')
-        plt.ylim(0, 100)
-        plt.grid(axis='y', linestyle='--', alpha=0.5)
-        plt.tight_layout()
-        plt.savefig(status_anomalias_plot_path)
-        plt.close()
-        print(f"Gráfico de status em anomalias salvo em: {status_anomalias_plot_path}")
-    except Exception as e:
-        print(f"Erro ao gerar gráfico de status em anomalias: {e}")
-        status_anomalias_plot_path = None
+    anomalias_series = pd.Series(contagem_tipos_anomalia, dtype='int64').sort_values(ascending=False)
+    anomalias_plot_path = queue_plot(plots, "anomaly_types",
+                                     os.path.join(plot_dir, "anomaly_types_count.png"), anomalias_series)
+    status_anomalias_plot_path = queue_plot(plots, "anomaly_status_pct",
+                                            os.path.join(plot_dir, "anomaly_status_distribution_pct.png"),
+                                            status_anomalias_pct)
 
     results = {
         "total_requisicoes_analisadas_para_anomalias": df_filtrado.shape[0],
@@ -484,15 +976,34 @@ def detect_anomalies(df, plot_dir):
         "plot_path_status_anomalias": status_anomalias_plot_path,
         "recursos_query_string_longa": Counter(df_filtrado[df_filtrado['query_string_longa']]['recurso']).most_common(10),
         "recursos_muitos_parametros": Counter(df_filtrado[df_filtrado['muitos_parametros']]['recurso']).most_common(10),
-        "ips_alto_volume": Counter(df_filtrado[df_filtrado['ip_alto_volume']]['ip']).most_common(10)
+        "ips_alto_volume": Counter(df_filtrado[df_filtrado['ip_alto_volume']]['ip']).most_common(10),
+        "rajadas_por_ip": rajadas
     }
     print("Detecção de anomalias concluída.")
     return results, df_anomalias_final
 
 # --- Função Principal de Análise ---
 
-def run_analysis(df):
-    """Orquestra a execução de todas as funções de análise."""
+def clear_missing_plots(results, rendered):
+    """Anula nos resultados os caminhos de gráficos fora de rendered (gerados ou adiados nesta execução)."""
+    for section in results.values():
+        if isinstance(section, dict):
+            for key, value in section.items():
+                if key.startswith('plot_path') and value not in rendered:
+                    section[key] = None
+
+def run_analysis(df, geoip_db=None, plots="eager", state_file=None, sketch=None):
+    """Orquestra a execução de todas as funções de análise.
+
+    geoip_db: tabela CSV local de faixas de IP para geolocalização offline.
+    plots: "eager" gera os gráficos em paralelo ao final, "lazy" os adia
+    para `loguard plots` e "none" não gera gráficos (ver plotting.PLOT_MODES).
+    state_file: modo incremental; o DataFrame é somado ao estado salvo e o
+    relatório cobre todo o histórico (exceto anomalias, só do lote novo).
+    sketch: modo aproximado para IPs e recursos, ex. {"k": 1000, "p": 14},
+    com "sketches" de sketch_sources quando já calculados dos arquivos
+    (não combinável com state_file).
+    """
     ensure_dir(OUTPUT_DIR)
     ensure_dir(PLOT_DIR)
 
@@ -501,19 +1012,51 @@ def run_analysis(df):
     if df is not None:
         all_results = {}
 
-        all_results['general_stats'] = calculate_general_stats(df)
-        all_results['status_codes'] = analyze_status_codes(df, PLOT_DIR)
-        all_results['time_patterns'] = analyze_time_patterns(df, PLOT_DIR)
-        all_results['resource_analysis'] = analyze_resources(df)
-        all_results['404_analysis'] = analyze_404_errors(df, PLOT_DIR)
+        # Barata: o layout anterior é medido só em uma amostra das linhas
+        memoria = all_results['memory_usage'] = memory_comparison(df)
+        print(f"Memória do DataFrame: ~{memoria['memoria_layout_anterior_mb']:.2f} MB no layout anterior "
+              f"(textos como object, estimado em {memoria['linhas_amostra']:,} linhas) -> "
+              f"{memoria['memoria_tipada_mb']:.2f} MB com a tipagem compacta")
+
+        if state_file:
+            agg = update_state(df, state_file)
+            all_results['incremental'] = {
+                "arquivo_estado": state_file,
+                "lotes_incorporados": agg["lotes"],
+                "registros_no_lote": int(df.shape[0]),
+            }
+        else:
+            agg = compute_aggregates(df, sketch=sketch)
+            if 'sketch' in agg:
+                all_results['sketch'] = agg['sketch']
+        plot_jobs = []
+
+        all_results['general_stats'] = calculate_general_stats(df, agg=agg)
+        all_results['status_codes'] = analyze_status_codes(df, PLOT_DIR, agg=agg, plots=plot_jobs)
+        all_results['time_patterns'] = analyze_time_patterns(df, PLOT_DIR, agg=agg, plots=plot_jobs)
+        all_results['resource_analysis'] = analyze_resources(df, agg=agg)
+        all_results['404_analysis'] = analyze_404_errors(df, PLOT_DIR, agg=agg, plots=plot_jobs)
+        all_results['latency'] = analyze_latency(df, agg=agg)
         
         # A geolocalização agora foca apenas nos IPs com status 404
-        ip_geo_results = analyze_ip_geolocation(df)
+        ip_geo_results = analyze_ip_geolocation(df, agg=agg, geoip_db=geoip_db)
         all_results['ip_geolocation'] = ip_geo_results # Renomeado para refletir o foco
 
-        anomaly_results, df_anomalies = detect_anomalies(df, PLOT_DIR)
+        anomaly_results, df_anomalies = detect_anomalies(df, PLOT_DIR, agg=agg, plots=plot_jobs)
         all_results['anomaly_detection'] = anomaly_results
 
+        # Gráficos: gerados depois de todas as agregações, em paralelo
+        rendered = set()
+        if plots == "eager":
+            rendered = render_plots(plot_jobs)
+        elif plots == "lazy":
+            # Os caminhos planejados ficam no relatório, marcados como pendentes até `loguard plots`
+            save_plot_jobs(plot_jobs)
+            rendered = {job["path"] for job in plot_jobs}
+            all_results['graficos_pendentes'] = bool(plot_jobs)
+            print("Gráficos adiados: execute `loguard plots` para gerá-los.")
+        clear_missing_plots(all_results, rendered)
+
         print("\n--- Análise Concluída ---")
         return all_results
     else:
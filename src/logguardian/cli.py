@@ -1,12 +1,14 @@
 import argparse
 import os
-import pandas as pd
-from .normalizer import normalize_log
-from .analysis import run_analysis
-from .report_generator import export_to_markdown
+
+# Os módulos de normalização e análise (pandas, matplotlib, ...) são importados
+# apenas dentro dos subcomandos que os usam, para manter rápida a inicialização
+# de chamadas como `loguard -h`.
 
 OUTPUT_DIR = "./output"
 MD_OUTPUT_FILE = os.path.join(OUTPUT_DIR, "analysis_report.md")
+NORMALIZED_EXTENSIONS = (".csv", ".parquet", ".pq", ".feather", ".arrow")
+PARTITION_MANIFEST = "_manifest.json"  # manifesto dos conjuntos particionados (ver normalizer)
 
 # ---- Custom Formatter para deixar o help bonito ----
 class CustomHelpFormatter(argparse.RawTextHelpFormatter):
@@ -21,6 +23,74 @@ class CustomHelpFormatter(argparse.RawTextHelpFormatter):
             return "".join(parts)
         return super()._format_action(action)
 
+def add_normalize_options(subparser):
+    """Adiciona as opções de normalização comuns aos subcomandos normalize e process."""
+    subparser.add_argument("--chunk-size", type=int, default=None,
+                           help="Processa o log em lotes de N linhas, gravando a saída de forma incremental")
+    subparser.add_argument("--workers", type=int, default=1,
+                           help="Número de processos para normalizar o log em paralelo [padrão: 1]")
+    subparser.add_argument("--utc", action="store_true",
+                           help="Converte os horários para UTC usando o fuso horário de cada linha")
+    subparser.add_argument("--format", choices=["csv", "parquet", "feather"], default=None,
+                           help="Formato do arquivo normalizado [padrão: pela extensão, ou csv]")
+    subparser.add_argument("--log-format", choices=["auto", "clf", "json"], default="auto",
+                           help="Formato dos logs de entrada: clf (texto) ou json (access log JSON do Traefik, "
+                                "com duração, roteador, serviço, host e user agent) [padrão: auto, pela primeira linha]")
+
+def add_analysis_options(subparser):
+    """Adiciona as opções de análise comuns aos subcomandos analyze e process."""
+    subparser.add_argument("--geoip-db", default=None,
+                           help="Tabela CSV de faixas de IP (start,end,country,region,city) para geolocalização offline")
+    subparser.add_argument("--plots", choices=["eager", "lazy", "none"], default="eager",
+                           help="eager: gera os gráficos em paralelo; lazy: adia para `loguard plots`; "
+                                "none: relatório só com tabelas [padrão: eager]")
+    subparser.add_argument("--no-plots", dest="plots", action="store_const", const="none",
+                           help="Atalho para --plots=none")
+    subparser.add_argument("--incremental", action="store_true",
+                           help="Soma os dados ao estado salvo das execuções anteriores e gera o relatório do histórico")
+    subparser.add_argument("--state-file", default=None,
+                           help="Arquivo de estado do modo incremental (implica --incremental) "
+                                "[padrão: output/analysis_state.pkl]")
+    subparser.add_argument("--sketch", action="store_true",
+                           help="Modo aproximado para IPs e recursos (Space-Saving + HyperLogLog), com memória limitada")
+    subparser.add_argument("--sketch-k", type=int, default=1000,
+                           help="Contadores do Space-Saving; erro máximo por contagem = total / k [padrão: 1000]")
+    subparser.add_argument("--hll-precision", type=int, default=14,
+                           help="Precisão p do HyperLogLog (2^p registradores, erro ~1,04/raiz(2^p)) [padrão: 14]")
+
+def add_profile_options(subparser):
+    """Adiciona as opções do perfil de execução (tempo e memória por estágio)."""
+    subparser.add_argument("--profile", action="store_true",
+                           help="Mede tempo de parede, CPU, linhas e pico de memória de cada estágio")
+    subparser.add_argument("--profile-file", default=None,
+                           help="Arquivo JSON do perfil (implica --profile) [padrão: output/profile.json]")
+
+def finish_profile(args):
+    """Exibe a tabela do perfil de execução e a grava em JSON."""
+    from .profiling import active, format_profile, save_profile, PROFILE_FILE
+    summary = active().summary()
+    summary["comando"] = args.command
+    print("\n--- Perfil de Execução ---")
+    print(format_profile(summary))
+    print(f"Perfil salvo em: {save_profile(summary, args.profile_file or PROFILE_FILE)}")
+
+def split_output(args):
+    """Mantém a forma `<src> <out>`: o último posicional vira a saída se tiver extensão de arquivo normalizado.
+
+    Com --partitioned, a saída é um diretório: o último posicional vira a
+    saída se terminar em / ou já for um conjunto particionado.
+    """
+    if args.out is None:
+        ultimo = args.src[-1]
+        if getattr(args, "partitioned", False):
+            saida = ultimo.endswith(("/", os.sep)) or os.path.isfile(os.path.join(ultimo, PARTITION_MANIFEST))
+        else:
+            saida = os.path.splitext(ultimo)[1].lower() in NORMALIZED_EXTENSIONS
+        if len(args.src) > 1 and saida:
+            args.out = args.src.pop()
+        else:
+            args.out = "traefik_dataset" if getattr(args, "partitioned", False) else "traefik.csv"
+
 def main():
     parser = argparse.ArgumentParser(
         prog="loguard",
@@ -34,47 +104,147 @@ def main():
         "normalize",
         help="Normaliza logs crus (.log) em CSV",
         description="Normaliza logs crus (.log) em CSV",
-        usage="normalize <src = file.log> <out = file.csv>"
+        usage="normalize <src = file.log ...> <out = file.csv>"
     )
-    parser_norm.add_argument("src", help="Arquivo de log de entrada (.log)")
-    parser_norm.add_argument("out", nargs="?", default="traefik.csv",
-                             help="Arquivo CSV de saída (.csv) [padrão: traefik.csv]")
+    parser_norm.add_argument("src", nargs="+",
+                             help="Logs de entrada: arquivos, diretórios ou globs (.log, .gz, .bz2, .xz, .zst); "
+                                  "o último, se for .csv/.parquet/.feather, é o arquivo de saída")
+    parser_norm.add_argument("-o", "--out", default=None,
+                             help="Arquivo de saída (.csv, .parquet ou .feather) [padrão: traefik.csv]")
+    add_normalize_options(parser_norm)
+    parser_norm.add_argument("--partitioned", action="store_true",
+                             help="Grava um conjunto particionado por dia (diretório com data2=AAAA-MM-DD/ em "
+                                  "parquet ou feather); as linhas de um dia já gravado são juntadas às da "
+                                  "partição dele se os horários não se sobrepuserem "
+                                  "[padrão do diretório: traefik_dataset]")
+    parser_norm.add_argument("--replace", action="store_true",
+                             help="Com --partitioned, substitui por inteiro as partições dos dias presentes nos "
+                                  "logs (ex.: ao renormalizar o mesmo log)")
+    add_profile_options(parser_norm)
 
     # Subcomando: analyze
     parser_analyze = subparsers.add_parser(
         "analyze",
         help="Executa análise em CSV normalizado",
         description="Executa análise em CSV normalizado",
-        usage="analyze <src = file.csv>"
+        usage="analyze <src = file.csv ...>"
     )
-    parser_analyze.add_argument("src", help="Arquivo CSV normalizado")
+    parser_analyze.add_argument("src", nargs="+",
+                                help="Arquivos normalizados (.csv, .parquet ou .feather), diretórios, globs "
+                                     "ou conjuntos particionados (normalize --partitioned)")
+    parser_analyze.add_argument("--format", choices=["csv", "parquet", "feather"], default=None,
+                                help="Formato do arquivo normalizado [padrão: pela extensão, ou csv]")
+    parser_analyze.add_argument("--since", default=None,
+                                help="Analisa só as requisições a partir desta data (AAAA-MM-DD ou "
+                                     "'AAAA-MM-DD HH:MM:SS'); em conjuntos particionados, as demais partições não são lidas")
+    parser_analyze.add_argument("--until", default=None,
+                                help="Analisa só as requisições até esta data, inclusive (AAAA-MM-DD ou "
+                                     "'AAAA-MM-DD HH:MM:SS')")
+    parser_analyze.add_argument("--workers", type=int, default=1,
+                                help="Número de processos para os sketches do modo aproximado (--sketch), "
+                                     "um arquivo ou partição por tarefa [padrão: 1]")
+    add_analysis_options(parser_analyze)
+    add_profile_options(parser_analyze)
 
     # Subcomando: process
     parser_process = subparsers.add_parser(
         "process",
         help="Executa normalização e análise em sequência",
         description="Executa normalização e análise em sequência",
-        usage="process <src = file.log> <out = file.csv>"
+        usage="process <src = file.log ...> <out = file.csv>"
     )
-    parser_process.add_argument("src", help="Arquivo de log cru (.log)")
-    parser_process.add_argument("out", nargs="?", default="traefik.csv",
-                                help="Arquivo CSV intermediário de saída (.csv) [padrão: traefik.csv]")
+    parser_process.add_argument("src", nargs="+",
+                                help="Logs crus: arquivos, diretórios ou globs (.log, .gz, .bz2, .xz, .zst); "
+                                     "o último, se for .csv/.parquet/.feather, é o arquivo intermediário")
+    parser_process.add_argument("-o", "--out", default=None,
+                                help="Arquivo intermediário de saída (.csv, .parquet ou .feather) [padrão: traefik.csv]")
+    add_normalize_options(parser_process)
+    add_analysis_options(parser_process)
+    add_profile_options(parser_process)
+
+    # Subcomando: watch
+    parser_watch = subparsers.add_parser(
+        "watch",
+        help="Acompanha um log em tempo real e emite alertas de anomalia",
+        description="Acompanha um log em tempo real e emite alertas de anomalia",
+        usage="watch <src = access.log>"
+    )
+    parser_watch.add_argument("src", help="Arquivo de log do Traefik a acompanhar (como tail -F)")
+    parser_watch.add_argument("--json", action="store_true",
+                              help="Emite os alertas como JSON lines")
+    parser_watch.add_argument("--output", default=None,
+                              help="Grava os alertas neste arquivo (append) em vez do stdout")
+    parser_watch.add_argument("--from-start", action="store_true",
+                              help="Processa também o conteúdo já existente no arquivo")
+    parser_watch.add_argument("--poll-interval", type=float, default=0.2,
+                              help="Intervalo, em segundos, entre verificações do arquivo [padrão: 0.2]")
+
+    # Subcomando: plots
+    parser_plots = subparsers.add_parser(
+        "plots",
+        help="Gera os gráficos adiados por --plots=lazy",
+        description="Gera os gráficos adiados por --plots=lazy",
+        usage="plots"
+    )
+    parser_plots.add_argument("--workers", type=int, default=None,
+                              help="Número de processos para gerar os gráficos [padrão: número de CPUs]")
 
     args = parser.parse_args()
+    if args.command in ("normalize", "process"):
+        split_output(args)
+    if getattr(args, "sketch", False) and (args.incremental or args.state_file):
+        parser.error("--sketch não pode ser combinado com o modo incremental")
+    if getattr(args, "partitioned", False) and args.format == "csv":
+        parser.error("--partitioned grava parquet ou feather, não csv")
+    if getattr(args, "replace", False) and not args.partitioned:
+        parser.error("--replace só se aplica a conjuntos particionados (--partitioned)")
+    profile = getattr(args, "profile", False) or getattr(args, "profile_file", None)
+    if profile:
+        from .profiling import enable
+        enable()
 
     if args.command == "normalize":
+        from .normalizer import normalize_log
+
         print("Iniciando normalização...")
-        normalize_log(args.src, args.out)
+        try:
+            normalize_log(args.src, args.out, chunk_size=args.chunk_size, workers=args.workers, utc=args.utc,
+                          fmt=args.format, log_format=args.log_format, partitioned=args.partitioned,
+                          replace=args.replace)
+        except ValueError as e:
+            parser.error(str(e))
         print("Normalização concluida!.")
         print(f"Log normalizado salvo em: {args.out}")
 
     elif args.command == "analyze":
+        from .normalizer import read_normalized_many
+        from .analysis import run_analysis, sketch_sources, STATE_FILE, ANALYSIS_COLUMNS
+        from .report_generator import export_to_markdown
+
         print("Iniciando análise...")
-        df = pd.read_csv(args.src)
-        print("CSV carregado.")
+        sketch = {"k": args.sketch_k, "p": args.hll_precision} if args.sketch else None
+        try:
+            if sketch:
+                # Os sketches são calculados lendo os arquivos em lotes, antes de carregar o DataFrame
+                sketch["sketches"] = sketch_sources(args.src, args.format, since=args.since, until=args.until,
+                                                    workers=args.workers, **sketch)
+            df = read_normalized_many(args.src, args.format, since=args.since, until=args.until,
+                                      columns=ANALYSIS_COLUMNS)
+        except ValueError as e:
+            parser.error(str(e))
+        print("Arquivo normalizado carregado.")
 
-        results = run_analysis(df)
+        state_file = args.state_file or (STATE_FILE if args.incremental else None)
+        if df.empty:
+            print("Nenhum registro no intervalo pedido; análise não executada.")
+            results = None
+        else:
+            results = run_analysis(df, geoip_db=args.geoip_db, plots=args.plots, state_file=state_file,
+                                   sketch=sketch)
         if results:
+            if profile:
+                from .profiling import active
+                results['performance'] = active().summary()
             success = export_to_markdown(results, MD_OUTPUT_FILE)
             if success:
                 print(f"Relatório salvo em: {MD_OUTPUT_FILE}")
@@ -82,22 +252,58 @@ def main():
                 print("Erro ao gerar relatório.")
 
     elif args.command == "process":
+        from .normalizer import normalize_log, normalize_frame, read_normalized, write_normalized, to_typed_frame
+        from .analysis import run_analysis, sketch_sources, STATE_FILE
+        from .report_generator import export_to_markdown
+        from .profiling import stage
+
         # 1. Normalizar
-        normalize_log(args.src, args.out)
+        if args.chunk_size:
+            # Em lotes, a saída é gravada de forma incremental e relida para a análise
+            normalize_log(args.src, args.out, chunk_size=args.chunk_size, workers=args.workers,
+                          utc=args.utc, fmt=args.format, log_format=args.log_format)
+            df = read_normalized(args.out, args.format)
+        else:
+            # Sem lotes, o DataFrame segue em memória direto para a análise
+            df = normalize_frame(args.src, workers=args.workers, utc=args.utc, log_format=args.log_format)
+            write_normalized(df, args.out, args.format)
+            with stage("to_typed_frame", len(df)):
+                df = to_typed_frame(df)
         print(f"Log normalizado salvo em: {args.out}")
 
         # 2. Analisar
         print("Iniciando análise...")
-        df = pd.read_csv(args.out)
-        print("CSV carregado.")
 
-        results = run_analysis(df)
+        state_file = args.state_file or (STATE_FILE if args.incremental else None)
+        sketch = {"k": args.sketch_k, "p": args.hll_precision} if args.sketch else None
+        if sketch and args.chunk_size:
+            # Saída gravada em lotes: os sketches leem o arquivo em lotes, como no analyze
+            sketch["sketches"] = sketch_sources(args.out, args.format, workers=args.workers, **sketch)
+        results = run_analysis(df, geoip_db=args.geoip_db, plots=args.plots, state_file=state_file, sketch=sketch)
         if results:
+            if profile:
+                from .profiling import active
+                results['performance'] = active().summary()
             success = export_to_markdown(results, MD_OUTPUT_FILE)
             if success:
                 print(f"Relatório salvo em: {MD_OUTPUT_FILE}")
             else:
                 print("Erro ao gerar relatório.")
 
+    elif args.command == "watch":
+        from .watch import watch_log
+
+        watch_log(args.src, json_lines=args.json, output=args.output,
+                  from_start=args.from_start, poll_interval=args.poll_interval)
+
+    elif args.command == "plots":
+        from .plotting import render_pending_plots
+        from .report_generator import mark_plots_rendered
+
+        mark_plots_rendered(MD_OUTPUT_FILE, render_pending_plots(workers=args.workers))
+
+    if profile:
+        finish_profile(args)
+
 if __name__ == "__main__":
     main()
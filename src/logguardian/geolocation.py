@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import sqlite3
+import functools
+import threading
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Configurações de Geolocalização ---
+OUTPUT_DIR = "./output"
+GEO_CACHE_FILE = os.path.join(OUTPUT_DIR, "ip_geolocation_cache.sqlite")
+LEGACY_CACHE_FILE = os.path.join(OUTPUT_DIR, "ip_geolocation_cache.json")
+
+# API ip-api.com: o endpoint em lote aceita até 100 IPs por requisição e
+# 15 requisições por minuto no plano gratuito.
+BATCH_API_URL = "http://ip-api.com/batch"
+API_FIELDS = "status,message,country,regionName,city,query"
+BATCH_SIZE = 100
+RATE_LIMIT = 15      # requisições
+RATE_PERIOD = 60     # segundos
+MAX_WORKERS = 4
+MAX_RETRIES = 3
+RETRY_DELAY = 1      # segundos
+REQUEST_TIMEOUT = 10 # segundos
+
+# Validade das entradas do cache: resultados bem-sucedidos duram mais que erros
+CACHE_TTL = 30 * 24 * 3600
+NEGATIVE_TTL = 3600
+
+ERROR_RESULT = {"country": "Erro", "region": "Erro", "city": "Erro"}
+
+class RateLimiter:
+    """Token bucket thread-safe: libera até `rate` chamadas a cada `period` segundos."""
+
+    def __init__(self, rate=RATE_LIMIT, period=RATE_PERIOD):
+        self.capacity = rate
+        self.tokens = float(rate)
+        self.fill_rate = rate / period
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Bloqueia até haver um token disponível e o consome."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.fill_rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Esvazia o bucket por `seconds` segundos (ex.: quando a API avisa que o limite acabou)."""
+        with self.lock:
+            self.tokens = min(self.tokens, 0) - seconds * self.fill_rate
+            self.updated = time.monotonic()
+
+def _connect(cache_file):
+    """Abre o cache SQLite de geolocalização, criando a tabela se necessário."""
+    os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+    conn = sqlite3.connect(cache_file)
+    conn.execute("CREATE TABLE IF NOT EXISTS geolocation ("
+                 "ip TEXT PRIMARY KEY, country TEXT, region TEXT, city TEXT, "
+                 "ok INTEGER, updated_at REAL)")
+    return conn
+
+def _import_legacy_cache(conn, legacy_file=LEGACY_CACHE_FILE):
+    """Importa uma única vez o antigo cache JSON, descartando as entradas de erro."""
+    if not os.path.exists(legacy_file):
+        return
+    if conn.execute("SELECT 1 FROM geolocation LIMIT 1").fetchone():
+        return
+    try:
+        with open(legacy_file, 'r', encoding='utf-8') as f:
+            legacy = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Não foi possível importar o cache antigo {legacy_file}: {e}")
+        return
+    now = time.time()
+    rows = [(ip, loc.get("country"), loc.get("region"), loc.get("city"), 1, now)
+            for ip, loc in legacy.items() if loc.get("country") != "Erro"]
+    conn.executemany("INSERT OR IGNORE INTO geolocation VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    print(f"{len(rows)} entradas importadas do cache antigo {legacy_file}.")
+
+def load_cached_locations(ips, cache_file=GEO_CACHE_FILE, ttl=None, negative_ttl=None):
+    """Retorna as localizações ainda válidas no cache para os IPs informados.
+
+    Por padrão, usa CACHE_TTL para resultados bem-sucedidos e NEGATIVE_TTL para erros.
+    """
+    ttl = CACHE_TTL if ttl is None else ttl
+    negative_ttl = NEGATIVE_TTL if negative_ttl is None else negative_ttl
+    conn = _connect(cache_file)
+    try:
+        _import_legacy_cache(conn)
+        now = time.time()
+        found = {}
+        ips = list(ips)
+        for i in range(0, len(ips), 500):
+            chunk = ips[i:i + 500]
+            rows = conn.execute("SELECT ip, country, region, city, ok, updated_at FROM geolocation "
+                                f"WHERE ip IN ({','.join('?' * len(chunk))})", chunk)
+            for ip, country, region, city, ok, updated_at in rows:
+                if now - updated_at <= (ttl if ok else negative_ttl):
+                    found[ip] = {"country": country, "region": region, "city": city}
+        return found
+    finally:
+        conn.close()
+
+def store_locations(locations, cache_file=GEO_CACHE_FILE):
+    """Grava (ou atualiza) localizações no cache, marcando as de erro para expirarem antes."""
+    if not locations:
+        return
+    conn = _connect(cache_file)
+    try:
+        now = time.time()
+        conn.executemany("INSERT OR REPLACE INTO geolocation VALUES (?, ?, ?, ?, ?, ?)",
+                         [(ip, loc["country"], loc["region"], loc["city"],
+                           0 if loc == ERROR_RESULT else 1, now)
+                          for ip, loc in locations.items()])
+        conn.commit()
+    finally:
+        conn.close()
+
+def _parse_location(data):
+    """Converte uma resposta da API em localização, ou None se a API reportou falha."""
+    if data and data.get("status") == "success":
+        return {
+            "country": data.get("country", "Desconhecido"),
+            "region": data.get("regionName", "Desconhecido"),
+            "city": data.get("city", "Desconhecido")
+        }
+    return None
+
+def _fetch_batch(ips, limiter, batch_url, session):
+    """Consulta um lote de IPs no endpoint em lote, com rate limit e retries."""
+    import requests
+    for attempt in range(MAX_RETRIES):
+        limiter.acquire()
+        try:
+            response = session.post(f"{batch_url}?fields={API_FIELDS}", json=list(ips), timeout=REQUEST_TIMEOUT)
+            if response.headers.get("X-Rl") == "0":
+                limiter.pause(int(response.headers.get("X-Ttl", RATE_PERIOD)))
+            if response.status_code == 429:
+                raise requests.exceptions.RequestException("limite de requisições excedido (HTTP 429)")
+            response.raise_for_status()
+            results = {}
+            for ip, data in zip(ips, response.json()):
+                results[data.get("query", ip)] = _parse_location(data) or dict(ERROR_RESULT)
+            return results
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Erro ao consultar geolocalização de {len(ips)} IPs (Tentativa {attempt + 1}/{MAX_RETRIES}): {e}")
+        if attempt < MAX_RETRIES - 1:
+            time.sleep(RETRY_DELAY * (attempt + 1))
+    return {ip: dict(ERROR_RESULT) for ip in ips}
+
+def resolve_ips(ips, cache_file=GEO_CACHE_FILE, batch_url=BATCH_API_URL, limiter=None, max_workers=MAX_WORKERS):
+    """Resolve a geolocalização de vários IPs: primeiro pelo cache, depois pela API em lote.
+
+    Os IPs ausentes do cache são divididos em lotes de BATCH_SIZE consultados
+    em paralelo, respeitando o limite de requisições da API. Cada thread usa
+    a sua própria requests.Session (que não é thread-safe). Cada resultado
+    novo é gravado no cache; falhas recebem um prazo de validade curto.
+    """
+    ips = list(dict.fromkeys(ips))
+    locations = load_cached_locations(ips, cache_file)
+    missing = [ip for ip in ips if ip not in locations]
+    if missing:
+        import requests
+
+        print(f"Consultando geolocalização de {len(missing)} IPs fora do cache...")
+        limiter = limiter or RateLimiter()
+        batches = [missing[i:i + BATCH_SIZE] for i in range(0, len(missing), BATCH_SIZE)]
+        local, sessions = threading.local(), []
+
+        def fetch(batch):
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+                sessions.append(local.session)
+            return _fetch_batch(batch, limiter, batch_url, local.session)
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for fetched in executor.map(fetch, batches):
+                    store_locations(fetched, cache_file)
+                    locations.update(fetched)
+        finally:
+            for session in sessions:
+                session.close()
+    return {ip: locations.get(ip, dict(ERROR_RESULT)) for ip in ips}
+
+def get_geolocation(ip, cache_file=GEO_CACHE_FILE, batch_url=BATCH_API_URL):
+    """Obtém a geolocalização de um único endereço IP (com cache)."""
+    return resolve_ips([ip], cache_file, batch_url)[ip]
+
+# --- Geolocalização offline (tabela local de faixas de IP) ---
+
+def ipv4_to_int(ips):
+    """Converte uma sequência de IPv4 em inteiros (int64); endereços inválidos viram -1."""
+    partes = pd.Series(ips, dtype=object).astype(str).str.extract(r'^(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3})$')
+    octetos = partes.astype(float).to_numpy()
+    validos = ~np.isnan(octetos).any(axis=1)
+    octetos = np.nan_to_num(octetos, nan=0).astype(np.int64)
+    validos &= (octetos <= 255).all(axis=1)
+    inteiros = (octetos[:, 0] << 24) | (octetos[:, 1] << 16) | (octetos[:, 2] << 8) | octetos[:, 3]
+    return np.where(validos, inteiros, -1)
+
+def _range_bound(values):
+    """Converte os limites de faixa da tabela (inteiros ou IPv4 em texto) em int64."""
+    numericos = pd.to_numeric(values, errors='coerce')
+    return np.where(numericos.notna(), numericos.fillna(-1).astype(np.int64), ipv4_to_int(values))
+
+@functools.lru_cache(maxsize=4)
+def load_ip_ranges(path):
+    """Carrega uma tabela CSV de faixas IPv4 -> localização em arrays ordenados.
+
+    O CSV deve ter as colunas start, end e country, e opcionalmente region e
+    city; start/end podem ser IPv4 em texto ou inteiros, e as faixas não devem
+    se sobrepor. Retorna um dicionário
+    com os limites ordenados e as localizações como categorias.
+    """
+    tabela = pd.read_csv(path, dtype=str, keep_default_na=False)
+    for coluna in ('region', 'city'):
+        if coluna not in tabela.columns:
+            tabela[coluna] = "Desconhecido"
+    tabela['start'] = _range_bound(tabela['start'])
+    tabela['end'] = _range_bound(tabela['end'])
+    tabela = tabela[(tabela['start'] >= 0) & (tabela['end'] >= tabela['start'])].sort_values('start')
+    return {
+        "starts": tabela['start'].to_numpy(dtype=np.int64),
+        "ends": tabela['end'].to_numpy(dtype=np.int64),
+        "country": tabela['country'].astype('category').to_numpy(),
+        "region": tabela['region'].astype('category').to_numpy(),
+        "city": tabela['city'].astype('category').to_numpy(),
+    }
+
+def lookup_ip_ranges(ips, path):
+    """Localiza uma coluna inteira de IPs na tabela local com busca binária vetorizada.
+
+    Retorna um DataFrame (country, region, city) alinhado aos IPs; IPs fora
+    das faixas (ou IPv6) ficam como "Desconhecido".
+    """
+    faixas = load_ip_ranges(path)
+    inteiros = ipv4_to_int(ips)
+    posicoes = np.searchsorted(faixas["starts"], inteiros, side='right') - 1
+    encontrados = (inteiros >= 0) & (posicoes >= 0)
+    posicoes = np.clip(posicoes, 0, None)
+    if len(faixas["ends"]):
+        encontrados &= inteiros <= faixas["ends"][posicoes]
+    else:
+        encontrados[:] = False
+    resultado = {}
+    for campo in ("country", "region", "city"):
+        valores = faixas[campo][posicoes] if len(faixas[campo]) else np.empty(len(posicoes), dtype=object)
+        resultado[campo] = np.where(encontrados, valores, "Desconhecido")
+    return pd.DataFrame(resultado, index=pd.Index(ips, name='ip'))
+
+def locate_offline(ips, path):
+    """Versão offline de resolve_ips: retorna {ip: localização} usando a tabela local."""
+    return lookup_ip_ranges(list(ips), path).to_dict(orient='index')
@@ -1,33 +1,1051 @@
 import pandas as pd
+import numpy as np
+import gc
+import os
 import re
+import bz2
+import glob
+import gzip
+import json
+import lzma
+import mmap
+import shutil
 import datetime
+import functools
+import tempfile
+import contextlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from anonymizeip import anonymize_ip
+from .profiling import profiled, stage
 
-def normalize_log(input_file: str, output_file: str):
-    """Normaliza um arquivo de log do Traefik em formato CSV."""
-    ufw_re = r'(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})(\s-\s[-|[a-z]+\s)\[(\d{2}/[a-zA-Z]{3}/\d{4}:\d{2}:\d{2}:\d{2})(\s[\-|\+]\d{4})\]\s["](GET|POST|HEAD|OPTIONS|CONNECT|PUT|PATCH)\s(.*)HTTP.*["]\s([2][0][0]|[4][0][4]|[4][2][9]|[\s-])\s([0-9]*)\s(.*)'
-
-    pattern = re.compile(ufw_re)
-    split_list = []
-
-    with open(input_file, 'r') as log_data:
-        for line in log_data:
-            x = re.search(ufw_re, line)
-            if x:
-                data = x.group(3)
-                data1 = datetime.datetime.strptime(data, '%d/%b/%Y:%H:%M:%S').strftime('%Y-%m-%d %H:%M:%S')
-                data2 = datetime.datetime.strptime(data, '%d/%b/%Y:%H:%M:%S').strftime('%Y-%m-%d')
-                ip = "0.0.0.0"
-                try:
-                    ip = anonymize_ip(x.group(1))
-                except Exception:
-                    ip = "0.0.0.0"
-                split_list.append([data1, data2, ip, x.group(7), x.group(5), x.group(6), x.group(8)])
+UFW_RE = r'(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})(\s-\s[-|[a-z]+\s)\[(\d{2}/[a-zA-Z]{3}/\d{4}:\d{2}:\d{2}:\d{2})(\s[\-|\+]\d{4})\]\s["](GET|POST|HEAD|OPTIONS|CONNECT|PUT|PATCH)\s(.*)HTTP.*["]\s([2][0][0]|[4][0][4]|[4][2][9]|[\s-])\s([0-9]*)\s(.*)'
+LOG_PATTERN = re.compile(UFW_RE)
+COLUMNS = ['data1', 'data2', 'ip', 'status', 'metodo', 'recurso', 'tamanho']
+# Campos próprios do Traefik, gravados após COLUMNS: do JSON ou do fim da linha CLF
+# (servico e host só existem no JSON)
+TRAEFIK_COLUMNS = ['duracao_ms', 'roteador', 'servico', 'host', 'user_agent', 'backend', 'num_requisicao']
+# Colunas numéricas do Traefik -> tipo: duracao_ms é float (o JSON traz frações de ms) e
+# num_requisicao é inteiro anulável, gravado sem o ".0" no CSV
+NUMERIC_COLUMNS = {'duracao_ms': 'float64', 'num_requisicao': 'Int64'}
+CATEGORICAL_COLUMNS = ['ip', 'status', 'metodo']
+# Conjunto particionado por dia: <dir>/data2=AAAA-MM-DD/part.<formato>, com manifesto na raiz
+PARTITION_COLUMN = 'data2'
+PARTITION_MANIFEST = "_manifest.json"
+FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.pq': 'parquet', '.feather': 'feather', '.arrow': 'feather'}
+# Extensões de logs comprimidos, lidos em streaming (zstd requer o extra `zstd`)
+COMPRESSED = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz', '.zst': 'zstd', '.zstd': 'zstd'}
+IPV4_OCTET = r'(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)'
+IPV4_PATTERN = re.compile(rf'^({IPV4_OCTET}\.{IPV4_OCTET}\.{IPV4_OCTET})\.{IPV4_OCTET}$')
+# Linha CLF do Traefik com cada campo delimitado por classes negadas (sem o
+# retrocesso de `(.*)HTTP.*["]` em UFW_RE) e qualquer método e status:
+# IP - usuário [data fuso] "MÉTODO recurso HTTP/x" status tamanho ...
+# seguidos, se presentes, dos campos do Traefik (TRAEFIK_TAIL):
+# "referer" "user agent" nº da requisição "roteador" "backend" duraçãoms
+IP_FIELD = re.compile(r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}')
+TIMESTAMP_FIELD = re.compile(r'(\d{2}/[A-Za-z]{3}/\d{4}:\d{2}:\d{2}:\d{2})( [-+]\d{4})')
+STATUS_FIELD = re.compile(r'(\d{3}|-) ')
+TRAEFIK_TAIL = re.compile(r'"[^"]*" "([^"]*)"(?: (\d+) "([^"]*)" "([^"]*)" (\d+)ms)?')
+LINE_PATTERN = re.compile(rf'({IP_FIELD.pattern}) - [^ \[]+ \[{TIMESTAMP_FIELD.pattern}\] '
+                          r'"([A-Z]+) ([^"]*)HTTP[^"]*" ' + STATUS_FIELD.pattern +
+                          rf'(\d*|-)(?: {TRAEFIK_TAIL.pattern})?(?:\s|$)')
+# A mesma linha em bytes: só os campos capturados são decodificados
+LINE_PATTERN_BYTES = re.compile(LINE_PATTERN.pattern.encode())
+# Linhas malformadas maiores que isso são rejeitadas sem passar por UFW_RE (evita retrocesso)
+MAX_FALLBACK_LEN = 8192
+# Bytes lidos (ou mapeados) por bloco; cada bloco termina em uma quebra de linha
+READ_BLOCK = 16 * 1024 * 1024
+# Colunas do arquivo normalizado, nos dois formatos de log de entrada (ver BLOCK_PARSERS)
+LOG_COLUMNS = COLUMNS + TRAEFIK_COLUMNS
+# Bytes lidos do início de cada arquivo para detectar o formato
+DETECT_BYTES = 64 * 1024
+# Início de StartLocal/StartUTC do log JSON (RFC 3339), com hora, minuto e segundo válidos
+ISO_TIMESTAMP = re.compile(r'\d{4}-\d{2}-\d{2}T(?:[01]\d|2[0-3]):[0-5]\d:[0-5]\d')
+MONTHS = {'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+          'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12}
+
+@functools.lru_cache(maxsize=1024)
+def parse_date(raw_date):
+    """Converte '10/Oct/2023' em '2023-10-10', validando a data; o mesmo dia se repete em muitas linhas."""
+    month = MONTHS.get(raw_date[3:6].lower())
+    if month is None:
+        raise ValueError(f"Mês inválido no timestamp: {raw_date}")
+    dt = datetime.date(int(raw_date[7:11]), month, int(raw_date[0:2]))
+    return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d}"
+
+@functools.lru_cache(maxsize=4096)
+def _parse_timestamp_utc(raw, tz):
+    """Como parse_timestamp, convertendo o horário para UTC pelo fuso tz (ex.: ' -0300')."""
+    data2 = parse_date(raw[:11])
+    dt = datetime.datetime(int(data2[0:4]), int(data2[5:7]), int(data2[8:10]),
+                           int(raw[12:14]), int(raw[15:17]), int(raw[18:20]))
+    tz = tz.strip()
+    offset = datetime.timedelta(hours=int(tz[1:3]), minutes=int(tz[3:5]))
+    dt = dt - offset if tz[0] == '+' else dt + offset
+    data2 = f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d}"
+    data1 = f"{data2} {dt.hour:02d}:{dt.minute:02d}:{dt.second:02d}"
+    return data1, data2
+
+def parse_timestamp(raw, tz=None):
+    """Converte '10/Oct/2023:13:55:36' em (data1, data2) por posições fixas.
+
+    Com tz (ex.: ' -0300'), o horário é convertido para UTC. Sem tz, só a
+    data passa pelo cache (segundos distintos raramente se repetem); o
+    horário é validado e copiado como está.
+    """
+    if tz:
+        return _parse_timestamp_utc(raw, tz)
+    hms = raw[12:20]
+    if raw[11:12] != ':' or hms[2::3] != '::' or not hms.replace(':', '').isdigit() \
+            or hms[:2] > '23' or hms[3:5] > '59' or hms[6:] > '59' or len(raw) != 20:
+        raise ValueError(f"Horário inválido no timestamp: {raw}")
+    data2 = parse_date(raw[:11])
+    return f"{data2} {hms}", data2
+
+@functools.lru_cache(maxsize=1024)
+def parse_iso_date(raw_date):
+    """Valida a data '2023-10-10' do log JSON e a retorna como está."""
+    datetime.date.fromisoformat(raw_date)
+    return raw_date
+
+def parse_iso_timestamp(raw):
+    """Converte '2023-10-10T13:55:36.123456789-03:00' (RFC 3339) em (data1, data2), sem mudar o fuso."""
+    if not ISO_TIMESTAMP.match(raw):
+        raise ValueError(f"Timestamp inválido: {raw}")
+    data2 = parse_iso_date(raw[:10])
+    return f"{data2} {raw[11:19]}", data2
+
+@functools.lru_cache(maxsize=65536)
+def anonymize_ip_cached(address):
+    """Anonimiza um IP como anonymize_ip, com cache; endereços inválidos viram '0.0.0.0'."""
+    match = IPV4_PATTERN.match(address)
+    if match:
+        return match.group(1) + '.0'
+    try:
+        return anonymize_ip(address)
+    except Exception:
+        return "0.0.0.0"
+
+def anonymize_ips(values):
+    """Anonimiza uma coluna de IPs de uma vez, processando cada endereço distinto uma única vez."""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    masked = np.array([anonymize_ip_cached(ip) for ip in uniques], dtype=object)
+    return masked[codes]
+
+def reject_reason(line):
+    """Motivo pelo qual uma linha não está no formato CLF do Traefik.
+
+    Percorre os campos por posição e delimitadores e aponta o primeiro
+    inválido; só é chamada para as linhas já rejeitadas, para o resumo.
+    """
+    sp = line.find(' ')
+    if not line.strip():
+        return 'linha_vazia'
+    if sp < 0 or not IP_FIELD.fullmatch(line[:sp]):
+        return 'ip_invalido'
+    lb = line.find(' [', sp)
+    if lb < sp + 4 or line[sp:sp + 3] != ' - ':
+        return 'usuario_invalido'
+    if not TIMESTAMP_FIELD.fullmatch(line[lb + 2:lb + 28]) or line[lb + 28:lb + 31] != '] "':
+        return 'timestamp_invalido'
+    me = line.find(' ', lb + 31)
+    q2 = line.find('" ', me)
+    if me < 0 or not line[lb + 31:me].isalpha() or not line[lb + 31:me].isupper() or q2 < 0 \
+            or line.rfind('HTTP', me + 1, q2) < 0:
+        return 'requisicao_invalida'
+    if not STATUS_FIELD.match(line, q2 + 2):
+        return 'status_invalido'
+    return 'tamanho_invalido'
+
+def parse_line(line, utc=False, rejects=None):
+    """Extrai os campos de uma linha de log, ou None se não casar.
 
-    df = pd.DataFrame(split_list, columns=['data1', 'data2', 'ip', 'status', 'metodo', 'recurso', 'tamanho'])
+    Usa LINE_PATTERN, que delimita cada campo sem retrocesso e aceita
+    qualquer método e status; só as linhas que ele não reconhece passam pela
+    regex UFW_RE (ex.: aspas dentro do recurso, texto antes do IP). Com
+    rejects (um Counter), conta o motivo de cada linha descartada.
+    O IP é retornado cru; a anonimização é feita por coluna em build_frame.
+    Os campos do Traefik ausentes na linha ficam vazios.
+    """
+    x = LINE_PATTERN.match(line)
+    if x:
+        ip, raw, tz, metodo, recurso, status, tamanho, agente, numero, roteador, backend, duracao = x.groups('')
+        try:
+            data1, data2 = parse_timestamp(raw, tz if utc else None)
+            return [data1, data2, ip, status, metodo, recurso, '' if tamanho == '-' else tamanho,
+                    int(duracao) if duracao else None, roteador, '', '', agente, backend,
+                    int(numero) if numero else None]
+        except ValueError:
+            motivo = 'timestamp_invalido'
+    elif len(line) <= MAX_FALLBACK_LEN:
+        x = LOG_PATTERN.search(line)
+        if x:
+            try:
+                data1, data2 = parse_timestamp(x.group(3), x.group(4) if utc else None)
+                cauda = TRAEFIK_TAIL.match(x.group(9))
+                agente, numero, roteador, backend, duracao = cauda.groups('') if cauda else ('',) * 5
+                return [data1, data2, x.group(1), x.group(7), x.group(5), x.group(6), x.group(8),
+                        int(duracao) if duracao else None, roteador, '', '', agente, backend,
+                        int(numero) if numero else None]
+            except ValueError:
+                pass
+        motivo = None
+    else:
+        motivo = 'linha_longa_malformada'
+    if rejects is not None:
+        rejects[motivo or reject_reason(line)] += 1
+    return None
+
+def report_rejects(rejects):
+    """Exibe o total de linhas rejeitadas, por motivo."""
+    total = sum(rejects.values())
+    if not total:
+        print("Nenhuma linha rejeitada.")
+        return
+    motivos = ", ".join(f"{motivo}: {n:,}" for motivo, n in rejects.most_common())
+    print(f"Linhas rejeitadas: {total:,} ({motivos})")
+
+def build_frame(rows, columns=LOG_COLUMNS):
+    """Monta o DataFrame normalizado a partir das linhas extraídas."""
+    df = pd.DataFrame(rows, columns=columns)
+    df.ip = anonymize_ips(df.ip)
     df.status = df.status.replace('-', 404)
     df.status = pd.to_numeric(df.status)
-    df.to_csv(output_file, index=False)
+    for col, dtype in NUMERIC_COLUMNS.items():
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(dtype)
+    return df
+
+def to_typed_frame(df, categorical=True):
+    """Converte o DataFrame normalizado para os tipos do formato colunar.
+
+    data1 vira datetime64, tamanho numérico e ip/status/metodo categóricos,
+    evitando que datas e status sejam reinterpretados a cada leitura.
+    O DataFrame recebido é alterado e retornado.
+    """
+    df['data1'] = pd.to_datetime(df['data1'], format='%Y-%m-%d %H:%M:%S')
+    df['tamanho'] = pd.to_numeric(df['tamanho']).astype('float64')
+    df['status'] = df['status'].astype('int64')
+    for col in ['data2', 'ip', 'metodo', 'recurso']:
+        df[col] = df[col].astype(str)
+    for col in df.columns[len(COLUMNS):]:
+        if col in NUMERIC_COLUMNS:
+            df[col] = pd.to_numeric(df[col]).astype(NUMERIC_COLUMNS[col])
+        else:
+            df[col] = df[col].fillna('').astype(str)
+    if categorical:
+        for col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype('category')
+    return df
+
+def resolve_format(path, fmt=None):
+    """Define o formato do arquivo normalizado: explícito ou pela extensão (padrão: csv)."""
+    if fmt:
+        return fmt
+    return FORMATS.get(os.path.splitext(path)[1].lower(), 'csv')
+
+def _arrow_schema(fmt, columns=LOG_COLUMNS):
+    """Esquema Arrow do arquivo normalizado.
+
+    No Parquet, ip e metodo são gravados com dicionário; o Feather exige um
+    único dicionário por arquivo, então nele esses campos vão como valores
+    simples. Em ambos, ip/status/metodo voltam a ser categóricos na leitura.
+    As colunas além de COLUMNS (TRAEFIK_COLUMNS) são numéricas ou texto.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError("Os formatos parquet/feather requerem o pacote pyarrow: pip install pyarrow")
+
+    def categorical(value_type):
+        return pa.dictionary(pa.int32(), value_type) if fmt == 'parquet' else value_type
+
+    return pa.schema([
+        ('data1', pa.timestamp('ns')),
+        ('data2', pa.string()),
+        ('ip', categorical(pa.string())),
+        ('status', pa.int64()),
+        ('metodo', categorical(pa.string())),
+        ('recurso', pa.string()),
+        ('tamanho', pa.float64()),
+    ] + [(col, pa.from_numpy_dtype(NUMERIC_COLUMNS[col].lower()) if col in NUMERIC_COLUMNS else pa.string())
+         for col in columns[len(COLUMNS):]])
+
+def _open_arrow_writer(output_file, fmt, columns=LOG_COLUMNS):
+    """Abre um escritor Arrow incremental para o formato colunar."""
+    schema = _arrow_schema(fmt, columns)
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        return schema, pq.ParquetWriter(output_file, schema)
+    import pyarrow.ipc as ipc
+    return schema, ipc.new_file(output_file, schema)
+
+def _iter_arrow_batches(path, fmt, columns=None, batch_rows=65536):
+    """Percorre os lotes gravados em um arquivo colunar, sem carregá-lo inteiro."""
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        yield from pq.ParquetFile(path).iter_batches(batch_size=batch_rows, columns=columns)
+    else:
+        import pyarrow.ipc as ipc
+        with ipc.open_file(path) as reader:
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                yield batch if columns is None else batch.select(columns)
+
+def iter_normalized(path, fmt=None, columns=None, chunk_rows=1_000_000):
+    """Percorre um arquivo normalizado em DataFrames de até chunk_rows linhas, sem carregá-lo inteiro.
+
+    columns limita as colunas lidas (None: todas). Nos formatos colunares,
+    os lotes são os gravados no arquivo (no Parquet, de até chunk_rows linhas).
+    """
+    fmt = resolve_format(path, fmt)
+    if fmt == 'csv':
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows,
+                               dtype={col: str for col in TRAEFIK_COLUMNS if col not in NUMERIC_COLUMNS})
+        return
+    for batch in _iter_arrow_batches(path, fmt, columns, chunk_rows):
+        yield batch.to_pandas()
+
+@profiled()
+def write_normalized(df, output_file, fmt=None):
+    """Grava um DataFrame normalizado no formato indicado (csv, parquet ou feather)."""
+    _write_chunks([df], output_file, resolve_format(output_file, fmt), columns=list(df.columns))
+    return output_file
+
+def read_normalized_many(sources, fmt=None, since=None, until=None, columns=None):
+    """Carrega e concatena um ou mais arquivos normalizados (arquivos, diretórios ou globs).
+
+    Conjuntos particionados (ver is_partitioned) são lidos por read_partitioned,
+    que carrega só as partições do intervalo since/until e as colunas pedidas;
+    nos demais arquivos, o intervalo é aplicado depois da leitura.
+    """
+    if isinstance(sources, (str, os.PathLike)):
+        sources = [sources]
+    stores = [source for source in sources if is_partitioned(source)]
+    others = [source for source in sources if not is_partitioned(source)]
+    paths = expand_inputs(others, extensions=None if fmt else tuple(FORMATS)) if others else []
+    inicio, fim = time_range(since, until)
+    frames = []
+    for store in stores:
+        frames.append(read_partitioned(store, since, until, columns))
+        print(f"{store}: {len(frames[-1]):,} linhas carregadas")
+    for i, path in enumerate(paths, 1):
+        df = read_normalized(path, fmt)
+        if inicio is not None or fim is not None:
+            df = filter_time_range(df, inicio, fim)
+        frames.append(df)
+        print(f"[{i}/{len(paths)}] {path}: {len(frames[-1]):,} linhas carregadas")
+    if len(frames) == 1:
+        return frames[0]
+    df = pd.concat(frames, ignore_index=True)
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype) and \
+                isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return df
+
+@profiled()
+def read_normalized(path, fmt=None):
+    """Carrega um arquivo normalizado; nos formatos colunares, já com os tipos definidos."""
+    fmt = resolve_format(path, fmt)
+    if fmt == 'csv':
+        # Campos de texto do Traefik vazios em parte das linhas (ex.: host no CLF) não viram colunas mistas
+        return pd.read_csv(path, dtype={col: str for col in TRAEFIK_COLUMNS if col not in NUMERIC_COLUMNS})
+    if fmt == 'parquet':
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_feather(path)
+    for col in CATEGORICAL_COLUMNS:
+        df[col] = df[col].astype('category')
+    return df
+
+def time_range(since=None, until=None):
+    """Converte --since/--until (AAAA-MM-DD ou AAAA-MM-DD HH:MM:SS) no intervalo [início, fim).
+
+    O fim é exclusivo: uma data sozinha em until inclui o dia inteiro, e um
+    horário inclui o próprio segundo. Limites ausentes ficam como None.
+    """
+    inicio = pd.Timestamp(since) if since else None
+    fim = None
+    if until:
+        fim = pd.Timestamp(until)
+        fim += pd.Timedelta(days=1) if len(str(until).strip()) <= 10 else pd.Timedelta(seconds=1)
+    if inicio is not None and fim is not None and fim <= inicio:
+        raise ValueError(f"Intervalo vazio: --since {since} é posterior a --until {until}")
+    return inicio, fim
+
+def filter_time_range(df, inicio=None, fim=None):
+    """Mantém as linhas com data1 em [inicio, fim); data1 é convertida para datetime se necessário."""
+    if not pd.api.types.is_datetime64_any_dtype(df['data1']):
+        df['data1'] = pd.to_datetime(df['data1'], format='%Y-%m-%d %H:%M:%S')
+    mascara = np.ones(len(df), dtype=bool)
+    if inicio is not None:
+        mascara &= (df['data1'] >= inicio).to_numpy()
+    if fim is not None:
+        mascara &= (df['data1'] < fim).to_numpy()
+    return df if mascara.all() else df[mascara].reset_index(drop=True)
+
+def is_partitioned(path):
+    """Indica se path é um conjunto normalizado particionado por dia (diretório com manifesto)."""
+    return os.path.isfile(os.path.join(os.fspath(path), PARTITION_MANIFEST))
+
+def load_manifest(dataset_dir):
+    """Manifesto de um conjunto particionado: formato e estatísticas de cada partição (vazio se não existir)."""
+    path = os.path.join(dataset_dir, PARTITION_MANIFEST)
+    if not os.path.exists(path):
+        return {"formato": None, "particoes": {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(dataset_dir, manifest):
+    """Grava o manifesto de forma atômica (arquivo temporário + rename)."""
+    path = os.path.join(dataset_dir, PARTITION_MANIFEST)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+def _merge_partition(existing_file, tmp_file, fmt, existing_first):
+    """Acrescenta as linhas de uma partição já gravada ao temporário tmp_file, na ordem dos horários."""
+    import pyarrow as pa
+    merged_file = tmp_file + ".merge"
+    schema, writer = _open_arrow_writer(merged_file, fmt)
+    try:
+        with writer:
+            for path in ([existing_file, tmp_file] if existing_first else [tmp_file, existing_file]):
+                for batch in _iter_arrow_batches(path, fmt):
+                    writer.write_table(pa.Table.from_batches([batch]).cast(schema))
+        os.replace(merged_file, tmp_file)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(merged_file)
+        raise
+
+def _write_partitions(chunks, dataset_dir, fmt='parquet', replace=False):
+    """Grava os lotes em um conjunto particionado por dia, atualizando só os dias presentes nos lotes.
+
+    Cada dia vira o arquivo colunar <dataset_dir>/data2=<dia>/part.<fmt>,
+    gravado em um temporário e trocado por rename ao final; os demais dias
+    ficam como estavam. Se o dia já existe, os horários novos são comparados
+    com o mínimo e o máximo de data1 do manifesto: sem sobreposição (ex.: o
+    log do dia dividido em dois arquivos), as linhas são juntadas às da
+    partição; com sobreposição, a gravação é recusada (ValueError), a menos
+    que replace substitua a partição inteira. O manifesto guarda as linhas e
+    o intervalo de data1 de cada partição, usados por read_partitioned para
+    descartar partições fora do intervalo sem abri-las. Retorna o número de
+    linhas gravadas.
+    """
+    if fmt not in ('parquet', 'feather'):
+        raise ValueError(f"Conjuntos particionados usam parquet ou feather, não {fmt}")
+    import pyarrow as pa
+    os.makedirs(dataset_dir, exist_ok=True)
+    manifest = load_manifest(dataset_dir)
+    if manifest["formato"] not in (None, fmt):
+        raise ValueError(f"O conjunto particionado {dataset_dir} usa o formato {manifest['formato']}, não {fmt}")
+    schema = _arrow_schema(fmt)
+    writers, stats, rows = {}, {}, 0
+    try:
+        for df in chunks:
+            df = to_typed_frame(df, categorical=False)
+            for dia, parte in df.groupby(PARTITION_COLUMN, sort=False):
+                if dia not in writers:
+                    tmp_file = os.path.join(dataset_dir, f".loguard-{dia}-{os.getpid()}.{fmt}")
+                    writers[dia] = (tmp_file, _open_arrow_writer(tmp_file, fmt)[1])
+                    stats[dia] = {"linhas": 0, "data1_min": parte['data1'].min(), "data1_max": parte['data1'].max()}
+                writers[dia][1].write_table(pa.Table.from_pandas(parte, schema=schema, preserve_index=False))
+                registro = stats[dia]
+                registro["linhas"] += len(parte)
+                registro["data1_min"] = min(registro["data1_min"], parte['data1'].min())
+                registro["data1_max"] = max(registro["data1_max"], parte['data1'].max())
+                rows += len(parte)
+        for _, writer in writers.values():
+            writer.close()
+
+        anteriores = {dia: manifest["particoes"][dia] for dia in writers if dia in manifest["particoes"]}
+        if not replace:
+            sobrepostos = [dia for dia, particao in anteriores.items()
+                           if pd.Timestamp(particao["data1_min"]) <= stats[dia]["data1_max"]
+                           and stats[dia]["data1_min"] <= pd.Timestamp(particao["data1_max"])]
+            if sobrepostos:
+                raise ValueError(f"As partições de {', '.join(sorted(sobrepostos))} em {dataset_dir} já têm linhas "
+                                 "nesse horário; use --replace para substituí-las")
+            for dia, particao in anteriores.items():
+                _merge_partition(os.path.join(dataset_dir, particao["arquivo"]), writers[dia][0], fmt,
+                                 existing_first=pd.Timestamp(particao["data1_max"]) < stats[dia]["data1_min"])
+                registro = stats[dia]
+                registro["linhas"] += particao["linhas"]
+                registro["data1_min"] = min(registro["data1_min"], pd.Timestamp(particao["data1_min"]))
+                registro["data1_max"] = max(registro["data1_max"], pd.Timestamp(particao["data1_max"]))
+    except BaseException:
+        # Uma falha ao fechar um gravador não pode deixar temporários nem esconder o erro original
+        for tmp_file, writer in writers.values():
+            with contextlib.suppress(Exception):
+                writer.close()
+            with contextlib.suppress(OSError):
+                os.remove(tmp_file)
+        raise
+
+    for dia, (tmp_file, _) in writers.items():
+        arquivo = os.path.join(f"{PARTITION_COLUMN}={dia}", f"part.{fmt}")
+        os.makedirs(os.path.join(dataset_dir, os.path.dirname(arquivo)), exist_ok=True)
+        os.replace(tmp_file, os.path.join(dataset_dir, arquivo))
+        manifest["particoes"][dia] = {"arquivo": arquivo, "linhas": stats[dia]["linhas"],
+                                      "data1_min": str(stats[dia]["data1_min"]),
+                                      "data1_max": str(stats[dia]["data1_max"])}
+    manifest["formato"] = fmt
+    manifest["particoes"] = dict(sorted(manifest["particoes"].items()))
+    save_manifest(dataset_dir, manifest)
+    if writers:
+        print(f"Partições atualizadas em {dataset_dir}: {', '.join(sorted(writers))}")
+    if anteriores and not replace:
+        print(f"Linhas juntadas às partições existentes: {', '.join(sorted(anteriores))}")
+    return rows
+
+def partitions_in_range(dataset_dir, inicio=None, fim=None):
+    """Arquivos das partições que cruzam [inicio, fim), pelo manifesto, sem abri-los.
+
+    Retorna pares (arquivo, parcial); parcial indica que só parte das linhas
+    da partição está no intervalo.
+    """
+    particoes = []
+    for particao in load_manifest(dataset_dir)["particoes"].values():
+        menor, maior = pd.Timestamp(particao["data1_min"]), pd.Timestamp(particao["data1_max"])
+        if (inicio is not None and maior < inicio) or (fim is not None and menor >= fim):
+            continue
+        parcial = (inicio is not None and menor < inicio) or (fim is not None and maior >= fim)
+        particoes.append((os.path.join(dataset_dir, particao["arquivo"]), parcial))
+    return particoes
+
+def normalized_files(sources, fmt=None, since=None, until=None):
+    """Lista os arquivos normalizados das fontes como pares (arquivo, formato).
+
+    Arquivos, diretórios e globs são expandidos como em read_normalized_many;
+    de conjuntos particionados, entram só as partições do intervalo since/until.
+    """
+    if isinstance(sources, (str, os.PathLike)):
+        sources = [sources]
+    inicio, fim = time_range(since, until)
+    files = []
+    for source in sources:
+        if is_partitioned(source):
+            formato = load_manifest(source)["formato"] or 'parquet'
+            files += [(path, formato) for path, _ in partitions_in_range(source, inicio, fim)]
+    others = [source for source in sources if not is_partitioned(source)]
+    if others:
+        files += [(path, resolve_format(path, fmt))
+                  for path in expand_inputs(others, extensions=None if fmt else tuple(FORMATS))]
+    return files
+
+@profiled()
+def read_partitioned(dataset_dir, since=None, until=None, columns=None):
+    """Carrega um conjunto particionado, lendo só as partições e colunas necessárias.
+
+    As partições cujo intervalo de data1 (no manifesto) não cruza
+    [since, until] não são abertas; nas que cruzam só em parte, o filtro por
+    data1 é aplicado na leitura (no Parquet, também pelas estatísticas de
+    cada grupo de linhas). columns limita as colunas lidas (None: todas).
+    """
+    manifest = load_manifest(dataset_dir)
+    fmt = manifest["formato"] or 'parquet'
+    inicio, fim = time_range(since, until)
+    if columns is not None:
+        columns = [col for col in LOG_COLUMNS if col in columns]
+    frames = []
+    for path, parcial in partitions_in_range(dataset_dir, inicio, fim):
+        if fmt == 'parquet':
+            filtros = [('data1', op, limite) for op, limite in (('>=', inicio), ('<', fim)) if limite is not None]
+            df = pd.read_parquet(path, columns=columns, filters=filtros if parcial else None)
+        else:
+            lidas = columns if columns is None or 'data1' in columns or not parcial else columns + ['data1']
+            df = pd.read_feather(path, columns=lidas)
+            if parcial:
+                df = filter_time_range(df, inicio, fim)[columns or df.columns]
+        frames.append(df)
+    print(f"{dataset_dir}: {len(frames)} de {len(manifest['particoes'])} partições no intervalo")
+    if not frames:
+        df = to_typed_frame(build_frame([]), categorical=False)
+        return df[columns] if columns is not None else df
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+def compression_of(path):
+    """Retorna o tipo de compressão do arquivo pela extensão (gzip, bz2, xz, zstd) ou None."""
+    return COMPRESSED.get(os.path.splitext(path)[1].lower())
+
+def open_log(path):
+    """Abre um log para leitura binária, descomprimindo em streaming se necessário."""
+    compression = compression_of(path)
+    if compression is None:
+        return open(path, 'rb')
+    if compression == 'gzip':
+        raw = gzip.open(path, 'rb')
+    elif compression == 'bz2':
+        raw = bz2.open(path, 'rb')
+    elif compression == 'xz':
+        raw = lzma.open(path, 'rb')
+    else:
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(f"Para ler {path}, instale o suporte a zstd: pip install .[zstd]")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return raw
+
+def expand_inputs(sources, extensions=None):
+    """Expande arquivos, diretórios e padrões glob em uma lista ordenada de arquivos.
+
+    Diretórios contribuem com seus arquivos (não recursivamente); com
+    extensions, apenas os que terminam em uma delas. A lista é ordenada pela
+    data de modificação, de modo que logs rotacionados (access.log.2.gz,
+    access.log.1.gz, access.log) fiquem em ordem cronológica.
+    """
+    if isinstance(sources, (str, os.PathLike)):
+        sources = [sources]
+    files = []
+    for source in sources:
+        source = os.fspath(source)
+        if os.path.isdir(source):
+            candidates = [os.path.join(source, name) for name in os.listdir(source) if not name.startswith('.')]
+        elif os.path.exists(source):
+            files.append(source)
+            continue
+        else:
+            candidates = glob.glob(source, recursive=True)
+            if not candidates:
+                raise FileNotFoundError(f"Nenhum arquivo encontrado para: {source}")
+        files.extend(sorted(
+            (f for f in candidates if os.path.isfile(f)
+             and (extensions is None or f.lower().endswith(tuple(extensions)))),
+            key=lambda f: (os.path.getmtime(f), f)))
+    return list(dict.fromkeys(files))
+
+def detect_log_format(path):
+    """Detecta o formato do log pela primeira linha não vazia: 'json' se for um objeto JSON, senão 'clf'."""
+    with open_log(path) as log_data:
+        inicio = log_data.read(DETECT_BYTES)
+    for linha in inicio.splitlines():
+        if linha.strip():
+            return 'json' if linha.lstrip().startswith(b'{') else 'clf'
+    return 'clf'
+
+def resolve_log_formats(input_files, log_format=None):
+    """Formato de cada log de entrada: o informado para todos ou, com None/'auto', o detectado por arquivo.
+
+    Os dois formatos geram as mesmas colunas (LOG_COLUMNS), então arquivos
+    CLF e JSON podem ser normalizados juntos.
+    """
+    if log_format and log_format != 'auto':
+        if log_format not in BLOCK_PARSERS:
+            raise ValueError(f"Formato de log desconhecido: {log_format} (use {', '.join(BLOCK_PARSERS)} ou auto)")
+        return dict.fromkeys(input_files, log_format)
+    return {path: detect_log_format(path) for path in input_files}
+
+def next_line_start(buf, offset, end):
+    """Posição do início da linha seguinte a `offset` (ou `end`, se não houver quebra de linha)."""
+    nl = buf.find(b'\n', offset, end)
+    return end if nl < 0 else nl + 1
+
+def _map_file(input_file):
+    """Mapeia o arquivo em memória somente leitura (None se estiver vazio)."""
+    with open(input_file, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def iter_blocks(input_file, start=0, end=None, block_size=READ_BLOCK):
+    """Percorre o log em blocos de bytes (buffer, início, fim) que terminam em quebra de linha.
+
+    Arquivos sem compressão são mapeados em memória (mmap) e os blocos são
+    janelas do mapa, sem cópia; as páginas já processadas são liberadas.
+    Com start/end, apenas as linhas do intervalo de bytes (start deve ser o
+    início de uma linha). Logs comprimidos são lidos inteiros, em blocos
+    descomprimidos em streaming.
+    """
+    if compression_of(input_file) is not None:
+        with open_log(input_file) as log_data:
+            resto = b""
+            while True:
+                data = log_data.read(block_size)
+                if not data:
+                    break
+                data = resto + data
+                corte = data.rfind(b'\n') + 1
+                if corte:
+                    yield data, 0, corte
+                resto = data[corte:]
+            if resto:
+                yield resto, 0, len(resto)
+        return
+
+    mm = _map_file(input_file)
+    if mm is None:
+        return
+    with mm:
+        end = len(mm) if end is None else min(end, len(mm))
+        pos = start
+        while pos < end:
+            fim = next_line_start(mm, min(pos + block_size, end) - 1, end)
+            yield mm, pos, fim
+            inicio = pos - pos % mmap.PAGESIZE
+            tamanho = fim - fim % mmap.PAGESIZE - inicio
+            if tamanho > 0 and hasattr(mmap, 'MADV_DONTNEED'):
+                mm.madvise(mmap.MADV_DONTNEED, inicio, tamanho)
+            pos = fim
+
+def parse_block(buf, start, end, utc=False, rejects=None):
+    """Normaliza as linhas de buf[start:end] direto dos bytes, decodificando só os campos.
+
+    URLs com UTF-8 inválido não interrompem a leitura: os bytes inválidos
+    viram escapes (ex.: \\xff). Linhas que LINE_PATTERN não reconhece são
+    decodificadas e passam por parse_line (fallback para UFW_RE e contagem
+    dos motivos de rejeição).
+    """
+    rows = []
+    append = rows.append
+    match = LINE_PATTERN_BYTES.match
+    pos = start
+    while pos < end:
+        nl = buf.find(b'\n', pos, end)
+        if nl < 0:
+            nl = end
+        x = match(buf, pos, nl)
+        if x:
+            ip, raw, tz, metodo, recurso, status, tamanho, agente, numero, roteador, backend, duracao = x.groups(b'')
+            try:
+                data1, data2 = parse_timestamp(raw.decode(), tz.decode() if utc else None)
+                append([data1, data2, ip.decode(), status.decode(), metodo.decode(),
+                        recurso.decode('utf-8', 'backslashreplace'), '' if tamanho == b'-' else tamanho.decode(),
+                        int(duracao) if duracao else None, roteador.decode('utf-8', 'backslashreplace'), '', '',
+                        agente.decode('utf-8', 'backslashreplace'), backend.decode('utf-8', 'backslashreplace'),
+                        int(numero) if numero else None])
+            except ValueError:
+                if rejects is not None:
+                    rejects['timestamp_invalido'] += 1
+        else:
+            row = parse_line(buf[pos:nl + 1].decode('utf-8', 'backslashreplace'), utc, rejects)
+            if row:
+                append(row)
+        pos = nl + 1
+    return rows
+
+@contextlib.contextmanager
+def gc_paused():
+    """Suspende o coletor de lixo no bloco (restaurando o estado anterior ao sair).
+
+    Decodificar milhões de objetos JSON temporários, que não formam ciclos,
+    dispara coletas sucessivas sem nada a liberar.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def json_loader():
+    """Decodificador de JSON: orjson, se instalado (extra `json`), ou o json da biblioteca padrão."""
+    try:
+        import orjson
+        return orjson.loads
+    except ImportError:
+        import json
+        return json.loads
+
+def json_row(entry, utc=False):
+    """Extrai os campos normalizados de uma entrada do log JSON do Traefik.
+
+    Lança KeyError se faltar um campo obrigatório e ValueError se o horário
+    for inválido. Com utc, usa StartUTC; senão, o horário local (StartLocal).
+    """
+    data1, data2 = parse_iso_timestamp(entry['StartUTC' if utc else 'StartLocal'])
+    duracao = entry.get('Duration')
+    # O recurso termina em espaço, como o capturado do CLF antes de "HTTP/x"
+    return [data1, data2, entry['ClientHost'], entry['DownstreamStatus'], entry['RequestMethod'],
+            entry['RequestPath'] + ' ', entry.get('DownstreamContentSize', ''),
+            None if duracao is None else duracao / 1e6, entry.get('RouterName', ''),
+            entry.get('ServiceName', ''), entry.get('RequestHost', ''), entry.get('request_User-Agent', ''),
+            entry.get('ServiceURL', ''), entry.get('RequestCount')]
+
+def parse_json_block(buf, start, end, utc=False, rejects=None):
+    """Normaliza as linhas de buf[start:end] de um log JSON do Traefik (um objeto por linha).
+
+    Cada linha é decodificada de uma vez (orjson) e só as chaves usadas são
+    lidas. Linhas que não são um objeto JSON, sem campo obrigatório ou com
+    horário inválido são descartadas e contadas por motivo em rejects.
+    """
+    rows = []
+    append = rows.append
+    loads = json_loader()
+    pos = start
+    with gc_paused():
+        while pos < end:
+            nl = buf.find(b'\n', pos, end)
+            if nl < 0:
+                nl = end
+            linha = buf[pos:nl]
+            pos = nl + 1
+            try:
+                entry = loads(linha)
+            except ValueError:
+                entry = None
+            if isinstance(entry, dict):
+                try:
+                    append(json_row(entry, utc))
+                    continue
+                except KeyError:
+                    motivo = 'campo_ausente'
+                except ValueError:
+                    motivo = 'timestamp_invalido'
+                except TypeError:
+                    motivo = 'campo_invalido'
+            else:
+                motivo = 'json_invalido' if linha.strip() else 'linha_vazia'
+            if rejects is not None:
+                rejects[motivo] += 1
+    return rows
+
+# Parser de blocos de bytes de cada formato de log
+BLOCK_PARSERS = {'clf': parse_block, 'json': parse_json_block}
+
+def iter_chunks(input_file, chunk_size=None, start=0, end=None, utc=False, rejects=None, log_format='clf'):
+    """Lê o log e produz DataFrames normalizados com até chunk_size linhas cada.
+
+    Sem chunk_size, todo o intervalo lido vira um único DataFrame. Com
+    rejects (um Counter), conta as linhas descartadas por motivo. log_format
+    ('clf' ou 'json') define o parser.
+    """
+    parse = BLOCK_PARSERS[log_format]
+    rows = []
+    for buf, inicio, fim in iter_blocks(input_file, start, end):
+        rows += parse(buf, inicio, fim, utc, rejects)
+        while chunk_size and len(rows) >= chunk_size:
+            yield build_frame(rows[:chunk_size])
+            rows = rows[chunk_size:]
+    if rows:
+        yield build_frame(rows)
+
+def file_tasks(input_files, workers):
+    """Divide a entrada em tarefas (arquivo, início, fim) para os processos.
+
+    Um único arquivo sem compressão é dividido em intervalos de bytes; com
+    vários arquivos (ou comprimidos), cada arquivo é uma tarefa.
+    """
+    if len(input_files) == 1 and workers > 1 and compression_of(input_files[0]) is None:
+        return [(input_files[0], start, end) for start, end in split_ranges(input_files[0], workers)]
+    return [(input_file, 0, None) for input_file in input_files]
+
+def report_progress(results, input_files):
+    """Exibe o progresso por arquivo à medida que as tarefas (em ordem) terminam.
+
+    results produz (arquivo, linhas, ...) por tarefa; repassa cada resultado.
+    """
+    total = len(input_files)
+    done, current, rows = 0, None, 0
+    for result in results:
+        if current is not None and result[0] != current:
+            done += 1
+            print(f"[{done}/{total}] {current}: {rows:,} linhas normalizadas")
+            rows = 0
+        current = result[0]
+        rows += result[1]
+        yield result
+    if current is not None:
+        print(f"[{done + 1}/{total}] {current}: {rows:,} linhas normalizadas")
+
+def split_ranges(input_file, parts):
+    """Divide o arquivo em até `parts` intervalos de bytes alinhados a quebras de linha."""
+    mm = _map_file(input_file)
+    if mm is None:
+        return []
+    with mm:
+        size = len(mm)
+        bounds = [0]
+        for i in range(1, parts):
+            bounds.append(next_line_start(mm, max(size * i // parts, bounds[-1] + 1) - 1, size))
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+def _normalize_range(task):
+    """Normaliza um intervalo de bytes do log em um CSV parcial sem cabeçalho.
+
+    Retorna o arquivo de entrada, as linhas gravadas, o caminho da parte, os
+    acertos/falhas do cache de IPs e as linhas rejeitadas por motivo no intervalo.
+    """
+    input_file, start, end, chunk_size, utc, log_format, fmt, part_file = task
+    rejects = Counter()
+    before = anonymize_ip_cached.cache_info()
+    rows = _write_chunks(iter_chunks(input_file, chunk_size, start, end, utc, rejects, log_format), part_file, fmt,
+                         header=False)
+    after = anonymize_ip_cached.cache_info()
+    return input_file, rows, part_file, after.hits - before.hits, after.misses - before.misses, rejects
+
+def _write_chunks(chunks, output_file, fmt='csv', header=True, columns=LOG_COLUMNS):
+    """Grava os lotes em sequência no arquivo de saída.
+
+    No CSV, apenas o primeiro lote leva cabeçalho (nenhum, se header=False);
+    nos formatos colunares, cada lote vira um grupo de linhas. columns são
+    as colunas dos lotes (usadas no esquema e no cabeçalho de uma saída vazia).
+    Retorna o número de linhas gravadas.
+    """
+    rows = 0
+    if fmt != 'csv':
+        import pyarrow as pa
+        schema, writer = _open_arrow_writer(output_file, fmt, columns)
+        with writer:
+            for df in chunks:
+                df = to_typed_frame(df, categorical=False)
+                table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+                writer.write_table(table)
+                rows += len(df)
+        return rows
+
+    with open(output_file, 'w', newline='') as out:
+        for df in chunks:
+            df.to_csv(out, index=False, header=header)
+            header = False
+            rows += len(df)
+        if header:
+            build_frame([], columns).to_csv(out, index=False)
+    return rows
+
+def _merge_parts(part_files, output_file, fmt, columns=LOG_COLUMNS):
+    """Junta, em ordem, as partes geradas pelos processos em um único arquivo."""
+    if fmt != 'csv':
+        import pyarrow as pa
+        schema, writer = _open_arrow_writer(output_file, fmt, columns)
+        with writer:
+            for part_file in part_files:
+                for batch in _iter_arrow_batches(part_file, fmt):
+                    writer.write_table(pa.Table.from_batches([batch]).cast(schema))
+        return
+
+    with open(output_file, 'w', newline='') as out:
+        build_frame([], columns).to_csv(out, index=False)
+        for part_file in part_files:
+            with open(part_file, 'r', newline='') as part:
+                shutil.copyfileobj(part, out)
+
+def _parse_range(task):
+    """Normaliza um intervalo de bytes do log e devolve (arquivo, linhas, DataFrame, rejeitadas por motivo)."""
+    input_file, start, end, utc, log_format = task
+    rejects = Counter()
+    frames = list(iter_chunks(input_file, None, start, end, utc, rejects, log_format))
+    return input_file, len(frames[0]) if frames else 0, frames[0] if frames else None, rejects
+
+def _map_tasks(func, tasks, workers):
+    """Executa as tarefas em ordem, em processos quando workers > 1."""
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            yield from executor.map(func, tasks)
+    else:
+        yield from map(func, tasks)
+
+@profiled()
+def normalize_frame(input_file, workers: int = 1, utc: bool = False, log_format: str = None):
+    """Normaliza um ou mais logs direto para um DataFrame em memória, sem gravar em disco.
+
+    input_file aceita um arquivo, um diretório, um padrão glob ou uma lista deles.
+    log_format ('clf', 'json' ou None/'auto' para detectar) como em normalize_log.
+    """
+    input_files = expand_inputs(input_file)
+    formatos = resolve_log_formats(input_files, log_format)
+    workers = workers or 1
+    rejects = Counter()
+    if len(input_files) == 1 and workers == 1:
+        frames = list(iter_chunks(input_files[0], utc=utc, rejects=rejects, log_format=formatos[input_files[0]]))
+    else:
+        tasks = [(f, start, end, utc, formatos[f]) for f, start, end in file_tasks(input_files, workers)]
+        frames = []
+        for _, _, df, parte in report_progress(_map_tasks(_parse_range, tasks, workers), input_files):
+            rejects.update(parte)
+            if df is not None:
+                frames.append(df)
+    report_rejects(rejects)
+    if not frames:
+        return build_frame([])
+    return pd.concat(frames, ignore_index=True)
+
+def _normalize_parallel(input_files, output_file, workers, chunk_size, utc, formatos, fmt, partitioned=False,
+                        replace=False):
+    """Normaliza os logs em paralelo (por arquivo ou por intervalo de bytes) e junta as partes em ordem.
+
+    Com partitioned, as partes são distribuídas pelas partições diárias de
+    output_file (ver _write_partitions, e replace) em vez de concatenadas.
+    Retorna as linhas gravadas, os acertos e falhas do cache de IPs e as linhas
+    rejeitadas por motivo, somados entre os processos.
+    """
+    if partitioned:
+        os.makedirs(output_file, exist_ok=True)
+    out_dir = os.path.abspath(output_file) if partitioned else os.path.dirname(os.path.abspath(output_file))
+    tasks = []
+    for input_file, start, end in file_tasks(input_files, workers):
+        fd, part_file = tempfile.mkstemp(prefix=".loguard-part-", suffix=f".{fmt}", dir=out_dir)
+        os.close(fd)
+        tasks.append((input_file, start, end, chunk_size, utc, formatos[input_file], fmt, part_file))
+
+    try:
+        parts = list(report_progress(_map_tasks(_normalize_range, tasks, workers), input_files))
+        if partitioned:
+            _write_partitions((batch.to_pandas() for p in parts for batch in _iter_arrow_batches(p[2], fmt)),
+                              output_file, fmt, replace)
+        else:
+            _merge_parts([p[2] for p in parts], output_file, fmt)
+        return (sum(p[1] for p in parts), sum(p[3] for p in parts), sum(p[4] for p in parts),
+                sum((p[5] for p in parts), Counter()))
+    finally:
+        for task in tasks:
+            if os.path.exists(task[-1]):
+                os.remove(task[-1])
+
+def normalize_log(input_file, output_file: str, chunk_size: int = None, workers: int = 1,
+                  utc: bool = False, fmt: str = None, log_format: str = None, partitioned: bool = False,
+                  replace: bool = False):
+    """Normaliza logs do Traefik em um único arquivo CSV, Parquet ou Feather.
+
+    input_file aceita um arquivo, um diretório, um padrão glob ou uma lista
+    deles; logs .gz, .bz2, .xz e .zst são descomprimidos em streaming.
+    Com chunk_size, o log é processado em lotes e o CSV é escrito de forma
+    incremental, mantendo o uso de memória limitado ao tamanho do lote.
+    Com workers > 1, os arquivos (ou, se houver um só, intervalos de bytes
+    dele) são processados em paralelo; a saída é idêntica à do modo em um
+    único processo.
+    Com utc, os horários são convertidos para UTC usando o fuso de cada linha.
+    O formato de saída vem de fmt ou da extensão de output_file.
+    log_format é o formato dos logs: 'clf' (texto), 'json' ou None/'auto'
+    para detectar pela primeira linha de cada arquivo; ambos geram LOG_COLUMNS.
+    Com partitioned, output_file é o diretório de um conjunto particionado
+    por dia (parquet, ou feather com fmt); só os dias presentes nos logs
+    são atualizados, juntando as linhas às de um dia já gravado em outro
+    horário. Com replace, os dias presentes são regravados por inteiro (ver
+    _write_partitions).
+    """
+    if partitioned:
+        fmt = fmt or load_manifest(output_file)["formato"] or 'parquet'
+    else:
+        fmt = resolve_format(output_file, fmt)
+    input_files = expand_inputs(input_file)
+    formatos = resolve_log_formats(input_files, log_format)
+    with stage("normalize_log") as registro:
+        if len(input_files) > 1 or (workers and workers > 1):
+            rows, hits, misses, rejects = _normalize_parallel(input_files, output_file, workers or 1,
+                                                              chunk_size, utc, formatos, fmt, partitioned, replace)
+        else:
+            rejects = Counter()
+            before = anonymize_ip_cached.cache_info()
+            chunks = iter_chunks(input_files[0], chunk_size, utc=utc, rejects=rejects,
+                                 log_format=formatos[input_files[0]])
+            if partitioned:
+                rows = _write_partitions(chunks, output_file, fmt, replace)
+            else:
+                rows = _write_chunks(chunks, output_file, fmt)
+            after = anonymize_ip_cached.cache_info()
+            hits, misses = after.hits - before.hits, after.misses - before.misses
+        registro["linhas"] = rows
 
+    print(f"Cache de IPs anonimizados: {hits} acertos, {misses} falhas")
+    report_rejects(rejects)
     print(f"Normalização concluída: {output_file}")
     return output_file
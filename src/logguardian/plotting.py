@@ -0,0 +1,176 @@
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from . import profiling
+
+# --- Configurações de Gráficos ---
+OUTPUT_DIR = "./output"
+PLOT_DIR = os.path.join(OUTPUT_DIR, "plots")
+# Gráficos adiados por --plots=lazy, gerados depois com `loguard plots`
+PENDING_PLOTS_FILE = os.path.join(PLOT_DIR, "pending_plots.pkl")
+
+# eager: gera os gráficos ao fim da análise; lazy: salva os dados para gerar
+# depois; none: não gera gráficos (o relatório usa apenas tabelas)
+PLOT_MODES = ("eager", "lazy", "none")
+
+def plot_job(kind, path, data):
+    """Descreve um gráfico a ser gerado: tipo (chave de RENDERERS), arquivo de saída e dados."""
+    return {"kind": kind, "path": path, "data": data}
+
+def _new_figure(figsize):
+    """Cria uma Figure com um único Axes, sem passar pelo estado global do pyplot."""
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=figsize)
+    return fig, fig.subplots()
+
+def _bar_labels(ax, bars, fmt, offset):
+    """Escreve o valor acima de cada barra não vazia."""
+    for bar in bars:
+        yval = bar.get_height()
+        if yval > 0:
+            ax.text(bar.get_x() + bar.get_width()/2, yval + offset(yval), fmt(yval), ha='center', va='bottom')
+
+def _plot_status_distribution(data):
+    fig, ax = _new_figure((8, 5))
+    bars = ax.bar(data.index.astype(str), data.values, color='mediumseagreen', edgecolor='black')
+    _bar_labels(ax, bars, lambda y: f'{int(y)}', lambda y: max(1, y*0.01))
+    ax.set_title('Distribuição de Status HTTP nas Requisições')
+    ax.set_xlabel('Código de Status HTTP')
+    ax.set_ylabel('Quantidade')
+    ax.grid(axis='y', linestyle='--', alpha=0.5)
+    return fig
+
+def _plot_requests_per_hour(data):
+    fig, ax = _new_figure((10, 6))
+    data.plot(kind='bar', color='mediumseagreen', edgecolor='black', ax=ax, rot=0)
+    ax.set_title('Requisições por Hora do Dia (Geral)')
+    ax.set_xlabel('Hora do dia')
+    ax.set_ylabel('Total de Requisições')
+    ax.grid(axis='y', linestyle='--', alpha=0.5)
+    return fig
+
+def _plot_daily_history(data):
+    fig, ax = _new_figure((10, 5))
+    ax.plot(data.index, data.values, linestyle='-', color='mediumseagreen')
+    ax.set_title('Histórico de Requisições Diárias')
+    ax.set_xlabel('Data')
+    ax.set_ylabel('Quantidade de Requisições')
+    ax.grid(True, linestyle='--', alpha=0.5)
+    ax.tick_params(axis='x', labelrotation=45)
+    return fig
+
+def _plot_heatmap_hour_method(data):
+    import seaborn as sns
+    fig, ax = _new_figure((10, 6))
+    sns.heatmap(data, cmap='viridis', annot=True, fmt=".0f", ax=ax)
+    ax.set_title('Requisições por Hora e Método HTTP')
+    ax.set_xlabel("Método HTTP")
+    ax.set_ylabel("Hora do Dia")
+    return fig
+
+def _plot_404_per_hour(data):
+    fig, ax = _new_figure((10, 6))
+    data.plot(kind='bar', color='salmon', edgecolor='black', ax=ax, rot=0)
+    ax.set_title('Requisições com Status 404 por Hora do Dia')
+    ax.set_xlabel('Hora do dia')
+    ax.set_ylabel('Total de Requisições 404')
+    ax.grid(axis='y', linestyle='--', alpha=0.5)
+    return fig
+
+def _plot_anomaly_types(data):
+    fig, ax = _new_figure((10, 6))
+    bars = ax.bar(data.index.astype(str), data.values, color='coral', edgecolor='black')
+    _bar_labels(ax, bars, lambda y: f'{int(y)}', lambda y: max(1, y*0.01))
+    ax.set_title('Contagem de Tipos de Anomalias Detectadas', fontsize=14, fontweight='bold')
+    ax.set_ylabel('Quantidade de Ocorrências', fontsize=12)
+    ax.set_xlabel('Tipo de Anomalia', fontsize=12)
+    ax.tick_params(axis='x', labelrotation=45)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment('right')
+    ax.grid(axis='y', linestyle='--', alpha=0.5)
+    return fig
+
+def _plot_anomaly_status_pct(data):
+    fig, ax = _new_figure((8, 5))
+    bars = ax.bar(data.index.astype(str), data.values, color='lightcoral', edgecolor='black')
+    _bar_labels(ax, bars, lambda y: f'{y:.2f}%', lambda y: 0.5)
+    ax.set_title('Distribuição de Status HTTP nas Requisições Anômalas (%)')
+    ax.set_xlabel('Código de Status HTTP')
+    ax.set_ylabel('Porcentagem')
+    ax.set_ylim(0, 100)
+    ax.grid(axis='y', linestyle='--', alpha=0.5)
+    return fig
+
+RENDERERS = {
+    "status_distribution": _plot_status_distribution,
+    "requests_per_hour": _plot_requests_per_hour,
+    "daily_history": _plot_daily_history,
+    "heatmap_hour_method": _plot_heatmap_hour_method,
+    "404_per_hour": _plot_404_per_hour,
+    "anomaly_types": _plot_anomaly_types,
+    "anomaly_status_pct": _plot_anomaly_status_pct,
+}
+
+def render_plot(job):
+    """Gera um gráfico em PNG; retorna o caminho salvo, ou None em caso de erro."""
+    try:
+        with profiling.stage(f"render_plot: {job['kind']}"):
+            os.makedirs(os.path.dirname(job["path"]) or ".", exist_ok=True)
+            fig = RENDERERS[job["kind"]](job["data"])
+            fig.tight_layout()
+            fig.savefig(job["path"])
+        print(f"Gráfico salvo em: {job['path']}")
+        return job["path"]
+    except Exception as e:
+        print(f"Erro ao gerar gráfico {job['path']}: {e}")
+        return None
+
+def _render_plot_profiled(job):
+    """Gera um gráfico em um processo do pool, devolvendo também as medições do perfil."""
+    profiler = profiling.enable()
+    return render_plot(job), profiler.records
+
+@profiling.profiled()
+def render_plots(jobs, workers=None):
+    """Gera vários gráficos em paralelo (um processo por gráfico, até `workers`).
+
+    Retorna o conjunto de caminhos gerados com sucesso.
+    """
+    if not jobs:
+        return set()
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    print(f"Gerando {len(jobs)} gráficos com {workers} processo(s)...")
+    if workers == 1:
+        rendered = [render_plot(job) for job in jobs]
+    else:
+        profiler = profiling.active()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            if profiler is None:
+                rendered = list(executor.map(render_plot, jobs))
+            else:
+                rendered = []
+                for path, records in executor.map(_render_plot_profiled, jobs):
+                    rendered.append(path)
+                    profiler.add_records(records)
+    return {path for path in rendered if path}
+
+def save_plot_jobs(jobs, path=PENDING_PLOTS_FILE):
+    """Guarda os gráficos adiados para serem gerados depois com `loguard plots`."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'wb') as f:
+        pickle.dump(jobs, f)
+    print(f"{len(jobs)} gráficos adiados salvos em: {path}")
+
+def render_pending_plots(path=PENDING_PLOTS_FILE, workers=None):
+    """Gera os gráficos adiados por --plots=lazy e remove o arquivo de pendências."""
+    if not os.path.exists(path):
+        print(f"Nenhum gráfico pendente em: {path}")
+        return set()
+    with open(path, 'rb') as f:
+        jobs = pickle.load(f)
+    rendered = render_plots(jobs, workers)
+    if len(rendered) == len(jobs):
+        os.remove(path)
+    return rendered
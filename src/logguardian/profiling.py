@@ -0,0 +1,178 @@
+import os
+import re
+import sys
+import json
+import time
+import datetime
+import functools
+import contextlib
+
+try:
+    import resource  # só em sistemas Unix
+except ImportError:
+    resource = None
+
+# --- Configurações do perfil de execução (--profile) ---
+OUTPUT_DIR = "./output"
+PROFILE_FILE = os.path.join(OUTPUT_DIR, "profile.json")
+
+# Perfil ativo (None quando --profile não foi usado: os estágios não medem nada)
+_profiler = None
+
+def reset_peak_rss():
+    """Zera o pico de RSS do processo (Linux, /proc/self/clear_refs); retorna False se não for possível."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb():
+    """Pico de RSS do processo em MB (VmHWM no Linux; ru_maxrss nos demais Unix); None se indisponível."""
+    try:
+        with open("/proc/self/status") as f:
+            return int(re.search(r"VmHWM:\s+(\d+)", f.read()).group(1)) / 1024
+    except (OSError, AttributeError):
+        if resource is None:
+            return None
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+def children_cpu_s():
+    """Tempo de CPU (usuário + sistema) dos processos filhos já encerrados; 0 sem o módulo resource."""
+    if resource is None:
+        return 0.0
+    uso = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return uso.ru_utime + uso.ru_stime
+
+def max_rss(*valores):
+    """Maior pico de RSS entre os valores conhecidos (None quando nenhum é conhecido)."""
+    conhecidos = [valor for valor in valores if valor is not None]
+    return max(conhecidos) if conhecidos else None
+
+def format_rss(mb, spec=".1f"):
+    """Formata um pico de RSS em MB, ou "n/d" quando não pôde ser medido."""
+    return "n/d" if mb is None else format(mb, spec)
+
+class Profiler:
+    """Registra tempo de parede, tempo de CPU, linhas e pico de RSS de cada estágio.
+
+    Estágios podem ser aninhados (ex.: cada gráfico dentro de render_plots);
+    o pico de um estágio inclui o dos estágios internos. O tempo de CPU inclui
+    o dos processos filhos encerrados durante o estágio (normalização e
+    gráficos em paralelo).
+    """
+
+    def __init__(self):
+        self.records = []
+        self._stack = []
+        self.rss_per_stage = reset_peak_rss()
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=None):
+        """Mede o bloco como o estágio `name`; o registro devolvido aceita `linhas` definidas depois."""
+        if self._stack:
+            # O pico até aqui pertence ao estágio externo, antes de ser zerado
+            self._stack[-1]["_pico"] = max_rss(self._stack[-1]["_pico"], peak_rss_mb())
+        self.rss_per_stage = reset_peak_rss() and self.rss_per_stage
+        record = {"estagio": name, "nivel": len(self._stack), "linhas": rows, "_pico": None}
+        self.records.append(record)
+        self._stack.append(record)
+        inicio, cpu, filhos = time.perf_counter(), time.process_time(), children_cpu_s()
+        try:
+            yield record
+        finally:
+            wall = time.perf_counter() - inicio
+            pico = max_rss(record.pop("_pico"), peak_rss_mb())
+            record["wall_s"] = round(wall, 4)
+            record["cpu_s"] = round(time.process_time() - cpu + children_cpu_s() - filhos, 4)
+            record["linhas_por_s"] = round(record["linhas"] / wall) if record["linhas"] and wall > 0 else None
+            record["rss_pico_mb"] = None if pico is None else round(pico, 1)
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1]["_pico"] = max_rss(self._stack[-1]["_pico"], pico)
+
+    def add_records(self, records):
+        """Incorpora registros medidos em outro processo, aninhados no estágio atual."""
+        for record in records:
+            self.records.append(dict(record, nivel=len(self._stack) + record["nivel"]))
+
+    def summary(self):
+        """Resumo serializável em JSON: estágios na ordem de início e o total dos estágios de primeiro nível."""
+        medidos = [r for r in self.records if "wall_s" in r]
+        externos = [r for r in medidos if r["nivel"] == 0]
+        return {
+            "data": datetime.datetime.now().isoformat(timespec="seconds"),
+            "rss_por_estagio": self.rss_per_stage,
+            "estagios": medidos,
+            "total": {
+                "wall_s": round(sum(r["wall_s"] for r in externos), 4),
+                "cpu_s": round(sum(r["cpu_s"] for r in externos), 4),
+                "rss_pico_mb": max_rss(*(r["rss_pico_mb"] for r in externos)),
+            },
+        }
+
+def enable():
+    """Ativa o perfil de execução (um novo, descartando o anterior) e o retorna."""
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+def active():
+    """Perfil ativo, ou None."""
+    return _profiler
+
+def stage(name, rows=None):
+    """Contexto que mede um estágio no perfil ativo; sem perfil ativo, não mede nada."""
+    if _profiler is None:
+        return contextlib.nullcontext({})
+    return _profiler.stage(name, rows)
+
+def _count_rows(value):
+    """Linhas de um DataFrame/array (pelo shape), ou None."""
+    shape = getattr(value, "shape", None)
+    return shape[0] if shape else None
+
+def profiled(name=None):
+    """Decorador que mede a função como um estágio (nome padrão: o da função).
+
+    As linhas processadas são as do primeiro argumento, se for um DataFrame
+    ou array, ou então as do resultado.
+    """
+    def decorator(func):
+        nome = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return func(*args, **kwargs)
+            with _profiler.stage(nome, _count_rows(args[0]) if args else None) as record:
+                result = func(*args, **kwargs)
+                if record["linhas"] is None:
+                    record["linhas"] = _count_rows(result)
+            return result
+        return wrapper
+    return decorator
+
+def format_profile(summary):
+    """Formata o resumo do perfil como uma tabela de texto para o terminal."""
+    linhas = [f"{'Estágio':<36} {'Parede (s)':>10} {'CPU (s)':>9} {'Linhas':>12} {'Linhas/s':>12} {'Pico RSS (MB)':>14}"]
+    for r in summary["estagios"]:
+        nome = "  " * r["nivel"] + r["estagio"]
+        linhas.append(f"{nome:<36} {r['wall_s']:>10.3f} {r['cpu_s']:>9.3f} "
+                      f"{r['linhas'] if r['linhas'] is not None else '-':>12} "
+                      f"{r['linhas_por_s'] if r['linhas_por_s'] is not None else '-':>12} {format_rss(r['rss_pico_mb']):>14}")
+    total = summary["total"]
+    linhas.append(f"{'Total':<36} {total['wall_s']:>10.3f} {total['cpu_s']:>9.3f} {'':>12} {'':>12} "
+                  f"{format_rss(total['rss_pico_mb']):>14}")
+    if not summary["rss_por_estagio"]:
+        linhas.append("Obs.: o pico de RSS não pôde ser zerado entre estágios; os valores são acumulados.")
+    return "\n".join(linhas)
+
+def save_profile(summary, path=PROFILE_FILE):
+    """Grava o resumo do perfil em JSON."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    return path
@@ -1,6 +1,7 @@
 import os
 import datetime
 from collections import Counter
+from .profiling import profiled, format_rss
 
 def ensure_dir(directory):
     """Garante que um diretório exista."""
@@ -22,6 +23,39 @@ def format_dict_for_md(data_dict, indent=0):
             md_string += f"{prefix}- **{key}:** {value}\n"
     return md_string
 
+def format_table_for_md(headers, rows):
+    """Formata linhas como uma tabela Markdown (usada quando não há gráfico)."""
+    md_string = "| " + " | ".join(headers) + " |\n"
+    md_string += "|" + "|".join(["---"] + ["---:"] * (len(headers) - 1)) + "|\n"
+    for row in rows:
+        md_string += "| " + " | ".join(str(cell) for cell in row) + " |\n"
+    return md_string + "\n"
+
+# Marca dos gráficos adiados por --plots=lazy, removida por `loguard plots` (mark_plots_rendered)
+PENDING_PLOT_NOTE = "*Gráfico pendente: gere-o com `loguard plots`.*\n\n"
+
+def plot_available(path, pending=False):
+    """Indica se o gráfico em path entra no relatório: já gerado ou adiado para `loguard plots`."""
+    return bool(path) and (pending or os.path.exists(path))
+
+def plot_md(alt, filename, pending=False):
+    """Imagem Markdown de um gráfico em ./plots, marcada como pendente se ainda não foi gerado."""
+    md_string = f"![{alt}](./plots/{filename})\n\n"
+    return md_string + PENDING_PLOT_NOTE if pending else md_string
+
+def mark_plots_rendered(report_file, rendered):
+    """Remove do relatório a marca de pendente dos gráficos em rendered, gerados por `loguard plots`."""
+    if not os.path.exists(report_file):
+        return
+    with open(report_file, 'r', encoding='utf-8') as f:
+        md_content = f.read()
+    for path in rendered:
+        imagem = f"(./plots/{os.path.basename(path)})\n\n"
+        md_content = md_content.replace(imagem + PENDING_PLOT_NOTE, imagem)
+    with open(report_file, 'w', encoding='utf-8') as f:
+        f.write(md_content)
+
+@profiled()
 def export_to_markdown(data, output_file):
     """Gera um relatório Markdown estruturado com os resultados da análise.
 
@@ -37,6 +71,9 @@ def export_to_markdown(data, output_file):
     date_str = now.strftime("%d/%m/%Y %H:%M:%S")
     md_content += f"**Data de Geração:** {date_str}\n\n"
     
+    # Com --plots=lazy, os gráficos são referenciados antes de existirem
+    pendentes = data.get('graficos_pendentes', False)
+
     md_content += "Este relatório apresenta uma análise detalhada dos logs do Traefik, incluindo estatísticas gerais, padrões de tráfego, análise de erros e detecção de anomalias. Além disso, foi incorporada uma análise de geolocalização dos IPs para identificar a origem geográfica das requisições.\n\n"
 
     # Seção: Sumário Executivo
@@ -58,6 +95,10 @@ def export_to_markdown(data, output_file):
     if '404_analysis' in data and data['404_analysis'].get('total_erros_404', 0) > 0:
         error_rate = (data['404_analysis']['total_erros_404'] / data['general_stats']['total_registros']) * 100
         md_content += f"- **Taxa de Erros 404 (Não Encontrado):** {error_rate:.2f}% do total de requisições.\n"
+
+    if data.get('latency'):
+        lg = data['latency']['geral']
+        md_content += f"- **Latência (p50 / p95 / p99):** {lg['p50']:,.1f} / {lg['p95']:,.1f} / {lg['p99']:,.1f} ms\n"
     
     if 'anomaly_detection' in data:
         anomaly_rate = data['anomaly_detection'].get('percentual_anomalias', 0)
@@ -68,7 +109,18 @@ def export_to_markdown(data, output_file):
         gs = data["general_stats"]
         md_content += f"## Resumo Geral\n\n"
         md_content += f"- **Período Analisado:** {gs.get('periodo_analisado', 'N/A')} ({gs.get('duracao_dias', 'N/A')} dias)\n"
-        md_content += f"- **Total de Registros Processados:** {gs.get('total_registros', 'N/A'):,}\n\n"
+        md_content += f"- **Total de Registros Processados:** {gs.get('total_registros', 'N/A'):,}\n"
+        if 'memory_usage' in data:
+            mu = data['memory_usage']
+            md_content += f"- **Memória do DataFrame:** {mu.get('memoria_tipada_mb', 0):,.2f} MB com a tipagem compacta; ~{mu.get('memoria_layout_anterior_mb', 0):,.2f} MB estimados para o layout anterior (textos como object, dia e mês por nome; amostra de {mu.get('linhas_amostra', 0):,} linhas)\n"
+        if 'sketch' in data:
+            sk = data['sketch']
+            md_content += f"- **Modo Aproximado:** ~{sk.get('ips_distintos', 0):,} IPs e ~{sk.get('recursos_distintos', 0):,} recursos distintos (HyperLogLog, erro típico de ±{sk.get('erro_relativo_distintos', 0):.2f}%); "
+            md_content += f"rankings de IPs e recursos estimados com {sk.get('contadores', 0):,} contadores (Space-Saving), cada contagem superestimada em no máximo {max(sk.get('erro_max_contagem', {0: 0}).values()):,} requisições\n"
+        if 'incremental' in data:
+            inc = data['incremental']
+            md_content += f"- **Modo Incremental:** {inc.get('lotes_incorporados', 0):,} lotes acumulados em `{inc.get('arquivo_estado')}`; o lote atual tem {inc.get('registros_no_lote', 0):,} registros\n"
+        md_content += "\n"
 
     # Seção: Análise de Geolocalização de IPs (agora focada em top 200 e top 404)
     if 'ip_geolocation' in data:
@@ -93,6 +145,22 @@ def export_to_markdown(data, output_file):
         if geo.get('total_ips_analisados') is not None:
             md_content += f"- **Total de IPs únicos analisados (Top 200 e Top 404):** {geo.get('total_ips_analisados'):,}\n\n"
 
+        if geo.get('requisicoes_por_pais'):
+            total_geo = sum(geo['requisicoes_por_pais'].values())
+            md_content += f"### Distribuição por País (Todo o Tráfego)\n\n"
+            md_content += f"Localização offline de {geo.get('total_ips_geolocalizados', 0):,} IPs distintos.\n\n"
+            md_content += "| País | Requisições | % |\n|---|---:|---:|\n"
+            for country, count in list(geo['requisicoes_por_pais'].items())[:10]:
+                md_content += f"| {country} | {count:,} | {count / total_geo * 100:.2f}% |\n"
+            md_content += "\n"
+
+        if geo.get('erros_404_por_pais'):
+            md_content += f"### Distribuição por País (Erros 404)\n\n"
+            md_content += "| País | Erros 404 |\n|---|---:|\n"
+            for country, count in list(geo['erros_404_por_pais'].items())[:10]:
+                md_content += f"| {country} | {count:,} |\n"
+            md_content += "\n"
+
     # Seção: Análise de Status HTTP
     if 'status_codes' in data:
         sc = data['status_codes']
@@ -105,8 +173,8 @@ def export_to_markdown(data, output_file):
         else:
             md_content += "- Nenhuma contagem de status disponível.\n"
         md_content += "\n"
-        if sc.get('plot_path') and os.path.exists(sc['plot_path']):
-            md_content += f"![Distribuição de Status HTTP](./plots/status_distribution.png)\n\n" # Caminho relativo
+        if plot_available(sc.get('plot_path'), pendentes):
+            md_content += plot_md("Distribuição de Status HTTP", "status_distribution.png", pendentes)
 
     # Seção: Padrões Temporais
     if 'time_patterns' in data:
@@ -115,12 +183,20 @@ def export_to_markdown(data, output_file):
         md_content += "Esta seção explora os padrões de requisições ao longo do tempo, por hora e por dia da semana.\n\n"
         md_content += f"- **Horário de Pico (Geral):** {tp.get('pico_requisicoes_hora', 'N/A'):02d}:00h\n"
         md_content += f"- **Dia da Semana de Pico (Geral):** {tp.get('pico_requisicoes_dia', 'N/A')}\n\n"
-        if tp.get('plot_path_hora') and os.path.exists(tp['plot_path_hora']):
-             md_content += f"### Requisições por Hora\n![Requisições por Hora](./plots/requests_per_hour.png)\n\n"
-        if tp.get('plot_path_historico') and os.path.exists(tp['plot_path_historico']):
-             md_content += f"### Histórico Diário de Requisições\n![Histórico Diário](./plots/daily_requests_history.png)\n\n"
-        if tp.get('plot_path_heatmap') and os.path.exists(tp['plot_path_heatmap']):
-             md_content += f"### Heatmap Hora vs. Método HTTP\n![Heatmap Hora/Método](./plots/heatmap_hour_method.png)\n\n"
+        if plot_available(tp.get('plot_path_hora'), pendentes):
+             md_content += "### Requisições por Hora\n" + plot_md("Requisições por Hora", "requests_per_hour.png", pendentes)
+        elif tp.get('requisicoes_por_hora'):
+             md_content += f"### Requisições por Hora\n\n"
+             md_content += format_table_for_md(["Hora", "Requisições"],
+                                               [(f"{h:02d}:00h", f"{c:,}") for h, c in tp['requisicoes_por_hora'].items()])
+        if plot_available(tp.get('plot_path_historico'), pendentes):
+             md_content += "### Histórico Diário de Requisições\n" + plot_md("Histórico Diário", "daily_requests_history.png", pendentes)
+        elif tp.get('historico_requisicoes_diarias'):
+             md_content += f"### Histórico Diário de Requisições\n\n"
+             md_content += format_table_for_md(["Data", "Requisições"],
+                                               [(d, f"{c:,}") for d, c in tp['historico_requisicoes_diarias'].items()])
+        if plot_available(tp.get('plot_path_heatmap'), pendentes):
+             md_content += "### Heatmap Hora vs. Método HTTP\n" + plot_md("Heatmap Hora/Método", "heatmap_hour_method.png", pendentes)
 
     # Seção: Análise de Recursos
     if 'resource_analysis' in data:
@@ -153,8 +229,12 @@ def export_to_markdown(data, output_file):
         if fa.get('total_erros_404', 0) > 0:
             md_content += f"- **Horário de Pico (404):** {fa.get('pico_404_hora', 'N/A'):02d}:00h\n"
             md_content += f"- **Dia da Semana de Pico (404):** {fa.get('pico_404_dia', 'N/A')}\n\n"
-            if fa.get('plot_path_404_hora') and os.path.exists(fa['plot_path_404_hora']):
-                md_content += f"### Requisições 404 por Hora\n![404 por Hora](./plots/404_requests_per_hour.png)\n\n"
+            if plot_available(fa.get('plot_path_404_hora'), pendentes):
+                md_content += "### Requisições 404 por Hora\n" + plot_md("404 por Hora", "404_requests_per_hour.png", pendentes)
+            elif fa.get('requisicoes_404_por_hora'):
+                md_content += f"### Requisições 404 por Hora\n\n"
+                md_content += format_table_for_md(["Hora", "Erros 404"],
+                                                  [(f"{h:02d}:00h", f"{c:,}") for h, c in fa['requisicoes_404_por_hora'].items()])
             md_content += f"### Top {top_n} Recursos Gerando 404\n\n"
             if fa.get(f'top_{top_n}_recursos_404_mais_acessados'):
                 for resource, count in fa[f'top_{top_n}_recursos_404_mais_acessados'].items():
@@ -165,15 +245,39 @@ def export_to_markdown(data, output_file):
         else:
              md_content += "\n"
 
+    # Seção: Análise de Latência (só com os campos de duração do Traefik)
+    if data.get('latency'):
+        lt = data['latency']
+        top_n = 10
+        percentis = lambda linha: [f"{linha['p50']:,.1f}", f"{linha['p95']:,.1f}", f"{linha['p99']:,.1f}"]
+        md_content += f"## Análise de Latência\n\n"
+        md_content += "Esta seção apresenta os percentis do tempo de resposta (campo de duração do Traefik), estimados com t-digest.\n\n"
+        md_content += f"- **Requisições com Latência Registrada:** {lt.get('total_com_latencia', 0):,}\n"
+        md_content += f"- **p50 / p95 / p99 (Geral):** {' / '.join(percentis(lt['geral']))} ms\n\n"
+        if lt.get(f'top_{top_n}_roteadores'):
+            md_content += f"### Latência por Roteador (Top {top_n} por Volume)\n\n"
+            md_content += format_table_for_md(["Roteador", "Requisições", "p50 (ms)", "p95 (ms)", "p99 (ms)"],
+                                              [[f"`{r}`", f"{l['n']:,}"] + percentis(l) for r, l in lt[f'top_{top_n}_roteadores'].items()])
+        if lt.get('por_hora'):
+            md_content += f"### Latência por Hora\n\n"
+            md_content += format_table_for_md(["Hora", "Requisições", "p50 (ms)", "p95 (ms)", "p99 (ms)"],
+                                              [[f"{h:02d}:00h", f"{l['n']:,}"] + percentis(l) for h, l in lt['por_hora'].items()])
+        if lt.get(f'top_{top_n}_recursos_mais_lentos'):
+            md_content += f"### Top {top_n} Recursos Mais Lentos (p95, mínimo de {lt.get('min_requisicoes_recurso', 0)} requisições)\n\n"
+            md_content += format_table_for_md(["Recurso", "Requisições", "p50 (ms)", "p95 (ms)", "p99 (ms)"],
+                                              [[f"`{r}`", f"{l['n']:,}"] + percentis(l) for r, l in lt[f'top_{top_n}_recursos_mais_lentos'].items()])
+
     # Seção: Detecção de Anomalias
     if 'anomaly_detection' in data:
         ad = data['anomaly_detection']
         md_content += f"## Detecção de Anomalias\n\n"
         md_content += "Esta seção identifica padrões de requisições que podem indicar atividades incomuns ou maliciosas.\n\n"
+        if 'incremental' in data:
+            md_content += "*No modo incremental, as anomalias referem-se apenas ao lote atual (os limiares por IP usam as contagens acumuladas).*\n\n"
         md_content += f"- **Total de Requisições Anômalas Detectadas:** {ad.get('total_anomalias_detectadas', 0):,} ({ad.get('percentual_anomalias', 0):.2f}% do total)\n\n"
 
-        if ad.get('plot_path_tipos_anomalia') and os.path.exists(ad['plot_path_tipos_anomalia']):
-            md_content += f"### Contagem por Tipo de Anomalia\n![Tipos de Anomalia](./plots/anomaly_types_count.png)\n\n"
+        if plot_available(ad.get('plot_path_tipos_anomalia'), pendentes):
+            md_content += "### Contagem por Tipo de Anomalia\n" + plot_md("Tipos de Anomalia", "anomaly_types_count.png", pendentes)
         else:
              md_content += f"### Contagem por Tipo de Anomalia:\n\n"
              if ad.get('contagem_por_tipo_anomalia'):
@@ -182,8 +286,12 @@ def export_to_markdown(data, output_file):
                  md_content += "- Nenhuma anomalia específica contada.\n"
              md_content += "\n"
 
-        if ad.get('plot_path_status_anomalias') and os.path.exists(ad['plot_path_status_anomalias']):
-            md_content += f"### Distribuição de Status HTTP em Anomalias (%)\n![Status em Anomalias](./plots/anomaly_status_distribution_pct.png)\n\n"
+        if plot_available(ad.get('plot_path_status_anomalias'), pendentes):
+            md_content += "### Distribuição de Status HTTP em Anomalias (%)\n" + plot_md("Status em Anomalias", "anomaly_status_distribution_pct.png", pendentes)
+        elif ad.get('distribuicao_status_http_anomalias_percentual'):
+            md_content += f"### Distribuição de Status HTTP em Anomalias (%)\n\n"
+            md_content += format_table_for_md(["Status", "%"],
+                                              [(code, f"{pct:.2f}%") for code, pct in ad['distribuicao_status_http_anomalias_percentual'].items()])
 
         md_content += f"### Detalhes das Anomalias\n\n"
         md_content += f"- **Métodos HTTP Incomuns:**\n{format_dict_for_md(ad.get('metodos_http_incomuns_detectados', {}), 1)}"
@@ -224,6 +332,35 @@ def export_to_markdown(data, output_file):
                 md_content += f"- `{ip}`: {count:,} requisições\n"
             md_content += "\n"
 
+        rj = ad.get('rajadas_por_ip')
+        if rj:
+            limites = ", ".join(f"mais de {limite} em {janela}" for janela, limite in rj.get('limites', {}).items())
+            md_content += f"### Rajadas de Requisições por IP\n\n"
+            md_content += f"Picos de requisições do mesmo IP em janelas deslizantes de tempo (rajada: {limites}). "
+            md_content += f"{rj.get('total_ips_com_rajada', 0):,} IPs apresentaram rajadas.\n\n"
+            if rj.get('picos_por_ip'):
+                janelas = list(rj['limites'])
+                md_content += format_table_for_md(["IP"] + [f"Pico em {j}" for j in janelas],
+                                                  [[f"`{ip}`"] + [f"{picos[j]:,}" for j in janelas]
+                                                   for ip, picos in rj['picos_por_ip'].items()])
+            if rj.get('intervalos'):
+                md_content += f"#### Maiores Intervalos de Rajada\n\n"
+                md_content += format_table_for_md(["IP", "Janela", "Início", "Fim", "Pico"],
+                                                  [(f"`{i['ip']}`", f"{i['janela_s']}s", i['inicio'], i['fim'], f"{i['pico']:,}")
+                                                   for i in rj['intervalos']])
+
+
+    if data.get('performance'):
+        perf = data['performance']
+        md_content += f"## Desempenho da Execução\n\n"
+        md_content += "Tempo e memória de cada estágio medidos com `--profile` (a geração deste relatório não está incluída). "
+        md_content += f"Tempo total: {perf['total']['wall_s']:.2f}s; pico de memória: {format_rss(perf['total']['rss_pico_mb'], ',.1f')} MB.\n\n"
+        md_content += format_table_for_md(
+            ["Estágio", "Parede (s)", "CPU (s)", "Linhas", "Linhas/s", "Pico RSS (MB)"],
+            [("&nbsp;&nbsp;" * r['nivel'] + f"`{r['estagio']}`", f"{r['wall_s']:.3f}", f"{r['cpu_s']:.3f}",
+              f"{r['linhas']:,}" if r['linhas'] is not None else "-",
+              f"{r['linhas_por_s']:,}" if r['linhas_por_s'] is not None else "-", format_rss(r['rss_pico_mb'], ',.1f'))
+             for r in perf['estagios']])
 
     # Adicionar seção de conclusões e recomendações
     md_content += f"## Conclusões e Recomendações\n\n"
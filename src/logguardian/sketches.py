@@ -0,0 +1,300 @@
+import numpy as np
+import pandas as pd
+
+# --- Configurações dos sketches (modo aproximado) ---
+SKETCH_K = 1000          # contadores do Space-Saving: erro máximo por contagem = total / K
+HLL_PRECISION = 14       # 2^14 registradores no HyperLogLog: erro relativo típico de ~0,8%
+SKETCH_CHUNK_ROWS = 250_000  # linhas por lote: limita a memória de cada passada (~200 MB com recursos longos)
+TDIGEST_COMPRESSION = 200  # δ do t-digest: até ~δ/2 centróides por chave, erro típico < 2% no p99
+
+def value_codes(series):
+    """Códigos inteiros de cada valor (-1 para ausentes) e os valores distintos, sem ordená-los.
+
+    Em categóricas, os próprios códigos e categorias; nas demais, pd.factorize.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.cat.categories
+    return pd.factorize(series)
+
+def hash_values(series):
+    """Hash uint64 estável dos valores da série, para o HyperLogLog.
+
+    Em categóricas, só as categorias presentes na série são hasheadas (uma
+    vez cada), e não todas as categorias.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        usados = np.unique(codes[codes >= 0])
+        return pd.util.hash_array(series.cat.categories.take(usados).to_numpy(dtype=object))
+    return pd.util.hash_array(series.dropna().to_numpy(dtype=object))
+
+def _bit_length(values):
+    """Número de bits significativos de cada uint64 (0 para zero), sem perda de precisão."""
+    alto = (values >> np.uint64(32)).astype(np.float64)
+    baixo = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(alto > 0, 32 + np.frexp(alto)[1], np.frexp(baixo)[1])
+
+class HyperLogLog:
+    """Estimador de cardinalidade (valores distintos) com memória fixa de 2^p bytes.
+
+    Dois sketches com a mesma precisão são combinados pelo máximo dos
+    registradores, o que permite somar arquivos, lotes e processos.
+    """
+
+    def __init__(self, p=HLL_PRECISION):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        """Incorpora um array de hashes uint64."""
+        if len(hashes) == 0:
+            return
+        bits = 64 - self.p
+        indices = (hashes >> np.uint64(bits)).astype(np.int64)
+        resto = hashes & np.uint64((1 << bits) - 1)
+        rank = (bits - _bit_length(resto) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, indices, rank)
+
+    def add(self, series):
+        """Incorpora os valores de uma série."""
+        self.add_hashes(hash_values(series))
+
+    def merge(self, other):
+        """Combina outro sketch (mesma precisão) a este."""
+        if other.p != self.p:
+            raise ValueError("HyperLogLog com precisões diferentes não podem ser combinados")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        """Estimativa do número de valores distintos."""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimativa = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimativa <= 2.5 * m and zeros:
+            estimativa = m * np.log(m / zeros)  # correção para cardinalidades pequenas
+        return int(round(estimativa))
+
+    def relative_error(self):
+        """Erro relativo padrão da estimativa (1,04 / raiz do número de registradores)."""
+        return 1.04 / np.sqrt(len(self.registers))
+
+class SpaceSaving:
+    """Contador aproximado dos valores mais frequentes (heavy hitters) com até k chaves.
+
+    Cada contagem mantida é superestimada em no máximo total / k (o erro de
+    cada chave fica em `errors`). Resumos são combinados somando as contagens
+    e usando a menor contagem de cada resumo para as chaves que ele não tem.
+    """
+
+    def __init__(self, k=SKETCH_K):
+        self.k = k
+        self.counts = pd.Series(dtype='int64')
+        self.errors = pd.Series(dtype='int64')
+        self.total = 0
+
+    def min_count(self):
+        """Limite superior da contagem de qualquer chave fora do resumo."""
+        return int(self.counts.min()) if len(self.counts) >= self.k else 0
+
+    @classmethod
+    def from_counts(cls, counts, k=SKETCH_K):
+        """Resumo a partir de contagens exatas (ex.: de um lote), reduzido a k chaves."""
+        return cls(k).merge_counts(counts, counts * 0, int(counts.sum()), 0)
+
+    def merge_counts(self, counts, errors, total, min_count):
+        """Combina contagens (com seus erros e o limite para chaves ausentes) a este resumo."""
+        proprio = self.min_count()
+        index = self.counts.index.append(counts.index[~counts.index.isin(self.counts.index)])
+        somadas = self.counts.reindex(index).fillna(proprio) + counts.reindex(index).fillna(min_count)
+        erros = self.errors.reindex(index).fillna(proprio) + errors.reindex(index).fillna(min_count)
+        manter = np.argsort(-somadas.to_numpy(), kind='stable')[:self.k]
+        self.counts = somadas.iloc[manter].astype('int64')
+        self.errors = erros.iloc[manter].astype('int64')
+        self.total += total
+        return self
+
+    def update(self, series):
+        """Incorpora um lote de valores (contados exatamente no lote e então resumidos)."""
+        codes, uniques = value_codes(series)
+        return self.update_codes(codes, uniques, series.name)
+
+    def update_codes(self, codes, uniques, name=None):
+        """Incorpora um lote dado pelos códigos de cada valor (-1: ausente) e pelos valores distintos.
+
+        A contagem do lote usa só os códigos presentes nele, sem arrays do
+        tamanho de uniques, e só as k chaves mais frequentes do lote são
+        combinadas ao resumo; a menor delas limita as descartadas.
+        """
+        codes = codes[codes >= 0]
+        # Códigos locais na ordem da primeira ocorrência, que desempata as contagens iguais
+        locais, presentes = pd.factorize(codes)
+        contagens = np.bincount(locais)
+        candidatos = np.arange(len(contagens))
+        if len(contagens) > self.k:
+            candidatos = np.flatnonzero(contagens >= np.partition(contagens, -self.k)[-self.k])
+        manter = candidatos[np.argsort(-contagens[candidatos], kind='stable')[:self.k]]
+        counts = pd.Series(contagens[manter], index=pd.Index(uniques.take(presentes[manter]), name=name))
+        limite = int(counts.min()) if len(contagens) > self.k else 0
+        return self.merge_counts(counts, counts * 0, len(codes), limite)
+
+    def merge(self, other):
+        """Combina outro resumo a este (ex.: de outro arquivo ou processo)."""
+        return self.merge_counts(other.counts, other.errors, other.total, other.min_count())
+
+    def top(self, n=None):
+        """Chaves mais frequentes com as contagens estimadas, da maior para a menor."""
+        return self.counts if n is None else self.counts.head(n)
+
+    def max_error(self):
+        """Erro máximo (superestimação) de qualquer contagem: total / k."""
+        return self.total / self.k
+
+class TDigest:
+    """t-digest agrupado: quantis aproximados de valores (ex.: latências) por chave.
+
+    Os centróides (média, peso) de todas as chaves ficam nos mesmos arrays e
+    são comprimidos de forma vetorizada: ordenados por (chave, valor), cada
+    centróide cobre no máximo uma unidade da escala k1 = δ/(2π)·asin(2q − 1),
+    que mantém centróides pequenos nas caudas (p99 preciso) e limita a
+    memória a ~δ/2 centróides por chave. Mínimo e máximo são exatos. Dois
+    digests com a mesma compressão são combinados concatenando os centróides
+    e comprimindo de novo, o que permite somar lotes, arquivos e processos.
+    """
+
+    def __init__(self, compression=TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.keys = pd.Index([], dtype=object)
+        self.group = np.zeros(0, dtype=np.int64)
+        self.mean = np.zeros(0)
+        self.weight = np.zeros(0)
+        self.min = np.zeros(0)
+        self.max = np.zeros(0)
+
+    def _key_codes(self, keys):
+        """Posição de cada chave (distinta) em self.keys, acrescentando as novas."""
+        keys = pd.Index(np.asarray(keys), dtype=object)
+        novas = keys[~keys.isin(self.keys)]
+        if len(novas):
+            self.keys = self.keys.append(novas)
+            self.min = np.r_[self.min, np.full(len(novas), np.inf)]
+            self.max = np.r_[self.max, np.full(len(novas), -np.inf)]
+        return self.keys.get_indexer(keys)
+
+    def _compress(self, group, mean, weight):
+        """Ordena os centróides por (chave, valor) e funde os que caem na mesma unidade da escala k1."""
+        # Ordena por valor e depois, de forma estável, por chave (radix sort com até 2^16 chaves)
+        ordem = np.argsort(mean)
+        tipo = np.uint16 if len(self.keys) <= np.iinfo(np.uint16).max else np.int64
+        ordem = ordem[np.argsort(group[ordem].astype(tipo), kind='stable')]
+        g, m, w = group[ordem], mean[ordem], weight[ordem]
+        inicio = np.flatnonzero(np.r_[True, g[1:] != g[:-1]])
+        fim = np.r_[inicio[1:], len(g)] - 1
+        # Os centróides antigos estão entre o mínimo e o máximo já registrados
+        self.min[g[inicio]] = np.minimum(self.min[g[inicio]], m[inicio])
+        self.max[g[fim]] = np.maximum(self.max[g[fim]], m[fim])
+        tamanhos = fim - inicio + 1
+        acumulado = np.cumsum(w)
+        antes = np.repeat(acumulado[inicio] - w[inicio], tamanhos)
+        total = np.repeat(acumulado[fim], tamanhos) - antes
+        q = (acumulado - antes - w / 2) / total
+        k = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * q - 1))
+        novo = np.r_[True, (g[1:] != g[:-1]) | (k[1:] != k[:-1])]
+        ids = np.cumsum(novo) - 1
+        self.weight = np.bincount(ids, weights=w)
+        self.mean = np.bincount(ids, weights=w * m) / self.weight
+        self.group = g[novo]
+
+    def add(self, keys, values):
+        """Incorpora valores agrupados pela chave de cada um (série ou array); NaN é ignorado."""
+        values = np.asarray(values, dtype=np.float64)
+        codes, uniques = pd.factorize(keys)
+        validos = (codes >= 0) & ~np.isnan(values)
+        if validos.any():
+            grupos = self._key_codes(uniques)[codes[validos]]
+            self._compress(np.r_[self.group, grupos], np.r_[self.mean, values[validos]],
+                           np.r_[self.weight, np.ones(len(grupos))])
+        return self
+
+    def merge(self, other):
+        """Combina outro digest (mesma compressão) a este."""
+        if other.compression != self.compression:
+            raise ValueError("t-digests com compressões diferentes não podem ser combinados")
+        if len(other.group):
+            codes = self._key_codes(other.keys)
+            self.min[codes] = np.minimum(self.min[codes], other.min)
+            self.max[codes] = np.maximum(self.max[codes], other.max)
+            self._compress(np.r_[self.group, codes[other.group]], np.r_[self.mean, other.mean],
+                           np.r_[self.weight, other.weight])
+        return self
+
+    def quantiles(self, qs=(0.5, 0.95, 0.99)):
+        """Quantis estimados por chave: DataFrame com a contagem (n) e uma coluna por quantil.
+
+        Cada centróide representa o ponto médio do seu peso; entre eles (e o
+        mínimo e o máximo nas pontas) a estimativa é interpolada linearmente.
+        """
+        g, m, w = self.group, self.mean, self.weight
+        if not len(g):
+            return pd.DataFrame(columns=['n'] + list(qs), index=self.keys[:0])
+        inicio = np.flatnonzero(np.r_[True, g[1:] != g[:-1]])
+        fim = np.r_[inicio[1:], len(g)] - 1
+        tamanhos = fim - inicio + 1
+        acumulado = np.cumsum(w)
+        total = acumulado[fim] - acumulado[inicio] + w[inicio]
+        antes = np.repeat(acumulado[inicio] - w[inicio], tamanhos)
+        pos = (acumulado - antes - w / 2) / np.repeat(total, tamanhos)
+        chave = g + pos  # crescente: chave inteira + posição relativa em (0, 1)
+        grupos = g[inicio]
+        resultado = {'n': total.astype(np.int64)}
+        for q in qs:
+            i = np.searchsorted(chave, grupos + q)
+            esquerda, direita = i > inicio, i <= fim
+            anterior, atual = np.maximum(i - 1, 0), np.minimum(i, len(g) - 1)
+            lp = np.where(esquerda, pos[anterior], 0.0)
+            lv = np.where(esquerda, m[anterior], self.min[grupos])
+            rp = np.where(direita, pos[atual], 1.0)
+            rv = np.where(direita, m[atual], self.max[grupos])
+            fracao = np.where(rp > lp, (q - lp) / np.where(rp > lp, rp - lp, 1.0), 0.0)
+            resultado[q] = lv + (rv - lv) * fracao
+        return pd.DataFrame(resultado, index=self.keys[grupos])
+
+def sketch_frames(frames, columns, masks=None, k=SKETCH_K, p=HLL_PRECISION):
+    """Percorre DataFrames em uma única passada, acumulando sketches por contador.
+
+    columns: nome do contador -> coluna; masks: nome do contador -> função que
+    recebe o lote e devolve a máscara das linhas a contar (ex.: status 404).
+    Retorna {contador: SpaceSaving} e {coluna: HyperLogLog}; ambos podem ser
+    combinados com os de outros arquivos ou processos via merge().
+    """
+    masks = masks or {}
+    heavy = {nome: SpaceSaving(k) for nome in columns}
+    distintos = {coluna: HyperLogLog(p) for coluna in set(columns.values())}
+    # Cada coluna é codificada uma vez por lote; os valores presentes são marcados por código e
+    # hasheados uma só vez, quando os lotes trocam de valores distintos (ex.: outro arquivo) ou ao final
+    vistos = {}
+    for frame in frames:
+        lote = {}
+        for coluna, hll in distintos.items():
+            codes, uniques = lote[coluna] = value_codes(frame[coluna])
+            valores, presentes = vistos.get(coluna, (None, None))
+            if valores is not uniques:
+                if valores is not None:
+                    hll.add_hashes(pd.util.hash_array(valores[presentes].to_numpy(dtype=object)))
+                valores, presentes = uniques, np.zeros(len(uniques), dtype=bool)
+                vistos[coluna] = (valores, presentes)
+            presentes[codes[codes >= 0]] = True
+        for nome, coluna in columns.items():
+            codes, uniques = lote[coluna]
+            if nome in masks:
+                codes = codes[masks[nome](frame)]
+            heavy[nome].update_codes(codes, uniques, coluna)
+    for coluna, (valores, presentes) in vistos.items():
+        distintos[coluna].add_hashes(pd.util.hash_array(valores[presentes].to_numpy(dtype=object)))
+    return heavy, distintos
+
+def iter_row_chunks(df, chunk_rows=SKETCH_CHUNK_ROWS):
+    """Divide um DataFrame em lotes de linhas (visões, sem cópia)."""
+    for inicio in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[inicio:inicio + chunk_rows]
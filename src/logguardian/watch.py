@@ -0,0 +1,222 @@
+import os
+import re
+import sys
+import json
+import time
+import signal
+import calendar
+import datetime
+import functools
+from collections import OrderedDict, deque
+from .normalizer import COLUMNS, parse_line, anonymize_ip_cached
+from .analysis import RESOURCE_RULES, METODOS_INCOMUNS, LIMITE_TAMANHO, PADRAO_RECURSOS_NORMAIS
+
+# --- Configurações do modo watch ---
+POLL_INTERVAL = 0.2    # segundos entre verificações do arquivo quando não há linhas novas
+MAX_KEYS = 100_000     # máximo de IPs/recursos mantidos por janela (os menos recentes são descartados)
+
+# Regras de janela deslizante: nome -> (chave, janela em segundos, limite).
+# Um alerta é emitido quando a chave passa de `limite` eventos dentro da janela.
+WINDOW_RULES = {
+    'ip_alto_volume': ('ip', 1, 10),           # mais de 10 requisições por segundo do mesmo IP
+    'ip_com_muitos_404': ('ip_404', 60, 5),    # mais de 5 erros 404 em um minuto do mesmo IP
+    'recurso_alto_volume': ('recurso', 10, 200),
+}
+
+COMPILED_RESOURCE_RULES = {nome: re.compile(padrao, flags) for nome, (padrao, flags) in RESOURCE_RULES.items()}
+RECURSOS_NORMAIS_RE = re.compile(PADRAO_RECURSOS_NORMAIS)
+
+class SlidingWindowCounter:
+    """Conta eventos por chave em uma janela deslizante de tempo, com memória limitada.
+
+    Cada chave guarda no máximo limit + 1 horários (o suficiente para saber se
+    passou do limite) e no máximo max_keys chaves ficam em memória; chaves sem
+    eventos na janela são descartadas.
+    """
+
+    def __init__(self, window, limit, max_keys=MAX_KEYS):
+        self.window = window
+        self.limit = limit
+        self.max_keys = max_keys
+        self.events = OrderedDict()
+        self.active = set()
+
+    def add(self, key, ts):
+        """Registra um evento; retorna True só quando a chave acaba de passar do limite."""
+        events = self.events.get(key)
+        if events is None:
+            events = self.events[key] = deque(maxlen=self.limit + 1)
+        else:
+            self.events.move_to_end(key)
+        events.append(ts)
+        self.expire(ts)
+        if len(events) <= self.limit or events[0] <= ts - self.window:
+            self.active.discard(key)
+            return False
+        if key in self.active:
+            return False
+        self.active.add(key)
+        return True
+
+    def count(self, key, now):
+        """Eventos da chave dentro da janela (limitado a limit + 1)."""
+        return sum(1 for ts in self.events.get(key, ()) if ts > now - self.window)
+
+    def expire(self, now):
+        """Descarta as chaves sem eventos na janela e as excedentes a max_keys."""
+        while self.events:
+            key, events = next(iter(self.events.items()))
+            if len(self.events) <= self.max_keys and events[-1] > now - self.window:
+                break
+            del self.events[key]
+            self.active.discard(key)
+
+    def __len__(self):
+        return len(self.events)
+
+@functools.lru_cache(maxsize=4096)
+def to_epoch(data1):
+    """Converte 'AAAA-MM-DD HH:MM:SS' em segundos desde a época (o mesmo segundo se repete muito)."""
+    return calendar.timegm(datetime.datetime.strptime(data1, '%Y-%m-%d %H:%M:%S').timetuple())
+
+@functools.lru_cache(maxsize=65536)
+def resource_anomalies(recurso):
+    """Regras que dependem só do recurso (SQLi, XSS, extensões, query string), com cache."""
+    if RECURSOS_NORMAIS_RE.match(recurso):
+        return ()
+    regras = [nome for nome, padrao in COMPILED_RESOURCE_RULES.items() if padrao.search(recurso)]
+    _, sep, query = recurso.rpartition('?')
+    if sep:
+        if len(query) > 100:
+            regras.append('query_string_longa')
+        if query.count('&') > 4:
+            regras.append('muitos_parametros')
+    return tuple(regras)
+
+def follow(path, from_start=False, poll_interval=POLL_INTERVAL):
+    """Segue o arquivo como `tail -F`, gerando as linhas completas novas.
+
+    Sobrevive à rotação (o arquivo é reaberto quando o caminho passa a apontar
+    para outro inode) e ao truncamento (a leitura volta ao início). Linhas
+    ainda sem quebra de linha ficam guardadas até serem completadas.
+    """
+    f, inode, pendente = None, None, b""
+    try:
+        while True:
+            if f is None:
+                try:
+                    f = open(path, 'rb')
+                except FileNotFoundError:
+                    time.sleep(poll_interval)
+                    continue
+                stat = os.fstat(f.fileno())
+                inode = (stat.st_dev, stat.st_ino)
+                if not from_start:
+                    f.seek(0, os.SEEK_END)
+                from_start = True  # arquivos que surgirem após uma rotação são lidos desde o início
+
+            linha = f.readline()
+            if linha:
+                pendente += linha
+                if pendente.endswith(b"\n"):
+                    yield pendente.decode('utf-8', errors='replace')
+                    pendente = b""
+                continue
+
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                stat = None
+            if stat is not None and (stat.st_dev, stat.st_ino) != inode:
+                # Rotação: o restante do arquivo antigo já foi lido; passa para o novo
+                f.close()
+                f, pendente = None, b""
+                continue
+            if stat is not None and stat.st_size < f.tell():
+                print(f"Arquivo {path} truncado; relendo do início.", file=sys.stderr)
+                f.seek(0)
+                pendente = b""
+                continue
+            time.sleep(poll_interval)
+    finally:
+        if f is not None:
+            f.close()
+
+class LogWatcher:
+    """Aplica as regras de anomalia linha a linha, com contadores em janelas deslizantes."""
+
+    def __init__(self, window_rules=None, max_keys=MAX_KEYS):
+        self.window_rules = WINDOW_RULES if window_rules is None else window_rules
+        self.counters = {nome: SlidingWindowCounter(janela, limite, max_keys)
+                         for nome, (_, janela, limite) in self.window_rules.items()}
+        self.linhas = 0
+        self.ignoradas = 0
+        self.alertas = 0
+
+    def process_line(self, line):
+        """Processa uma linha de log e retorna a lista de alertas gerados por ela."""
+        self.linhas += 1
+        campos = parse_line(line)
+        if campos is None:
+            self.ignoradas += 1
+            return []
+        # Só as colunas básicas; os campos do Traefik (TRAEFIK_COLUMNS) vêm depois
+        data1, _, ip, status, metodo, recurso, tamanho = campos[:len(COLUMNS)]
+        ip = anonymize_ip_cached(ip)
+        status = 404 if status.strip() in ('', '-') else int(status)
+        tamanho = int(tamanho) if tamanho else 0
+        ts = to_epoch(data1)
+
+        evento = {"data": data1, "ip": ip, "metodo": metodo, "recurso": recurso, "status": status}
+        alertas = []
+        regras = list(resource_anomalies(recurso))
+        if metodo in METODOS_INCOMUNS:
+            regras.append('metodo_incomum')
+        if tamanho > LIMITE_TAMANHO:
+            regras.append('tamanho_resposta_suspeito')
+        for regra in regras:
+            alertas.append(dict(evento, regra=regra))
+
+        chaves = {'ip': ip, 'recurso': recurso, 'ip_404': ip if status == 404 else None}
+        for nome, (chave, janela, limite) in self.window_rules.items():
+            valor = chaves[chave]
+            if valor is not None and self.counters[nome].add(valor, ts):
+                alertas.append(dict(evento, regra=nome, janela_s=janela, limite=limite))
+
+        self.alertas += len(alertas)
+        return alertas
+
+    def memory_keys(self):
+        """Total de chaves mantidas nas janelas (limitado por max_keys por regra)."""
+        return sum(len(counter) for counter in self.counters.values())
+
+def format_alert(alerta):
+    """Formata um alerta como uma linha de texto legível."""
+    janela = f" (> {alerta['limite']} em {alerta['janela_s']}s)" if 'janela_s' in alerta else ""
+    return (f"[ALERTA] {alerta['data']} {alerta['regra']}{janela}: ip={alerta['ip']} "
+            f"{alerta['metodo']} {alerta['recurso']} status={alerta['status']}")
+
+def watch_log(path, json_lines=False, output=None, from_start=False, poll_interval=POLL_INTERVAL):
+    """Segue um log do Traefik e emite alertas de anomalia à medida que as linhas chegam.
+
+    Os alertas vão para stdout (ou para `output`, em modo append), como texto
+    ou como JSON lines. Encerra com Ctrl+C, exibindo um resumo.
+    """
+    watcher = LogWatcher()
+    destino = open(output, 'a', encoding='utf-8') if output else sys.stdout
+    # SIGTERM (ex.: systemd, timeout) encerra como o Ctrl+C, passando pelo resumo final
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"Acompanhando {path} (Ctrl+C para encerrar)...", file=sys.stderr)
+    try:
+        for line in follow(path, from_start=from_start, poll_interval=poll_interval):
+            for alerta in watcher.process_line(line):
+                destino.write((json.dumps(alerta, ensure_ascii=False) if json_lines else format_alert(alerta)) + "\n")
+            destino.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if output:
+            destino.close()
+        print(f"\nLinhas lidas: {watcher.linhas:,} ({watcher.ignoradas:,} fora do formato); "
+              f"alertas: {watcher.alertas:,}; chaves em memória: {watcher.memory_keys():,}", file=sys.stderr)
+    return watcher
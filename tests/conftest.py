@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+def make_log_frame(n, seed, inicio='2024-01-01', dias=1, ips=50, status=(200, 404, 429), metodos=('GET',),
+                   recursos=300, recurso="/r/{}", zipf=False, tamanhos=None):
+    """DataFrame normalizado sintético com n linhas espalhadas por `dias` dias a partir de inicio.
+
+    Os recursos seguem o modelo recurso, com até `recursos` valores distintos
+    (de frequência bem desigual, com zipf); tamanho é 1.0 ou, com tamanhos,
+    um inteiro aleatório em [0, tamanhos).
+    """
+    rng = np.random.default_rng(seed)
+    data1 = pd.Timestamp(inicio) + pd.to_timedelta(rng.integers(0, dias * 86400, n), unit='s')
+    indices = rng.zipf(1.5, n) % recursos if zipf else rng.integers(0, recursos, n)
+    return pd.DataFrame({
+        'data1': data1,
+        'data2': data1.strftime('%Y-%m-%d'),
+        'ip': [f"10.0.{i}.0" for i in rng.integers(0, ips, n)],
+        'status': rng.choice(status, n),
+        'metodo': rng.choice(metodos, n),
+        'recurso': [recurso.format(i) for i in indices],
+        'tamanho': rng.integers(0, tamanhos, n).astype(float) if tamanhos else 1.0,
+    })
+
+@pytest.fixture
+def log_frame():
+    """Fábrica de DataFrames normalizados sintéticos (ver make_log_frame)."""
+    return make_log_frame
@@ -0,0 +1,33 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+import logguardian
+
+# Orçamento de `import logguardian.cli` (loguard -h), em microssegundos: folgado o bastante para máquinas
+# de CI lentas (o import leva poucos ms) e ajustável por LOGGUARD_IMPORT_BUDGET_US (0 só relata o tempo)
+IMPORT_BUDGET_US = int(os.environ.get("LOGGUARD_IMPORT_BUDGET_US", 200_000))
+HEAVY_MODULES = ["pandas", "matplotlib", "seaborn", "requests"]
+
+def import_cli():
+    """Importa logguardian.cli em um processo novo com -X importtime; devolve (µs acumulados, módulos pesados)."""
+    codigo = f"import sys, logguardian.cli; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(list(logguardian.__path__)[0]))
+    resultado = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo],
+                               capture_output=True, text=True, env=env, check=True)
+    acumulado = re.search(r"^import time:\s+\d+ \|\s+(\d+) \| logguardian\.cli$", resultado.stderr, re.M)
+    return int(acumulado.group(1)), resultado.stdout.strip()
+
+def test_import_da_cli_sem_dependencias_pesadas():
+    _, pesados = import_cli()
+    assert pesados == "", pesados
+
+def test_import_da_cli_rapido():
+    # O melhor de 3 evita falsos alarmes por ruído da máquina
+    tempo = min(import_cli()[0] for _ in range(3))
+    if not IMPORT_BUDGET_US:
+        pytest.skip(f"orçamento desativado; import em {tempo / 1000:.1f} ms")
+    assert tempo < IMPORT_BUDGET_US, tempo
@@ -0,0 +1,102 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from logguardian import geolocation
+from logguardian.geolocation import ERROR_RESULT, RateLimiter, resolve_ips
+
+class StubBatchAPI(BaseHTTPRequestHandler):
+    """Endpoint em lote no formato do ip-api.com; IPs terminados em .255 falham."""
+
+    def do_POST(self):
+        servidor = self.server
+        ips = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with servidor.lock:
+            servidor.lotes.append(ips)
+            falhar = servidor.falhas > 0
+            servidor.falhas -= falhar
+        if falhar:
+            self.send_response(500)
+            self.end_headers()
+            return
+        corpo = json.dumps([
+            {"status": "fail", "message": "reserved range", "query": ip} if ip.endswith(".255") else
+            {"status": "success", "country": "Brasil", "regionName": "Ceará", "city": f"Cidade {ip}", "query": ip}
+            for ip in ips]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def api():
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), StubBatchAPI)
+    servidor.lotes, servidor.falhas, servidor.lock = [], 0, threading.Lock()
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    servidor.url = f"http://127.0.0.1:{servidor.server_address[1]}/batch"
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+@pytest.fixture
+def resolver(api, tmp_path, monkeypatch):
+    monkeypatch.setattr(geolocation, "RETRY_DELAY", 0)
+    monkeypatch.chdir(tmp_path)  # sem o cache JSON antigo de ./output
+    cache = str(tmp_path / "geo.sqlite")
+    return lambda ips: resolve_ips(ips, cache_file=cache, batch_url=api.url,
+                                   limiter=RateLimiter(rate=1000, period=1), max_workers=4)
+
+IPS = [f"10.0.{i // 250}.{i % 250}" for i in range(250)]
+
+def test_lotes_e_cache(api, resolver):
+    locations = resolver(IPS)
+    assert sorted(len(lote) for lote in api.lotes) == [50, 100, 100]
+    assert locations["10.0.0.7"] == {"country": "Brasil", "region": "Ceará", "city": "Cidade 10.0.0.7"}
+    assert list(locations) == IPS
+
+    # Tudo já está no cache: nenhuma nova requisição
+    assert resolver(IPS + IPS[:10]) == locations
+    assert len(api.lotes) == 3
+
+def test_erros_expiram_pelo_ttl_negativo(api, resolver, monkeypatch):
+    ips = ["10.1.0.1", "10.1.0.255"]
+    assert resolver(ips)["10.1.0.255"] == ERROR_RESULT
+    assert resolver(ips)["10.1.0.1"]["country"] == "Brasil"
+    assert len(api.lotes) == 1
+
+    # Com o prazo dos erros vencido, só o IP com erro é consultado de novo
+    monkeypatch.setattr(geolocation, "NEGATIVE_TTL", -1)
+    resolver(ips)
+    assert api.lotes[1:] == [["10.1.0.255"]]
+
+def test_tenta_de_novo_apos_http_500(api, resolver):
+    api.falhas = 1
+    locations = resolver(["10.2.0.1"])
+    assert locations["10.2.0.1"]["city"] == "Cidade 10.2.0.1"
+    assert api.lotes == [["10.2.0.1"], ["10.2.0.1"]]
+
+def test_falhas_esgotadas_viram_erro(api, resolver):
+    api.falhas = geolocation.MAX_RETRIES
+    assert resolver(["10.3.0.1"])["10.3.0.1"] == ERROR_RESULT
+
+def test_uma_sessao_por_thread(api, resolver, monkeypatch):
+    usos = {}
+
+    class SessaoRegistrada(requests.Session):
+        def post(self, *args, **kwargs):
+            usos.setdefault(id(self), set()).add(threading.get_ident())
+            return super().post(*args, **kwargs)
+
+    monkeypatch.setattr(requests, "Session", SessaoRegistrada)
+    resolver([f"10.4.{i // 250}.{i % 250}" for i in range(1_000)])
+    assert len(api.lotes) == 10
+    assert 1 <= len(usos) <= 4
+    assert all(len(threads) == 1 for threads in usos.values())
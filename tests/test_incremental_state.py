@@ -0,0 +1,20 @@
+import pandas as pd
+
+from logguardian.analysis import (ORDERED_COUNTERS, SORTED_COUNTERS, WEEKDAY_COUNTERS, batch_state,
+                                  count_by_weekday, load_data, merge_states)
+
+# Dois dias de acessos, com poucos IPs e recursos
+DOIS_DIAS = dict(dias=2, ips=20, status=(200, 404), metodos=('GET', 'POST'), recursos=30)
+
+def test_contagem_por_dia_semana_inteira_com_dias_ausentes(log_frame):
+    contagem = count_by_weekday(load_data(log_frame(100, 1, '2024-01-01', **DOIS_DIAS)))
+    assert contagem.dtype == 'int64'
+    assert len(contagem) == 7 and (contagem.iloc[2:] == 0).all()
+
+def test_estado_somado_igual_ao_recalculo(log_frame):
+    lotes = [log_frame(500, 2, '2024-01-01', **DOIS_DIAS), log_frame(300, 3, '2024-01-05', **DOIS_DIAS)]
+    somado = merge_states(batch_state(load_data(lotes[0].copy())), batch_state(load_data(lotes[1].copy())))
+    completo = batch_state(load_data(pd.concat(lotes, ignore_index=True)))
+    for key in WEEKDAY_COUNTERS + SORTED_COUNTERS + ORDERED_COUNTERS:
+        pd.testing.assert_series_equal(somado[key], completo[key], check_names=False, check_index_type=False)
+    assert somado['total_registros'] == completo['total_registros']
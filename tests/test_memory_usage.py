@@ -0,0 +1,18 @@
+from logguardian.analysis import legacy_layout, load_data, memory_comparison, memory_usage_mb
+
+# Um mês de acessos, com recursos com query string e tamanhos variados
+UM_MES = dict(dias=30, ips=200, status=(200, 404), recursos=2_000, recurso="/pagina/{0}?id={0}", tamanhos=5_000)
+
+def test_layout_anterior_com_textos_object_e_nomes(log_frame):
+    legado = legacy_layout(load_data(log_frame(50, 0, **UM_MES)))
+    assert 'hora' not in legado.columns
+    assert all(legado[col].dtype == object for col in ['data2', 'ip', 'metodo', 'recurso', 'dia_semana', 'mes'])
+    assert set(legado['dia_semana']) <= {"Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"}
+
+def test_estimativa_por_amostra_proxima_da_medida(log_frame):
+    df = load_data(log_frame(20_000, 0, **UM_MES))
+    memoria = memory_comparison(df, sample_rows=2_000)
+    medida = memory_usage_mb(legacy_layout(df))
+    assert memoria['linhas_amostra'] == 2_000
+    assert abs(memoria['memoria_layout_anterior_mb'] - medida) <= 0.05 * medida
+    assert memoria['memoria_tipada_mb'] < memoria['memoria_layout_anterior_mb']
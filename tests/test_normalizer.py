@@ -0,0 +1,268 @@
+import bz2
+import datetime
+import gzip
+import json
+import lzma
+import os
+import re
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pytest
+from anonymizeip import anonymize_ip
+
+from logguardian import normalizer
+from logguardian.normalizer import (COLUMNS, _write_partitions, anonymize_ip_cached, anonymize_ips, build_frame,
+                                    detect_log_format, iter_blocks, iter_chunks, load_manifest, normalize_log,
+                                    parse_block, parse_json_block, parse_line, parse_timestamp, read_partitioned,
+                                    split_ranges)
+
+MESES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+def traefik_line(ip, dia, segundo, metodo='GET', recurso='/', status='200', tamanho='512', fuso='-0300'):
+    """Linha CLF do Traefik com os campos do roteador, backend e duração."""
+    horario = f"{segundo // 3600:02d}:{segundo // 60 % 60:02d}:{segundo % 60:02d}"
+    return (f'{ip} - - [{dia}:{horario} {fuso}] "{metodo} {recurso} HTTP/1.1" {status} {tamanho} '
+            f'"-" "curl/8.0" {segundo} "router-{segundo % 3}@docker" "http://10.9.0.{segundo % 4}:80" '
+            f'{segundo % 900}ms')
+
+def traefik_log(path, n, seed=0, invalidas=()):
+    """Grava um log CLF sintético com n linhas (e as linhas inválidas dadas, intercaladas)."""
+    rng = np.random.default_rng(seed)
+    linhas = [traefik_line(f"10.{a}.{b}.{c}", f"{d:02d}/{MESES[m]}/2023", s,
+                           metodo=metodo, recurso=f"/api/{r}?id={r * 7}", status=status, tamanho=tamanho)
+              for a, b, c, d, m, s, metodo, r, status, tamanho in zip(
+                  rng.integers(0, 4, n), rng.integers(0, 256, n), rng.integers(0, 256, n),
+                  rng.integers(1, 29, n), rng.integers(0, 12, n), rng.integers(0, 86400, n),
+                  rng.choice(['GET', 'POST', 'DELETE'], n), rng.integers(0, 500, n),
+                  rng.choice(['200', '404', '429', '500', '-'], n), rng.choice(['512', '0', '-'], n))]
+    for i, linha in enumerate(invalidas):
+        linhas.insert((i * 7919) % (len(linhas) + 1), linha)
+    path.write_text("\n".join(linhas) + "\n")
+    return str(path)
+
+def test_lotes_identicos_ao_modo_serial(tmp_path):
+    log = traefik_log(tmp_path / "access.log", 5_000, seed=1)
+    serial = normalize_log(log, str(tmp_path / "serial.csv"))
+    lotes = normalize_log(log, str(tmp_path / "lotes.csv"), chunk_size=777)
+    assert open(lotes, 'rb').read() == open(serial, 'rb').read()
+
+def test_intervalos_alinhados_a_linhas(tmp_path):
+    log = traefik_log(tmp_path / "access.log", 2_000, seed=2)
+    dados = open(log, 'rb').read()
+    intervalos = split_ranges(log, 3)
+    assert len(intervalos) == 3 and intervalos[0][0] == 0 and intervalos[-1][1] == len(dados)
+    for (_, fim), (inicio, _) in zip(intervalos, intervalos[1:]):
+        assert fim == inicio and dados[fim - 1:fim] == b"\n"
+
+def test_processos_identicos_ao_modo_serial(tmp_path):
+    log = traefik_log(tmp_path / "access.log", 5_000, seed=3)
+    for saida in ("saida.csv", "saida.parquet"):
+        serial = normalize_log(log, str(tmp_path / f"serial-{saida}"))
+        paralelo = normalize_log(log, str(tmp_path / f"paralelo-{saida}"), chunk_size=777, workers=3)
+        if saida.endswith(".csv"):
+            assert open(paralelo, 'rb').read() == open(serial, 'rb').read()
+        else:
+            pd.testing.assert_frame_equal(pd.read_parquet(paralelo), pd.read_parquet(serial))
+    assert not [f for f in os.listdir(tmp_path) if f.startswith(".loguard-part-")]
+
+def test_timestamp_igual_ao_strptime():
+    rng = np.random.default_rng(4)
+    inicio = datetime.datetime(2020, 1, 1)
+    for segundos, minutos in zip(rng.integers(0, 5 * 365 * 86400, 20_000), rng.integers(-14 * 60, 14 * 60, 20_000)):
+        dt = inicio + datetime.timedelta(seconds=int(segundos))
+        raw = dt.strftime('%d/%b/%Y:%H:%M:%S')
+        fuso = f" {'-' if minutos < 0 else '+'}{abs(minutos) // 60:02d}{abs(minutos) % 60:02d}"
+        assert parse_timestamp(raw) == (dt.strftime('%Y-%m-%d %H:%M:%S'), dt.strftime('%Y-%m-%d'))
+        utc = datetime.datetime.strptime(raw + fuso, '%d/%b/%Y:%H:%M:%S %z').astimezone(datetime.timezone.utc)
+        assert parse_timestamp(raw, fuso) == (utc.strftime('%Y-%m-%d %H:%M:%S'), utc.strftime('%Y-%m-%d'))
+
+@pytest.mark.parametrize("raw", ["31/Feb/2023:10:00:00", "10/Xyz/2023:10:00:00", "10/Oct/2023:24:00:00",
+                                 "10/Oct/2023:10:60:00", "10/Oct/2023:10:00:6x", "10/Oct/2023 10:00:00"])
+def test_timestamp_invalido(raw):
+    with pytest.raises(ValueError):
+        parse_timestamp(raw)
+
+def anonymize_ip_reference(address):
+    """anonymize_ip da biblioteca, com '0.0.0.0' para endereços que ela recusa."""
+    try:
+        return anonymize_ip(address)
+    except Exception:
+        return "0.0.0.0"
+
+def test_cache_de_ips_igual_a_biblioteca():
+    rng = np.random.default_rng(5)
+    ips = [".".join(map(str, octetos)) for octetos in rng.integers(0, 256, (100_000, 4))]
+    ips += ["010.001.002.003", "1.2.3.04", "00.0.0.0", "256.1.1.1", "1.2.3", "1.2.3.4.5", "a.b.c.d", "", " 1.2.3.4",
+            "1.2.3.4 ", "::1", "2001:db8::1", "2001:0db8:85a3:0000:0000:8a2e:0370:7334", "::ffff:1.2.3.4", "-"]
+    esperado = [anonymize_ip_reference(ip) for ip in ips]
+    assert [anonymize_ip_cached(ip) for ip in ips] == esperado
+    assert list(anonymize_ips(ips)) == esperado
+
+# Uma linha para cada motivo de rejeição do CLF
+REJEITADAS = {
+    'linha_vazia': '   ',
+    'ip_invalido': '::1 - - [10/Oct/2023:13:55:36 +0000] "GET /k HTTP/1.1" 200 7 "-" "ua"',
+    'usuario_invalido': '1.2.3.4 user - [10/Oct/2023:13:55:36 +0000] "GET /h HTTP/1.1" 200 7',
+    'timestamp_invalido': '1.2.3.4 - - [10/Xyz/2023:13:55:36 +0000] "GET /i HTTP/1.1" 200 7 "-" "ua"',
+    'requisicao_invalida': '1.2.3.4 - - [10/Oct/2023:13:55:36 +0000] "-" 400 0 "-" "-"',
+    'status_invalido': '1.2.3.4 - - [10/Oct/2023:13:55:36 +0000] "GET /s HTTP/1.1" abc 7',
+    'tamanho_invalido': '1.2.3.4 - - [10/Oct/2023:13:55:36 +0000] "GET /t HTTP/1.1" 200 abc',
+    'linha_longa_malformada': 'x' * 10_000,
+}
+
+def test_caminho_rapido_igual_ao_ufw_re(monkeypatch):
+    rng = np.random.default_rng(6)
+    linhas = [traefik_line(f"10.0.{i % 256}.{i % 7}", "05/Mar/2023", int(s), metodo=metodo,
+                           recurso=f"/api/{i}?q=a%20b&id={i}", status=status, tamanho=str(i))
+              for i, s, metodo, status in zip(range(2_000), rng.integers(0, 86400, 2_000),
+                                              rng.choice(['GET', 'POST', 'HEAD'], 2_000),
+                                              rng.choice(['200', '404', '429'], 2_000))]
+    for utc in (False, True):
+        rapido = [parse_line(linha, utc) for linha in linhas]
+        with monkeypatch.context() as m:
+            m.setattr(normalizer, "LINE_PATTERN", re.compile(r'(?!)'))
+            assert [parse_line(linha, utc) for linha in linhas] == rapido
+    assert all(row[7] == row[13] % 900 and row[8].startswith('router-') and row[11] == 'curl/8.0' for row in rapido)
+
+def test_aspas_no_recurso_usam_o_fallback():
+    linha = '1.2.3.4 - - [10/Oct/2023:13:55:36 -0300] "GET /q?x=" onmouseover=alert(1) HTTP/1.1" 404 0 "-" "ua"'
+    assert normalizer.LINE_PATTERN.match(linha) is None
+    assert parse_line(linha)[:7] == ['2023-10-10 13:55:36', '2023-10-10', '1.2.3.4', '404', 'GET',
+                                     '/q?x=" onmouseover=alert(1) ', '0']
+
+@pytest.mark.parametrize("motivo", sorted(REJEITADAS))
+def test_motivo_de_rejeicao(motivo):
+    rejects = Counter()
+    assert parse_line(REJEITADAS[motivo], rejects=rejects) is None
+    assert rejects == {motivo: 1}
+
+def test_rejeitadas_contadas_na_leitura(tmp_path):
+    log = traefik_log(tmp_path / "access.log", 3_000, seed=7, invalidas=list(REJEITADAS.values()) * 3)
+    rejects = Counter()
+    linhas = sum(len(df) for df in iter_chunks(log, 500, rejects=rejects))
+    assert linhas == 3_000
+    assert rejects == {motivo: 3 for motivo in REJEITADAS}
+
+def test_blocos_de_bytes_iguais_a_leitura_por_linha(tmp_path):
+    log = traefik_log(tmp_path / "access.log", 3_000, seed=8, invalidas=list(REJEITADAS.values()))
+    dados = open(log, 'rb').read()
+    blocos = [buf[inicio:fim] for buf, inicio, fim in iter_blocks(log, block_size=4096)]
+    assert len(blocos) > 1 and b"".join(blocos) == dados
+
+    por_bloco, por_linha = Counter(), Counter()
+    linhas = [parse_line(linha, True, por_linha) for linha in dados.decode().splitlines()]
+    assert parse_block(dados, 0, len(dados), True, por_bloco) == [row for row in linhas if row]
+    assert por_bloco == por_linha
+
+def test_utf8_invalido_vira_escape(tmp_path):
+    log = tmp_path / "access.log"
+    log.write_bytes(traefik_line("1.2.3.4", "10/Oct/2023", 60, recurso="/caf\xe9").encode('latin-1') + b"\n" +
+                    b'1.2.3.4 - - [10/Oct/2023:00:01:00 +0000] "GET /q?x=\xff" HTTP/1.1" 200 1 "-" "ua"\n')
+    df = next(iter_chunks(str(log)))
+    assert list(df['recurso']) == ['/caf\\xe9 ', '/q?x=\\xff" ']
+
+@pytest.mark.parametrize("extensao, compressor", [(".gz", gzip), (".bz2", bz2), (".xz", lzma)])
+def test_logs_comprimidos_iguais_ao_original(tmp_path, extensao, compressor):
+    log = traefik_log(tmp_path / "access.log", 3_000, seed=9, invalidas=list(REJEITADAS.values()))
+    comprimido = tmp_path / f"access.log{extensao}"
+    comprimido.write_bytes(compressor.compress(open(log, 'rb').read()))
+    original = normalize_log(log, str(tmp_path / "original.csv"))
+    assert open(normalize_log(str(comprimido), str(tmp_path / "comprimido.csv"), chunk_size=500), 'rb').read() == \
+        open(original, 'rb').read()
+
+def traefik_json(row):
+    """Entrada do log JSON do Traefik equivalente a uma linha CLF já extraída por parse_line."""
+    data1, _, ip, status, metodo, recurso, tamanho, duracao, roteador, _, _, agente, backend, numero = row
+    entrada = {"ClientHost": ip, "DownstreamStatus": int(status), "RequestMethod": metodo,
+               "RequestPath": recurso[:-1], "StartLocal": data1.replace(' ', 'T') + ".123456789-03:00",
+               "StartUTC": data1.replace(' ', 'T') + "Z", "Duration": duracao * 1_000_000, "RouterName": roteador,
+               "ServiceName": "api@docker", "RequestHost": "exemplo.com", "request_User-Agent": agente,
+               "ServiceURL": backend, "RequestCount": numero}
+    if tamanho:
+        entrada["DownstreamContentSize"] = int(tamanho)
+    return entrada
+
+def test_log_json_igual_ao_clf(tmp_path):
+    log = traefik_log(tmp_path / "access.log", 2_000, seed=10)
+    rows = [parse_line(linha) for linha in open(log)]
+    log_json = tmp_path / "access.jsonl"
+    log_json.write_text("".join(json.dumps(traefik_json(row)) + "\n" for row in rows if row[3] != '-'))
+    assert detect_log_format(str(log_json)) == 'json'
+
+    clf = pd.read_parquet(normalize_log(log, str(tmp_path / "clf.parquet")))
+    clf = clf[clf['status'] != 404].reset_index(drop=True)
+    json_df = pd.read_parquet(normalize_log(str(log_json), str(tmp_path / "json.parquet"), chunk_size=300))
+    json_df = json_df[json_df['status'] != 404].reset_index(drop=True)
+    colunas = COLUMNS + ['duracao_ms', 'roteador', 'user_agent', 'backend', 'num_requisicao']
+    pd.testing.assert_frame_equal(json_df[colunas], clf[colunas], check_categorical=False)
+    assert (json_df['servico'] == "api@docker").all() and (json_df['host'] == "exemplo.com").all()
+
+def test_motivos_de_rejeicao_json():
+    valida = traefik_json(parse_line(traefik_line("1.2.3.4", "10/Oct/2023", 60)))
+    linhas = [json.dumps(valida), "", "{nao e json", "[1, 2]", json.dumps({"ClientHost": "1.2.3.4"}),
+              json.dumps({**valida, "StartLocal": "2023-10-10T25:00:00-03:00"}),
+              json.dumps({**valida, "RequestPath": None})]
+    dados = "\n".join(linhas).encode()
+    rejects = Counter()
+    assert len(parse_json_block(dados, 0, len(dados), rejects=rejects)) == 1
+    assert rejects == {'linha_vazia': 1, 'json_invalido': 2, 'campo_ausente': 1, 'timestamp_invalido': 1,
+                       'campo_invalido': 1}
+
+def test_falha_na_gravacao_das_particoes_remove_temporarios(tmp_path, monkeypatch):
+    abrir = normalizer._open_arrow_writer
+
+    class GravadorComFalha:
+        """Gravador que falha ao fechar, depois de fechar o arquivo de verdade."""
+        def __init__(self, writer):
+            self.writer = writer
+        def write_table(self, table):
+            self.writer.write_table(table)
+        def close(self):
+            self.writer.close()
+            raise OSError("disco cheio")
+
+    def lotes():
+        yield build_frame([parse_line(traefik_line("1.2.3.4", f"{dia:02d}/Oct/2023", 60)) for dia in (1, 2)])
+        raise RuntimeError("log truncado")
+
+    def abrir_com_falha(*args):
+        schema, writer = abrir(*args)
+        return schema, GravadorComFalha(writer)
+
+    monkeypatch.setattr(normalizer, "_open_arrow_writer", abrir_com_falha)
+    with pytest.raises(RuntimeError, match="log truncado"):
+        _write_partitions(lotes(), str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+def test_dia_dividido_em_dois_logs_e_juntado(tmp_path):
+    linhas = [traefik_line(f"10.0.0.{i % 200}", "10/Oct/2023", i * 17) for i in range(5_000)]
+    (tmp_path / "manha.log").write_text("\n".join(linhas[:2_500]) + "\n")
+    (tmp_path / "tarde.log").write_text("\n".join(linhas[2_500:]) + "\n")
+    (tmp_path / "tudo.log").write_text("\n".join(linhas) + "\n")
+    dataset = str(tmp_path / "dataset")
+    esperado = read_partitioned(normalize_log(str(tmp_path / "tudo.log"), str(tmp_path / "tudo"), partitioned=True))
+
+    # Em qualquer ordem, a segunda metade é juntada à partição, não a substitui
+    for primeiro, segundo, workers in (("manha", "tarde", 1), ("tarde", "manha", 2)):
+        normalize_log(str(tmp_path / f"{primeiro}.log"), dataset, partitioned=True, replace=True)
+        normalize_log(str(tmp_path / f"{segundo}.log"), dataset, partitioned=True, workers=workers)
+        pd.testing.assert_frame_equal(read_partitioned(dataset), esperado)
+        assert load_manifest(dataset)["particoes"] == load_manifest(str(tmp_path / "tudo"))["particoes"]
+
+def test_horarios_sobrepostos_exigem_replace(tmp_path):
+    log = tmp_path / "access.log"
+    log.write_text("".join(traefik_line("10.0.0.1", f"{i % 3 + 10}/Oct/2023", i * 50) + "\n" for i in range(1_000)))
+    log = str(log)
+    dataset = normalize_log(log, str(tmp_path / "dataset"), partitioned=True)
+    antes = read_partitioned(dataset)
+    manifesto = load_manifest(dataset)
+
+    with pytest.raises(ValueError, match="--replace"):
+        normalize_log(log, dataset, partitioned=True)
+    assert load_manifest(dataset) == manifesto
+    assert not [f for f in os.listdir(dataset) if f.startswith(".loguard-")]
+
+    normalize_log(log, dataset, partitioned=True, replace=True)
+    pd.testing.assert_frame_equal(read_partitioned(dataset), antes)
@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+
+import logguardian
+from logguardian import profiling
+from logguardian.profiling import Profiler, format_profile
+
+def test_importa_sem_o_modulo_resource():
+    # sys.modules['resource'] = None faz `import resource` falhar, como no Windows
+    codigo = "import sys; sys.modules['resource'] = None; import logguardian.normalizer, logguardian.cli"
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(list(logguardian.__path__)[0]))
+    subprocess.run([sys.executable, "-c", codigo], env=env, check=True)
+
+def test_perfil_sem_medida_de_memoria(monkeypatch):
+    def sem_proc(*args, **kwargs):
+        raise OSError("sem /proc")
+
+    monkeypatch.setattr(profiling, "resource", None)
+    monkeypatch.setattr(profiling, "open", sem_proc, raising=False)
+    assert profiling.peak_rss_mb() is None and profiling.children_cpu_s() == 0
+
+    perfil = Profiler()
+    with perfil.stage("externo", rows=10):
+        with perfil.stage("interno"):
+            pass
+    resumo = perfil.summary()
+    assert [r["rss_pico_mb"] for r in resumo["estagios"]] == [None, None]
+    assert resumo["total"]["rss_pico_mb"] is None
+    tabela = format_profile(resumo)
+    assert tabela.count("n/d") == 3
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from logguardian.analysis import map_per_resource, query_string_flags
+
+RECURSOS = [
+    "/main/",                                   # sem '?'
+    "/busca?q=1",
+    "/a?b?c=1&d=2",                             # vários '?': vale o último
+    "/x?" + "a" * 100,                          # query com 100 caracteres
+    "/x?" + "a" * 101,                          # query com 101 caracteres
+    "/p?a=1&b=2&c=3&d=4&e=5",                   # 4 '&'
+    "/p?a=1&b=2&c=3&d=4&e=5&f=6",               # 5 '&'
+    "/q?" + "&" * 5 + "?" + "x" * 101,          # vários '?', só o último trecho conta
+    "/vazio?",
+]
+
+def query_longa_antiga(recursos):
+    """Versão anterior (apply linha a linha) da regra de query string longa."""
+    return recursos.astype(str).apply(lambda x: len(x.split('?')[-1]) > 100 if '?' in x else False).to_numpy()
+
+def muitos_parametros_antiga(recursos):
+    """Versão anterior (apply linha a linha) da regra de muitos parâmetros."""
+    return recursos.astype(str).apply(lambda x: len(x.split('?')[-1].split('&')) > 5 if '?' in x else False).to_numpy()
+
+@pytest.mark.parametrize("dtype", [object, 'category'])
+def test_query_string_flags_igual_ao_apply(dtype):
+    recursos = pd.Series(RECURSOS * 3, dtype=dtype)
+    flags = map_per_resource(recursos, query_string_flags)
+    np.testing.assert_array_equal(flags[:, 0].astype(bool), query_longa_antiga(recursos))
+    np.testing.assert_array_equal(flags[:, 1].astype(bool), muitos_parametros_antiga(recursos))
+    # Casos de borda: 100 x 101 caracteres e 4 x 5 '&'
+    assert list(flags[3:7, 0]) == [False, True, False, False]
+    assert list(flags[3:7, 1]) == [False, False, False, True]
+
+@pytest.mark.parametrize("dtype", [object, 'category'])
+def test_comprimento_url_igual_ao_anterior(dtype):
+    recursos = pd.Series(RECURSOS * 2, dtype=dtype)
+    comprimento = map_per_resource(recursos, lambda r: r.str.len())
+    np.testing.assert_array_equal(comprimento.astype(int), recursos.astype(str).str.len().to_numpy())
+
+def test_recurso_ausente_nao_marca_query():
+    recursos = pd.Series(pd.Categorical(["/x?" + "a" * 101, None]))
+    flags = map_per_resource(recursos, query_string_flags)
+    assert list(flags[:, 0]) == [True, False] and list(flags[:, 1]) == [False, False]
+    assert np.isnan(map_per_resource(recursos, lambda r: r.str.len())[1])
@@ -0,0 +1,18 @@
+from logguardian.report_generator import PENDING_PLOT_NOTE, export_to_markdown, mark_plots_rendered
+
+def test_graficos_adiados_marcados_ate_serem_gerados(tmp_path):
+    relatorio = str(tmp_path / "analysis_report.md")
+    resultados = {
+        'status_codes': {'contagem_status': {200: 10, 404: 2}, 'plot_path': "./output/plots/status_distribution.png"},
+        'time_patterns': {'pico_requisicoes_hora': 10, 'pico_requisicoes_dia': "Monday",
+                          'plot_path_hora': "./output/plots/requests_per_hour.png"},
+        'graficos_pendentes': True,
+    }
+    assert export_to_markdown(resultados, relatorio)
+    texto = open(relatorio, encoding='utf-8').read()
+    assert "(./plots/status_distribution.png)\n\n" + PENDING_PLOT_NOTE in texto
+    assert "(./plots/requests_per_hour.png)\n\n" + PENDING_PLOT_NOTE in texto
+
+    mark_plots_rendered(relatorio, {"./output/plots/status_distribution.png"})
+    texto = open(relatorio, encoding='utf-8').read()
+    assert texto.count(PENDING_PLOT_NOTE) == 1 and "(./plots/requests_per_hour.png)\n\n" + PENDING_PLOT_NOTE in texto
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from logguardian import analysis
+from logguardian.analysis import RESOURCE_RULES, evaluate_resource_rules, load_rule_cache, rules_version, save_rule_cache
+
+RECURSOS = ["/main/", "/index.php?", "/busca?q=1 union select 2", "/x?a=<script>", "/app.js", "/backup.sql#", None]
+
+def esperado(recursos):
+    """Resultado das regras avaliadas linha a linha (comportamento anterior)."""
+    texto = recursos.astype(str)
+    return {nome: texto.str.contains(padrao, flags=flags, regex=True, na=False).to_numpy()
+            for nome, (padrao, flags) in RESOURCE_RULES.items()}
+
+def comparar(resultado, referencia):
+    assert resultado.keys() == referencia.keys()
+    for nome in referencia:
+        np.testing.assert_array_equal(resultado[nome], referencia[nome], err_msg=nome)
+
+def test_regras_por_recurso_sem_cache():
+    linhas = pd.Series(RECURSOS[:-1] * 3)
+    comparar(evaluate_resource_rules(linhas, cache_file=None), esperado(linhas))
+    categorica = linhas.astype('category')
+    comparar(evaluate_resource_rules(categorica, cache_file=None), esperado(linhas))
+
+def test_recurso_ausente_nao_marca_regra():
+    linhas = pd.Series(pd.Categorical(RECURSOS))
+    resultado = evaluate_resource_rules(linhas, cache_file=None)
+    assert not any(marcador[-1] for marcador in resultado.values())
+
+def test_cache_frio_e_quente(tmp_path, monkeypatch):
+    cache = str(tmp_path / "regras.npz")
+    linhas = pd.Series(RECURSOS[:-1] * 2, dtype='category')
+    referencia = esperado(linhas)
+    comparar(evaluate_resource_rules(linhas, cache_file=cache, min_cache_resources=0), referencia)
+    hashes, _, _ = load_rule_cache(cache, rules_version())
+    assert len(hashes) == len(RECURSOS) - 1 and np.all(np.diff(hashes) > 0)
+
+    # Com o cache preenchido (e a mesma versão), nenhum regex é avaliado
+    versao = rules_version()
+    monkeypatch.setattr(analysis, "rules_version", lambda: versao)
+    monkeypatch.setattr(analysis, "RESOURCE_RULES", {nome: ('(', 0) for nome in RESOURCE_RULES})
+    comparar(evaluate_resource_rules(linhas, cache_file=cache, min_cache_resources=0), referencia)
+
+def test_cache_ignorado_com_poucos_recursos(tmp_path):
+    cache = tmp_path / "regras.npz"
+    evaluate_resource_rules(pd.Series(RECURSOS[:-1]), cache_file=str(cache))
+    assert not cache.exists()
+
+def test_cache_de_outra_versao_e_ignorado(tmp_path):
+    cache = str(tmp_path / "regras.npz")
+    save_rule_cache(cache, "outra", np.array([1, 2]), np.array([7, 7]), np.array([10**6, 10**6], dtype=np.int32))
+    assert load_rule_cache(cache, rules_version())[0].size == 0
+    linhas = pd.Series(RECURSOS[:-1])
+    comparar(evaluate_resource_rules(linhas, cache_file=cache, min_cache_resources=0), esperado(linhas))
+
+def test_cache_limitado_por_tamanho_e_idade(tmp_path):
+    cache = str(tmp_path / "regras.npz")
+    hoje = int(analysis.time.time() // 86400)
+    dias = np.array([hoje, hoje - 1, hoje - 2, hoje - 400], dtype=np.int32)
+    save_rule_cache(cache, "v", np.array([40, 30, 20, 10]), np.arange(4), dias, max_rows=2)
+    hashes, bits, dia = load_rule_cache(cache, "v")
+    np.testing.assert_array_equal(hashes, [30, 40])
+    np.testing.assert_array_equal(dia, [hoje - 1, hoje])
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+from logguardian.analysis import SKETCH_COUNTERS, count_values, sketch_masks, sketch_sources
+from logguardian.normalizer import write_normalized
+from logguardian.sketches import HyperLogLog, SpaceSaving, sketch_frames, iter_row_chunks
+
+def test_update_conta_so_categorias_presentes():
+    categorias = [f"/r/{i}" for i in range(100_000)]
+    serie = pd.Series(pd.Categorical.from_codes([5, 7, 5, 99_999, 5, 7], categorias))
+    sketch = SpaceSaving(k=10).update(serie)
+    assert sketch.top().to_dict() == {"/r/5": 3, "/r/7": 2, "/r/99999": 1}
+    assert sketch.total == 6 and sketch.min_count() == 0
+
+def test_update_dentro_do_erro_maximo(log_frame):
+    serie = log_frame(20_000, 1, zipf=True)['recurso']
+    exato = count_values(serie)
+    sketch = SpaceSaving(k=20)
+    for inicio in range(0, len(serie), 3_000):
+        sketch.update(serie.iloc[inicio:inicio + 3_000])
+    estimado = sketch.top()
+    assert list(estimado.index[:5]) == list(exato.index[:5])
+    diferenca = estimado - exato.reindex(estimado.index)
+    assert (diferenca >= 0).all() and (diferenca <= sketch.max_error()).all()
+
+def test_lotes_categoricos_iguais_a_uma_passada(log_frame):
+    df = log_frame(5_000, 2, zipf=True)
+    df['recurso'] = df['recurso'].astype('category')
+    unico, distintos_unico = sketch_frames([df], SKETCH_COUNTERS, sketch_masks(), k=1000)
+    lotes, distintos_lotes = sketch_frames(iter_row_chunks(df, 700), SKETCH_COUNTERS, sketch_masks(), k=1000)
+    for nome in SKETCH_COUNTERS:
+        assert lotes[nome].top().to_dict() == unico[nome].top().to_dict()
+    for coluna in distintos_unico:
+        np.testing.assert_array_equal(distintos_lotes[coluna].registers, distintos_unico[coluna].registers)
+
+def test_sketches_por_arquivo_combinados(tmp_path, log_frame):
+    frames = [log_frame(4_000, 3, '2024-01-01', zipf=True), log_frame(3_000, 4, '2024-01-02', zipf=True)]
+    write_normalized(frames[0], str(tmp_path / "a.csv"))
+    write_normalized(frames[1], str(tmp_path / "b.parquet"))
+    df = pd.concat(frames, ignore_index=True)
+    mascaras = sketch_masks()
+    exato = {nome: count_values(df[coluna][mascaras[nome](df)] if nome in mascaras else df[coluna])
+             for nome, coluna in SKETCH_COUNTERS.items()}
+    _, distintos_exatos = sketch_frames([df], SKETCH_COUNTERS, sketch_masks())
+
+    for workers in (1, 2):
+        heavy, distintos = sketch_sources([str(tmp_path)], workers=workers)
+        for nome in SKETCH_COUNTERS:
+            estimado = heavy[nome].top()
+            assert heavy[nome].total == exato[nome].sum()
+            assert estimado.sort_index().to_dict() == exato[nome].sort_index().to_dict()
+        # O HyperLogLog combinado é idêntico ao de uma passada sobre todas as linhas
+        for coluna, hll in distintos.items():
+            np.testing.assert_array_equal(hll.registers, distintos_exatos[coluna].registers)
+        assert abs(distintos['recurso'].estimate() - df['recurso'].nunique()) <= 5
+
+def test_sketches_por_arquivo_no_intervalo(tmp_path, log_frame):
+    write_normalized(log_frame(2_000, 5, '2024-01-01', zipf=True), str(tmp_path / "a.parquet"))
+    write_normalized(log_frame(1_000, 6, '2024-01-02', zipf=True), str(tmp_path / "b.parquet"))
+    heavy, _ = sketch_sources([str(tmp_path)], since='2024-01-02', until='2024-01-02')
+    assert heavy['ips'].total == 1_000
+
+def test_hyperloglog_merge_igual_a_uma_passada():
+    valores = pd.Series([f"v{i}" for i in range(10_000)])
+    a, b, unico = HyperLogLog(12), HyperLogLog(12), HyperLogLog(12)
+    a.add(valores[:6_000])
+    b.add(valores[4_000:])
+    unico.add(valores)
+    np.testing.assert_array_equal(a.merge(b).registers, unico.registers)
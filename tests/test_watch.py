@@ -0,0 +1,22 @@
+from logguardian.watch import LogWatcher
+
+LINHA_TRAEFIK = ('52.220.243.231 - - [01/Oct/2023:00:00:07 +0000] "GET /wp-login.php?x=1 HTTP/1.1" 404 1907 "-" '
+                 '"Mozilla/5.0" 12 "router-0@docker" "http://10.0.0.2:80" 176ms')
+LINHA_CLF = '52.220.243.231 - - [01/Oct/2023:00:00:08 +0000] "TRACE /main/ HTTP/1.1" 200 15 "-" "curl/7.88.1"'
+
+def test_process_line_com_campos_do_traefik():
+    watcher = LogWatcher()
+    alertas = watcher.process_line(LINHA_TRAEFIK)
+    assert watcher.ignoradas == 0
+    assert all(alerta['status'] == 404 and alerta['metodo'] == 'GET' for alerta in alertas)
+    assert alertas[0]['ip'] == '52.220.243.0'
+
+def test_process_line_sem_campos_do_traefik():
+    watcher = LogWatcher()
+    alertas = watcher.process_line(LINHA_CLF)
+    assert [alerta['regra'] for alerta in alertas] == ['metodo_incomum']
+
+def test_process_line_ignora_linha_invalida():
+    watcher = LogWatcher()
+    assert watcher.process_line('lixo') == []
+    assert watcher.ignoradas == 1